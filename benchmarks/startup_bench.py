@@ -0,0 +1,96 @@
+"""启动耗时基准测试
+
+测量两项指标（均在全新子进程中计时，包含解释器启动和模块导入）：
+  - gui: 从进程启动到主窗口首次绘制完成（收到 <Expose> 事件）
+  - cli: 从进程启动到第一条CLI命令可用（cli.main(['--help']) 返回）
+
+超过预算时退出码为1，可放进CI或打包前检查中防止启动变慢。
+
+用法：
+    python benchmarks/startup_bench.py [--runs 5] [--gui-budget 1.5] [--cli-budget 0.5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GUI_SNIPPET = r'''
+import os, sys, tempfile, time
+t0 = float(sys.argv[1])
+import tkinter as tk
+from gui.gui import XimalayaGUI
+root = tk.Tk()
+app = XimalayaGUI(root, default_download_dir=tempfile.mkdtemp())
+painted = []
+def on_expose(event):
+    # 绑定在根窗口上的 <Expose> 会对每个子控件各触发一次，只记录第一次
+    if painted:
+        return
+    painted.append(True)
+    print('@elapsed', time.time() - t0, flush=True)
+    root.after(0, root.destroy)
+root.bind('<Expose>', on_expose, add='+')
+root.after(10000, root.destroy)
+root.mainloop()
+'''
+
+CLI_SNIPPET = r'''
+import sys, time, io, contextlib
+t0 = float(sys.argv[1])
+import cli
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        cli.main(['--help'])
+    except SystemExit:
+        pass
+print('@elapsed', time.time() - t0, flush=True)
+'''
+
+
+def _measure(snippet):
+    t0 = time.time()
+    result = subprocess.run([sys.executable, '-c', snippet, str(t0)], cwd=ROOT,
+                            capture_output=True, text=True, timeout=60)
+    # 只认带标记的第一行，模块导入或界面初始化时打印的其他内容不影响结果
+    lines = [line for line in result.stdout.splitlines() if line.startswith('@elapsed ')]
+    if result.returncode != 0 or not lines:
+        raise RuntimeError(result.stderr.strip() or '子进程没有输出')
+    return float(lines[0].split()[1])
+
+
+def _has_display():
+    if sys.platform.startswith('linux'):
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
+
+
+def run(name, snippet, runs, budget):
+    samples = [_measure(snippet) for _ in range(runs)]
+    median = statistics.median(samples)
+    ok = median <= budget
+    print(f'{name}: 中位数 {median * 1000:.0f}ms, 最小 {min(samples) * 1000:.0f}ms, '
+          f'预算 {budget * 1000:.0f}ms {"✅" if ok else "❌ 超出预算"}')
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--gui-budget', type=float, default=1.5, help='主窗口首次绘制预算(秒)')
+    parser.add_argument('--cli-budget', type=float, default=0.5, help='CLI首条命令可用预算(秒)')
+    args = parser.parse_args(argv)
+
+    ok = run('cli', CLI_SNIPPET, args.runs, args.cli_budget)
+    if _has_display():
+        ok = run('gui', GUI_SNIPPET, args.runs, args.gui_budget) and ok
+    else:
+        print('gui: 跳过（没有可用的显示环境）')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""无界面命令行批处理入口
+
+适用于没有显示器的服务器和cron定时任务：只按需导入抓取器/下载器模块，
+从不导入 tkinter 或 PIL，所有进度以 JSON Lines 输出到标准输出。
+
+用法示例：
+    python cli.py list --album-id 12345
+    python cli.py resolve --file ids.txt
+    python cli.py download --file ids.txt --download-dir /mnt/nas/AudioBook
+    python cli.py status --album-id 12345 --download-dir /mnt/nas/AudioBook
+    python cli.py scan --download-dir /mnt/nas/AudioBook
+
+ID文件每行一个ID，可用 album:/track: 前缀区分类型（默认为专辑），#开头为注释。
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+
+from utils.job_queue import read_ids_file
+
+
+class JsonLinesReporter:
+    """把事件以JSON Lines格式写到输出流，每行一个事件"""
+
+    LEVELS = {'trace': 5, 'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+    def __init__(self, stream=None, log_level='warning'):
+        self.stream = stream or sys.stdout
+        self.min_level = self.LEVELS.get(log_level, 30)
+
+    def emit(self, event, **fields):
+        record = {'event': event, 'ts': round(time.time(), 3)}
+        record.update(fields)
+        self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def log(self, msg, level='info'):
+        """兼容各模块 log_func(msg, level=...) 约定"""
+        if self.LEVELS.get(level, 20) >= self.min_level:
+            self.emit('log', level=level, msg=str(msg))
+
+    def progress_func(self, target_id):
+        def progress(current, total, filename=None):
+            self.emit('progress', id=target_id, current=current, total=total, file=filename)
+        return progress
+
+    def transfer_func(self, target_id):
+        """单个文件的字节级进度（已由下载器节流）"""
+        def transfer(event):
+            self.emit('transfer', id=target_id, file=event.filename, bytes=event.downloaded, total=event.total,
+                      rate=round(event.rate), eta=None if event.eta is None else round(event.eta, 1))
+        return transfer
+
+
+def _collect_entries(args):
+    entries = [('album', i) for i in args.album_id] + [('track', i) for i in args.track_id]
+    if args.file:
+        entries.extend(read_ids_file(args.file))
+    return entries
+
+
+def _iter_album_tracks(album_id, log_func, page_size=20):
+    """分页获取专辑曲目列表（优先使用专辑页面缓存，不解析URL）"""
+    from fetcher.track_fetcher import fetch_album_tracks_fast
+    page = 1
+    while True:
+        tracks = fetch_album_tracks_fast(album_id, page, page_size, log_func=log_func)
+        if not tracks:
+            return
+        for track in tracks:
+            yield track
+        total_count = tracks[0].totalCount
+        if total_count:
+            if page * page_size >= total_count:
+                return
+        elif len(tracks) < page_size:
+            return
+        page += 1
+
+
+def _album_save_dir(album_id, download_dir):
+    """与 AlbumDownloader 相同的目录命名规则"""
+    from fetcher.album_fetcher import fetch_album
+    album = fetch_album(album_id)
+    title = album.albumTitle if album and album.albumTitle and album.albumTitle.strip() else f'Album_{album_id}'
+    return os.path.join(download_dir, re.sub(r'[\\/:*?"<>|]', '_', title))
+
+
+def _plan_album_quality(album_id, args, bandwidth, reporter):
+    """--quality auto：按磁盘预算/期限为专辑选择音质，并输出 plan 事件"""
+    from utils.bandwidth import parse_rate
+    from utils.quality_planner import plan_quality
+    from utils.sqlite_cache import get_sqlite_cache
+    durations = {int(t.trackId): int(t.duration or 0) for t in _iter_album_tracks(album_id, reporter.log)}
+    known = get_sqlite_cache().get_track_qualities(list(durations))
+    plan = plan_quality(durations, known=known, disk_budget=parse_rate(args.disk_budget), bandwidth=bandwidth,
+                        deadline=args.deadline * 3600)
+    reporter.emit('plan', id=album_id, quality=plan.quality, bytes=plan.estimated_bytes, fits=plan.fits,
+                  seconds=None if plan.estimated_seconds is None else round(plan.estimated_seconds))
+    return plan.quality
+
+
+def cmd_list(args, reporter):
+    failed = 0
+    for job_type, target_id in _collect_entries(args):
+        if job_type != 'album':
+            reporter.emit('skip', id=target_id, reason='list 仅支持专辑ID')
+            continue
+        try:
+            count = 0
+            for count, track in enumerate(_iter_album_tracks(target_id, reporter.log), start=1):
+                reporter.emit('track', album_id=target_id, index=count, track_id=track.trackId,
+                              title=track.title, duration=track.duration)
+            reporter.emit('done', id=target_id, tracks=count)
+        except Exception as e:
+            failed += 1
+            reporter.emit('error', id=target_id, error=str(e))
+    return failed
+
+
+def cmd_resolve(args, reporter):
+    from fetcher.track_fetcher import fetch_track_crypted_url
+    failed = 0
+    for job_type, target_id in _collect_entries(args):
+        try:
+            if job_type == 'album':
+                track_refs = [(t.trackId, target_id) for t in _iter_album_tracks(target_id, reporter.log)]
+            else:
+                track_refs = [(target_id, args.track_album_id)]
+            resolved = 0
+            for i, (track_id, album_id) in enumerate(track_refs, start=1):
+                crypted_url = fetch_track_crypted_url(int(track_id), album_id, log_func=reporter.log)
+                if crypted_url:
+                    resolved += 1
+                reporter.emit('resolved', id=target_id, track_id=track_id, ok=bool(crypted_url),
+                              current=i, total=len(track_refs))
+            reporter.emit('done', id=target_id, resolved=resolved, total=len(track_refs))
+            if resolved < len(track_refs):
+                failed += 1
+        except Exception as e:
+            failed += 1
+            reporter.emit('error', id=target_id, error=str(e))
+    return failed
+
+
+def cmd_download(args, reporter):
+    from utils.bandwidth import parse_rate, set_global_bandwidth
+    try:
+        set_global_bandwidth(args.max_rate, schedule=args.rate_schedule)
+        job_rate = parse_rate(args.job_rate)
+        parse_rate(args.disk_budget)
+        quality = None if args.quality == 'auto' else int(args.quality)
+    except ValueError as e:
+        reporter.emit('error', error=str(e))
+        return 1
+    failed = 0
+    os.makedirs(args.download_dir, exist_ok=True)
+    for job_type, target_id in _collect_entries(args):
+        reporter.emit('start', type=job_type, id=target_id)
+        try:
+            if job_type == 'album':
+                from downloader.album_download import AlbumDownloader
+                album_quality = quality
+                if album_quality is None:
+                    album_quality = _plan_album_quality(target_id, args, job_rate or parse_rate(args.max_rate), reporter)
+                AlbumDownloader(
+                    target_id,
+                    log_func=reporter.log,
+                    delay=args.delay,
+                    save_dir=args.download_dir,
+                    progress_func=reporter.progress_func(target_id),
+                    progress_event_func=reporter.transfer_func(target_id),
+                    bandwidth_limit=job_rate,
+                    quality=album_quality,
+                ).download_album()
+            else:
+                from downloader.single_track_download import download_single_track
+                if not download_single_track(target_id, album_id=args.track_album_id or None,
+                                             log_func=reporter.log, save_dir=args.download_dir,
+                                             bandwidth_limit=job_rate, quality=1 if quality is None else quality):
+                    raise Exception('单曲下载失败')
+            reporter.emit('done', type=job_type, id=target_id)
+        except Exception as e:
+            failed += 1
+            reporter.emit('error', type=job_type, id=target_id, error=str(e))
+    return failed
+
+
+def cmd_status(args, reporter):
+    failed = 0
+    for job_type, target_id in _collect_entries(args):
+        if job_type != 'album':
+            reporter.emit('skip', id=target_id, reason='status 仅支持专辑ID')
+            continue
+        try:
+            from utils.library_index import get_library_index
+            save_dir = _album_save_dir(target_id, args.download_dir)
+            expected = []
+            for idx, track in enumerate(_iter_album_tracks(target_id, reporter.log), start=1):
+                safe_title = re.sub(r'[\\/:*?"<>|]', '_', track.title)
+                expected.append((track.trackId, f'{idx:03d}_{safe_title}.m4a'))
+            library = get_library_index().downloaded_tracks(target_id, save_dir, expected=expected)
+            total = len(expected)
+            downloaded = sum(1 for track_id, _ in expected if int(track_id) in library)
+            reporter.emit('status', id=target_id, dir=save_dir, total=total,
+                          downloaded=downloaded, missing=total - downloaded)
+        except Exception as e:
+            failed += 1
+            reporter.emit('error', id=target_id, error=str(e))
+    return failed
+
+
+def cmd_scan(args, reporter):
+    """增量扫描下载目录，重建下载索引"""
+    from utils.library_scanner import LibraryScanner
+    scanner = LibraryScanner(args.download_dir, progress_func=reporter.progress_func('scan'), log_func=reporter.log)
+    stats = scanner.scan()
+    reporter.emit('scan', dir=os.path.abspath(args.download_dir), **stats)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='喜马拉雅无界面批处理工具（JSON Lines输出）')
+    parser.add_argument('--log-level', default='warning', choices=['debug', 'info', 'warning', 'error'],
+                        help='输出到JSON Lines的日志最低级别')
+    parser.add_argument('--log-subsystems', default='',
+                        help='按子系统设置产生日志的级别，如 cache=debug,fetcher=trace（同环境变量 XIMALAYA_LOG）')
+
+    def add_id_args(p):
+        p.add_argument('--album-id', type=int, action='append', default=[])
+        p.add_argument('--track-id', type=int, action='append', default=[])
+        p.add_argument('--track-album-id', type=int, default=0, help='单曲所属专辑ID')
+        p.add_argument('--file', help='ID文件，每行一个，可用 album:/track: 前缀')
+
+    sub = parser.add_subparsers(dest='command', required=True)
+    p_list = sub.add_parser('list', help='列出专辑曲目')
+    add_id_args(p_list)
+    p_list.set_defaults(func=cmd_list)
+
+    p_resolve = sub.add_parser('resolve', help='解析曲目播放URL并写入缓存')
+    add_id_args(p_resolve)
+    p_resolve.set_defaults(func=cmd_resolve)
+
+    p_download = sub.add_parser('download', help='下载专辑或单曲')
+    add_id_args(p_download)
+    p_download.add_argument('--download-dir', default=os.path.join(os.getcwd(), 'AudioBook'))
+    p_download.add_argument('--delay', type=float, default=0, help='下载延迟(秒)')
+    p_download.add_argument('--max-rate', default='', help='所有下载共享的限速，如 512K、2M（0为不限）')
+    p_download.add_argument('--job-rate', default='', help='每个专辑/单曲任务自身的限速')
+    p_download.add_argument('--rate-schedule', default='',
+                            help='按时段限速，如 08:00-23:00=512K,23:00-08:00=0；未覆盖的时段使用 --max-rate')
+    p_download.add_argument('--quality', default='1',
+                            help='音质等级(trackQualityLevel)，如 0/1/2；auto 按 --disk-budget/--deadline 为每个专辑选择')
+    p_download.add_argument('--disk-budget', default='', help='--quality auto 时每个专辑可用的磁盘空间，如 2G')
+    p_download.add_argument('--deadline', type=float, default=0,
+                            help='--quality auto 时每个专辑期望的下载时长(小时)，按 --job-rate/--max-rate 估算')
+    p_download.set_defaults(func=cmd_download)
+
+    p_status = sub.add_parser('status', help='检查专辑文件下载状态')
+    add_id_args(p_status)
+    p_status.add_argument('--download-dir', default=os.path.join(os.getcwd(), 'AudioBook'))
+    p_status.set_defaults(func=cmd_status)
+
+    p_scan = sub.add_parser('scan', help='扫描下载目录，重建下载索引')
+    p_scan.add_argument('--download-dir', default=os.path.join(os.getcwd(), 'AudioBook'))
+    p_scan.set_defaults(func=cmd_scan)
+
+    args = parser.parse_args(argv)
+    if args.log_subsystems:
+        from utils.log import set_log_levels
+        try:
+            set_log_levels(args.log_subsystems)
+        except ValueError as e:
+            parser.error(str(e))
+    reporter = JsonLinesReporter(stream=sys.stdout, log_level=args.log_level)
+    # 标准输出只留给 JSON Lines：各模块未传 log_func 时的 print 一律转到标准错误
+    with contextlib.redirect_stdout(sys.stderr):
+        failed = args.func(args, reporter)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
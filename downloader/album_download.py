@@ -2,26 +2,36 @@ import os
 import re
 from fetcher.album_fetcher import fetch_album
 from fetcher.track_fetcher import fetch_album_tracks
-from downloader.downloader import M4ADownloader
+from downloader.downloader import DownloadCancelled, M4ADownloader
+from utils.progress import throttle_calls
 
 
 class AlbumDownloader:
-    def __init__(self, album_id, log_func=print, delay=0, save_dir=None, progress_func=None, album=None, total_count=None):
+    def __init__(self, album_id, log_func=print, delay=0, save_dir=None, progress_func=None, album=None, total_count=None,
+                 progress_event_func=None, bandwidth_limit=0, cancel_event=None, quality=1):
         self.album_id = int(album_id)
         self.log = log_func
         self.album = album if album is not None else None
         self.tracks = []
         self.save_dir = save_dir  # 支持外部传递下载目录
-        self.downloader = M4ADownloader()
+        # progress_event_func 接收单个文件的 ProgressEvent（字节数、速度、剩余时间），已节流
+        # bandwidth_limit 为本专辑任务的限速（字节/秒或 '512K' 形式），与全局限速叠加生效
+        # cancel_event 置位后在当前数据块/曲目处停止，抛出 DownloadCancelled
+        # quality 为下载使用的音质等级（trackQualityLevel），可由 utils.quality_planner 按预算选择
+        self.cancel_event = cancel_event
+        self.downloader = M4ADownloader(progress_callback=progress_event_func, bandwidth_limit=bandwidth_limit,
+                                        cancel_event=cancel_event, quality=quality)
         self.delay = delay  # 下载延迟（秒）
-        self.progress_func = progress_func
+        # 曲目级进度每首歌会回调多次，限制频率，最终完成的回调总会送达
+        self.progress_func = throttle_calls(progress_func)
         self._total_count_override = total_count
         self._partial_files = set()  # 跟踪部分下载的文件
+        self._progress_journal = None
 
     def fetch_album_info(self):
-        # 如果已传入album对象则直接用，无需重复获取
+        # 如果已传入album对象则直接用，无需重复获取；否则优先使用专辑信息缓存
         if self.album is None:
-            self.album = fetch_album(self.album_id)
+            self.album = fetch_album(self.album_id, log_func=self.log)
         if not self.album:
             try:
                 self.log('获取专辑信息失败', level='error')
@@ -54,7 +64,6 @@ class AlbumDownloader:
     def save_album_info(self):
         """保存专辑封面和专辑信息到下载目录，并生成可读的 markdown 文件"""
         import json
-        import requests
         import re
         from html import unescape
         # 只保存 Album 数据类已有字段
@@ -104,86 +113,58 @@ class AlbumDownloader:
                 f.write(f"## 简介\n{rich_intro_md}\n")
         except Exception as e:
             self.log(f'保存专辑markdown信息失败: {e}', level='error')
-        # 下载封面图片
+        # 封面图片从图片缓存复制，同一专辑的封面只下载一次
         cover_url = getattr(self.album, 'cover', None)
         if cover_url:
-            try:
-                resp = requests.get(cover_url, timeout=10)
-                if resp.status_code == 200:
-                    with open(os.path.join(self.save_dir, 'cover.jpg'), 'wb') as f:
-                        f.write(resp.content)
-                else:
-                    self.log(f'封面下载失败，状态码: {resp.status_code}', level='warning')
-            except Exception as e:
-                self.log(f'下载封面失败: {e}', level='warning')
+            from utils.image_cache import get_image_cache
+            if not get_image_cache().export(cover_url, os.path.join(self.save_dir, 'cover.jpg'), log_func=self.log):
+                self.log('封面下载失败', level='warning')
 
-    def _get_progress_file(self):
-        return os.path.join(self.save_dir, 'download_progress.json')
+    def _get_progress_journal(self):
+        """进度日志按下载目录懒创建（save_dir 在 fetch_album_info 之后才确定）"""
+        from utils.progress_journal import ProgressJournal
+        if self._progress_journal is None or self._progress_journal.save_dir != self.save_dir:
+            if self._progress_journal is not None:
+                self._progress_journal.close()
+            self._progress_journal = ProgressJournal(self.save_dir)
+        return self._progress_journal
 
     def load_progress(self):
-        import json
-        progress_file = self._get_progress_file()
-        if os.path.exists(progress_file):
-            try:
-                with open(progress_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception:
-                return {}
-        return {}
+        try:
+            return self._get_progress_journal().load()
+        except Exception:
+            return {}
 
     def save_progress(self, progress):
-        import json
-        import tempfile
-        import time
-        progress_file = self._get_progress_file()
-        max_retries = 3
-        retry_delay = 0.5
-        
-        for attempt in range(1, max_retries + 1):
-            try:
-                # Windows兼容的原子写入方式
-                dir_name = os.path.dirname(progress_file)
-                tmp_file = None
-                try:
-                    # 显式创建临时文件并确保关闭
-                    tf = tempfile.NamedTemporaryFile(
-                        'w', encoding='utf-8', 
-                        dir=dir_name, 
-                        delete=False
-                    )
-                    tmp_file = tf.name
-                    json.dump(progress, tf, ensure_ascii=False, indent=2)
-                    tf.flush()
-                    os.fsync(tf.fileno())
-                    tf.close()  # 显式关闭文件句柄
-                    
-                    # 尝试重命名
-                    os.replace(tmp_file, progress_file)
-                    return  # 成功则直接返回
-                except Exception as e:
-                    if tmp_file and os.path.exists(tmp_file):
-                        try:
-                            os.remove(tmp_file)
-                        except:
-                            pass
-                    if attempt == max_retries:
-                        raise
-                    time.sleep(retry_delay * attempt)
-            except Exception as e:
-                if attempt == max_retries:
-                    self.log(f'保存进度失败(尝试{attempt}次): {e}', level='error')
-                    raise
-                time.sleep(retry_delay * attempt)
+        """整体覆盖保存进度（会触发一次压缩），逐曲更新请用 _record_track"""
+        try:
+            self._get_progress_journal().write_snapshot(progress)
+        except Exception as e:
+            self.log(f'保存进度失败: {e}', level='error')
+            raise
+
+    def _record_track(self, page, track_id, record, page_done=None):
+        self._get_progress_journal().record_track(page, track_id, record, page_done=page_done)
+
+    def _mark_blocked(self):
+        self._get_progress_journal().set_flag('blocked', True)
 
     def fetch_and_download_tracks(self):
-        import json
+        try:
+            self._fetch_and_download_tracks()
+        finally:
+            # 追加句柄落盘关闭，下次打开时从日志重放
+            if self._progress_journal is not None:
+                self._progress_journal.close()
+
+    def _fetch_and_download_tracks(self):
         import time
         page_size = 20
         progress = self.load_progress()
-        downloaded_files = set(os.listdir(self.save_dir))
         failed_tracks = []  # [(page, track_id, filename, idx, error_log)]
         total_count = None
         idx_map = {}  # track_id -> idx
+        page_track_ids = {}  # page -> 本页全部 track_id（判断整页是否完成时包括仍在重试队列中的曲目）
         # 先获取第一页，拿到总数
         # 风控检测标志
         self._blocked = False
@@ -192,13 +173,11 @@ class AlbumDownloader:
             try:
                 if self._blocked:
                     raise BlockedException('操作因风控被阻止')
-                tracks = fetch_album_tracks(album_id, page, page_size)
+                tracks = fetch_album_tracks(album_id, page, page_size, quality=self.downloader.quality)
                 return tracks
             except BlockedException as be:
                 self.log(f'检测到风控，已暂停下载：{be}', level='error')
-                progress = self.load_progress()
-                progress['blocked'] = True
-                self.save_progress(progress)
+                self._mark_blocked()
                 self._blocked = True
                 return None
 
@@ -206,9 +185,7 @@ class AlbumDownloader:
         if not first_page_tracks:
             self.log('未获取到专辑曲目，可能被风控，请稍后重试', level='error')
             # 记录风控状态
-            progress = self.load_progress()
-            progress['blocked'] = True
-            self.save_progress(progress)
+            self._mark_blocked()
             self._blocked = True
             return
         # 优先使用传递的总数
@@ -252,81 +229,129 @@ class AlbumDownloader:
                 page_tracks = fetch_album_tracks_with_block_check(self.album_id, page, page_size)
             if not page_tracks:
                 self.log('检测到风控或接口异常，已暂停下载。请稍后重启程序。', level='error')
-                progress['blocked'] = True
-                self.save_progress(progress)
+                self._mark_blocked()
                 self._blocked = True
                 break
             for i, track in enumerate(page_tracks):
                 safe_title = re.sub(r'[\\/:*?"<>|]', '_', getattr(track, 'title', str(getattr(track, 'trackId', idx))))
                 filename = f'{idx:03d}_{safe_title}.m4a'
-                filepath = os.path.join(self.save_dir, filename)
                 track_id = str(getattr(track, 'trackId', idx))
                 idx_map[track_id] = idx
+                page_track_ids.setdefault(page, []).append(track_id)
                 track_status = tracks_progress.get(track_id, {})
                 # 已完成
                 if track_status.get('done'):
                     downloaded += 1
                     idx += 1
                     continue
-                # 文件已存在且大于10KB，视为完成
-                if filename in downloaded_files and os.path.getsize(filepath) > 1024 * 10:
-                    tracks_progress[track_id] = {'url': '', 'done': True, 'filename': filename}
-                    self.save_progress(progress)
-                    downloaded += 1
-                    idx += 1
-                    continue
                 # 未完成或失败
                 failed_tracks.append((page, track_id, filename, idx, track_status.get('error', '')))
                 idx += 1
             page += 1
+
+        def page_complete(page):
+            """本页每一首曲目都已成功才算完成；失败或等待重试的曲目会让整页保持未完成"""
+            tracks_progress = progress.get(str(page), {}).get('tracks', {})
+            return all(tracks_progress.get(t, {}).get('done') for t in page_track_ids.get(page, []))
+
+        # 下载索引中已有的曲目视为完成（一次查询，不按文件名逐个探测）
+        if failed_tracks:
+            from utils.library_index import get_library_index
+            try:
+                library = get_library_index().downloaded_tracks(
+                    self.album_id, self.save_dir,
+                    expected=[(track_id, filename) for _, track_id, filename, _, _ in failed_tracks])
+            except Exception as e:
+                self.log(f'查询下载索引失败: {e}', level='warning')
+                library = {}
+            remaining = []
+            for item in failed_tracks:
+                page, track_id, filename, _, _ = item
+                entry = library.get(int(track_id))
+                if entry is None:
+                    remaining.append(item)
+                    continue
+                record = {'url': '', 'done': True, 'filename': os.path.basename(entry.path)}
+                page_progress = progress.setdefault(str(page), {})
+                page_progress.setdefault('tracks', {})[track_id] = record
+                page_done = page_complete(page)
+                page_progress['done'] = page_done
+                self._record_track(page, track_id, record, page_done=page_done)
+                downloaded += 1
+            failed_tracks = remaining
         # 2. 优先补下所有未完成/失败的track，支持指数退避
         failed_log = []
         if self._blocked:
             self.log('下载已因风控暂停，未完成的音频请稍后重启程序继续。', level='error')
-            progress = self.load_progress()
-            progress['blocked'] = True
-            self.save_progress(progress)
+            self._mark_blocked()
             return
 
-        for page, track_id, filename, idx, last_error in failed_tracks:
+        # 延迟重试队列：失败的曲目按下次可重试时间进入最小堆，
+        # 退避期间继续下载其他正常曲目，不再原地 sleep 阻塞整张专辑
+        import heapq
+        from collections import deque
+        max_attempts = 5
+        fresh_queue = deque((page, track_id, filename, idx, 0) for page, track_id, filename, idx, _ in failed_tracks)
+        retry_heap = []  # [(next_attempt_time, seq, (page, track_id, filename, idx, attempt))]
+        retry_seq = 0
+        attempt_history = {}  # track_id -> [{'attempt', 'time', 'error'}]，曲目结束时一次性写入进度
+
+        def finish_track(page, track_id, record):
+            """曲目最终成功或放弃时写一次进度（含完整的尝试记录）"""
             page_key = str(page)
-            page_progress = progress.get(page_key, {})
-            if 'tracks' not in page_progress:
-                page_progress['tracks'] = {}
-            error_detail = ''
-            for attempt in range(5):
-                try:
-                    if self.progress_func and total_count:
-                        self.progress_func(downloaded+1, total_count, filename)
-                    self.log(f'[{idx}/{total_count or "?"}] 下载: {filename} (第{attempt+1}次尝试)', level='info')
-                    self.downloader.download_track_by_id(int(track_id), self.album_id, os.path.join(self.save_dir, filename), log_func=self.log)
-                    self.log(f'[{idx}] 下载完成: {filename}', level='info')
-                    page_progress['tracks'][track_id] = {'url': '', 'done': True, 'filename': filename}
-                    self.save_progress(progress)
-                    downloaded += 1
-                    if self.progress_func and total_count:
-                        self.progress_func(downloaded, total_count, filename)
-                    break
-                except Exception as e:
-                    error_detail = str(e)
-                    self.log(f'[{idx}] 下载失败: {e}', level='warning')
-                    if self.progress_func and total_count:
-                        self.progress_func(downloaded, total_count, filename)
-                    page_progress['tracks'][track_id] = {'url': '', 'done': False, 'error': error_detail, 'filename': filename}
-                    self.save_progress(progress)
-                    # 指数退避
-                    sleep_time = min(2 ** attempt, 30)
-                    time.sleep(sleep_time)
-                    if attempt == 4:
-                        self.log(f'[{idx}] 多次失败，跳过: {filename}', level='error')
-                        failed_log.append({'page': page, 'track_id': track_id, 'filename': filename, 'idx': idx, 'error': error_detail})
-            # 标记本页是否全部完成
-            tracks_progress = page_progress['tracks']
-            all_done = all(t.get('done') for t in tracks_progress.values()) and len(tracks_progress) >= 1
-            if all_done:
-                page_progress['done'] = True
-            progress[page_key] = page_progress
-            self.save_progress(progress)
+            page_progress = progress.setdefault(page_key, {})
+            tracks_progress = page_progress.setdefault('tracks', {})
+            history = attempt_history.pop(track_id, [])
+            if history:
+                record['attempts'] = history
+            tracks_progress[track_id] = record
+            # 按本页完整曲目列表判断是否全部完成，并同步写入（可能把旧的完成标记改回未完成）
+            page_done = page_complete(page)
+            page_progress['done'] = page_done
+            self._record_track(page, track_id, record, page_done=page_done)
+
+        while fresh_queue or retry_heap:
+            now = time.time()
+            if retry_heap and retry_heap[0][0] <= now:
+                _, _, item = heapq.heappop(retry_heap)
+            elif fresh_queue:
+                item = fresh_queue.popleft()
+            else:
+                # 只剩退避中的曲目，等待最早的一个到期
+                time.sleep(max(0.0, retry_heap[0][0] - now))
+                continue
+            page, track_id, filename, idx, attempt = item
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                raise DownloadCancelled('专辑下载已取消')
+            try:
+                if self.progress_func and total_count:
+                    self.progress_func(downloaded+1, total_count, filename)
+                self.log(f'[{idx}/{total_count or "?"}] 下载: {filename} (第{attempt+1}次尝试)', level='info')
+                self.downloader.download_track_by_id(int(track_id), self.album_id, os.path.join(self.save_dir, filename), log_func=self.log)
+                self.log(f'[{idx}] 下载完成: {filename}', level='info')
+                finish_track(page, track_id, {'url': '', 'done': True, 'filename': filename})
+                downloaded += 1
+                if self.progress_func and total_count:
+                    self.progress_func(downloaded, total_count, filename)
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                error_detail = str(e)
+                self.log(f'[{idx}] 下载失败: {e}', level='warning')
+                if self.progress_func and total_count:
+                    self.progress_func(downloaded, total_count, filename)
+                attempt_history.setdefault(track_id, []).append(
+                    {'attempt': attempt + 1, 'time': time.time(), 'error': error_detail})
+                if attempt + 1 >= max_attempts:
+                    self.log(f'[{idx}] 多次失败，跳过: {filename}', level='error')
+                    finish_track(page, track_id, {'url': '', 'done': False, 'error': error_detail, 'filename': filename})
+                    failed_log.append({'page': page, 'track_id': track_id, 'filename': filename, 'idx': idx, 'error': error_detail})
+                else:
+                    # 指数退避，放入延迟重试队列
+                    backoff = min(2 ** attempt, 30)
+                    retry_seq += 1
+                    heapq.heappush(retry_heap, (time.time() + backoff, retry_seq,
+                                                (page, track_id, filename, idx, attempt + 1)))
         if failed_log:
             self.log('\n以下音频多次下载失败，请手动排查：', level='error')
             for item in failed_log:
@@ -1,17 +1,80 @@
 import requests
 import time
 import hashlib
+import io
 import os
+import threading
 from requests.exceptions import HTTPError, Timeout, ConnectionError, RequestException
 from fetcher.track_fetcher import BlockedException
+from utils.config import disable_insecure_warnings
+from utils.library_index import HEAD_HASH_BYTES
+from utils.progress import ProgressThrottle, StallWatchdog, get_stall_metrics
+from utils.bandwidth import TokenBucket, get_global_bandwidth, parse_rate
+from utils.cdn_selector import get_cdn_selector
+
+class DownloadCancelled(Exception):
+    """下载被外部取消（例如worker任务租约丢失），不应重试"""
+
+
+class DownloadStalled(requests.exceptions.Timeout):
+    """连接仍在但吞吐量持续低于下限，视为超时（可重试）"""
+
 
 class M4ADownloader:
-    def __init__(self, max_retries=3, retry_delay=3, connect_timeout=10):
+    def __init__(self, max_retries=3, retry_delay=3, connect_timeout=10, buffer_size=512 * 1024,
+                 progress_callback=None, progress_interval=0.5, log_progress_interval=5.0, bandwidth_limit=0,
+                 cancel_event=None, stall_min_rate=4 * 1024, stall_window=30.0, max_resumes=5, quality=1):
         self.max_retries = max_retries
+        self.quality = quality  # 解析下载地址时请求的音质等级（trackQualityLevel）
+        self.cancel_event = cancel_event  # threading.Event，置位后在下一个数据块处中止下载
+        # 本下载器（单个任务）的限速，可为 '512K' 等；全局限速见 utils.bandwidth.set_global_bandwidth
+        rate = parse_rate(bandwidth_limit)
+        self.bandwidth = TokenBucket(rate) if rate > 0 else None
+        self.buffer_size = buffer_size  # 下载读缓冲区大小，千兆网络下建议256KB~1MB
+        self.progress_callback = progress_callback  # 接收 ProgressEvent，按 progress_interval 节流
+        self.progress_interval = progress_interval
+        self.log_progress_interval = log_progress_interval  # 日志中“下载进度”行的最小间隔
         self.retry_delay = retry_delay  # 延迟时间由上层(GUI)控制
         self.connect_timeout = connect_timeout
+        # 停滞检测：最近 stall_window 秒平均速度低于 stall_min_rate（字节/秒）时断开，
+        # 用 Range 请求从当前位置续传，单次下载最多续传 max_resumes 次；stall_min_rate=0 关闭检测
+        self.stall_min_rate = stall_min_rate
+        self.stall_window = stall_window
+        self.max_resumes = max_resumes
         self._partial_files = set()  # 跟踪部分下载的文件
-        self._last_request_time = 0  # 记录上次请求时间
+        self._last_request_time = 0  # 记录上次请求时间（多个下载线程共享，受 _request_lock 保护）
+        self._request_lock = threading.Lock()
+        # 同一个下载器可被多个下载线程共用：每个线程各自记录最近一次下载的结果
+        self._local = threading.local()
+
+    @property
+    def _last_md5(self):
+        """当前线程最近一次下载完成文件的MD5，登记到下载索引"""
+        return getattr(self._local, 'md5', None)
+
+    @_last_md5.setter
+    def _last_md5(self, value):
+        self._local.md5 = value
+
+    @property
+    def _last_size(self):
+        """当前线程最近一次下载的 Content-Length，登记后用于判断文件是否可作为链接来源"""
+        return getattr(self._local, 'size', 0)
+
+    @_last_size.setter
+    def _last_size(self, value):
+        self._local.size = value
+
+    def _wait_request_slot(self, log_func=print):
+        """多个线程的请求按 retry_delay 间隔依次发出：在锁内预约发出时间，锁外等待"""
+        with self._request_lock:
+            now = time.time()
+            start = max(now, self._last_request_time + self.retry_delay)
+            self._last_request_time = start
+        wait_time = start - now
+        if wait_time > 0:
+            log_func(f"等待{wait_time:.1f}秒避免风控...", level='info')
+            time.sleep(wait_time)
 
     def _download_once(self, url, output_file, log_func=print):
         """
@@ -32,6 +95,7 @@ class M4ADownloader:
             # 'Cookie': '',  # 如有需要可在此处补充
         }
         self._partial_files.add(output_file)
+        disable_insecure_warnings()
         
         # 自定义SSL上下文
         import ssl
@@ -39,9 +103,114 @@ class M4ADownloader:
         ssl_context.check_hostname = False
         ssl_context.verify_mode = ssl.CERT_NONE
         
+        request_start = time.monotonic()
+        response = self._request(url, headers, log_func)
+        response.raise_for_status()
+        ttfb = time.monotonic() - request_start  # stream=True 时收到响应头即返回
+        total = int(response.headers.get('content-length', 0))
+        readinto = self._open_reader(response)
+        buf = memoryview(bytearray(max(self.buffer_size, HEAD_HASH_BYTES)))
+        # 先读取文件头部，若本地已有大小和头部哈希都相同的文件则直接链接，不再下载剩余部分
+        downloaded = 0
+        while downloaded < HEAD_HASH_BYTES:
+            n = readinto(buf[downloaded:HEAD_HASH_BYTES])
+            if not n:
+                break
+            downloaded += n
+        head = buf[:downloaded]
+        if total > 0 and self._link_same_content(total, bytes(head), output_file, log_func):
+            response.close()
+            self._partial_files.discard(output_file)
+            return True
+        filename = os.path.basename(output_file)
+        log_throttle = ProgressThrottle(lambda event: log_func(event.format(), level='info'),
+                                        min_interval=self.log_progress_interval)
+        event_throttle = None
+        if self.progress_callback:
+            event_throttle = ProgressThrottle(self.progress_callback, min_interval=self.progress_interval)
+        # 任务限速和全局限速都按实际读取的字节数消耗令牌；限速较低时缩小单次读取量
+        buckets = [b for b in (self.bandwidth, get_global_bandwidth()) if b is not None]
+        throttled = 0.0  # 因限速等待的时间不计入停滞检测
+        
+        def consume(n):
+            nonlocal throttled
+            if buckets:
+                start = time.monotonic()
+                for bucket in buckets:
+                    bucket.consume(n)
+                throttled += time.monotonic() - start
+        
+        consume(len(head))
+        watchdog = StallWatchdog(self.stall_min_rate, self.stall_window, clock=lambda: time.monotonic() - throttled)
+        metrics = get_stall_metrics()
+        resumes = 0
+        with open(output_file, 'wb') as file:
+            md5 = hashlib.md5()
+            file.write(head)
+            md5.update(head)
+            # 整个下载过程复用同一块缓冲区，写文件和计算MD5都不再产生新的bytes对象
+            while True:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    raise DownloadCancelled(f'下载已取消: {output_file}')
+                # 每块都重新取读取量：按时段限速时速率可能在下载中途变化
+                read_buf = buf[:min(b.suggested_chunk(len(buf)) for b in buckets)] if buckets else buf
+                try:
+                    n = readinto(read_buf)
+                    if n and watchdog.update(n):
+                        metrics.add('stalls')
+                        raise DownloadStalled(f'下载速度持续低于 {self.stall_min_rate // 1024}KB/s '
+                                              f'({self.stall_window:g}秒)')
+                except requests.exceptions.RequestException as e:
+                    response.close()
+                    if not isinstance(e, DownloadStalled):
+                        metrics.add('read_errors')
+                    if resumes >= self.max_resumes or not (total > 0 and downloaded < total):
+                        raise
+                    resumes += 1
+                    log_func(f'{e}，从 {downloaded // 1024}KB 处续传({resumes}/{self.max_resumes})', level='warning')
+                    response, offset = self._resume(url, headers, downloaded, total, log_func)
+                    readinto = self._open_reader(response)
+                    if offset != downloaded:
+                        # 服务器不支持 Range：从头重新下载
+                        file.seek(0)
+                        file.truncate()
+                        md5 = hashlib.md5()
+                        downloaded = 0
+                    watchdog.reset()
+                    continue
+                if not n:
+                    break
+                consume(n)
+                chunk = buf[:n]
+                file.write(chunk)
+                md5.update(chunk)
+                downloaded += n
+                log_throttle.update(downloaded, total, filename)
+                if event_throttle:
+                    event_throttle.update(downloaded, total, filename)
+        response.close()
+        if event_throttle and not (total > 0 and downloaded >= total):
+            event_throttle.update(downloaded, total, filename, force=True)
+        
+        # 验证文件完整性
+        file_size = os.path.getsize(output_file)
+        if total > 0 and file_size != total:
+            # 连接中途断开等情况：作为可重试的传输错误交给 download_m4a
+            raise requests.exceptions.ChunkedEncodingError(f"文件大小不匹配: 预期 {total} 字节, 实际 {file_size} 字节")
+            
+        # 记录该CDN节点的首字节时间和吞吐量（扣除限速等待），供后续下载选择节点
+        get_cdn_selector().record_success(url, ttfb, downloaded, time.monotonic() - request_start - ttfb - throttled)
+        self._last_md5 = md5.hexdigest()
+        self._last_size = total
+        log_func(f"\n文件已成功下载并保存为: {output_file} (MD5: {self._last_md5})", level='info')
+        self._partial_files.discard(output_file)
+        return True
+
+    def _request(self, url, headers, log_func=print):
+        """发起流式GET请求，连接阶段的错误最多重试3次"""
         for attempt in range(3):
             try:
-                response = requests.get(
+                return requests.get(
                     url,
                     stream=True,
                     timeout=(self.connect_timeout, 20),
@@ -51,7 +220,6 @@ class M4ADownloader:
                     proxies=None,
                     allow_redirects=True
                 )
-                break
             except requests.exceptions.SSLError as e:
                 if attempt == 2:
                     raise
@@ -62,47 +230,132 @@ class M4ADownloader:
                     raise
                 log_func(f"请求错误(尝试{attempt+1}/3): {e}", level='warning')
                 time.sleep(1 * (attempt + 1))
+
+    def _resume(self, url, headers, offset, total, log_func=print):
+        """用 Range 请求从 offset 续传，返回 (response, 实际起始位置)
+
+        服务器返回 206 且 Content-Range 与预期一致时从 offset 继续；
+        返回 200 说明不支持 Range，起始位置为0，由调用方从头重写文件。
+        """
+        metrics = get_stall_metrics()
+        headers = dict(headers, Range=f'bytes={offset}-')
+        # 压缩后的字节偏移与文件偏移不对应，续传请求只接受原始内容
+        headers['Accept-Encoding'] = 'identity'
+        response = self._request(url, headers, log_func)
         response.raise_for_status()
-        total = int(response.headers.get('content-length', 0))
-        downloaded = 0
-        with open(output_file, 'wb') as file:
-            md5 = hashlib.md5()
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    md5.update(chunk)
-                    downloaded += len(chunk)
-                    if total > 0:
-                        percent = downloaded * 100 // total
-                        if percent % 10 == 0 or percent == 100:  # 每10%显示一次进度
-                            log_func(f"下载进度: {percent}% ({downloaded // 1024}KB/{total // 1024}KB)", level='info')
-        
-        # 验证文件完整性
-        file_size = os.path.getsize(output_file)
-        if total > 0 and file_size != total:
-            raise Exception(f"文件大小不匹配: 预期 {total} 字节, 实际 {file_size} 字节")
-            
-        log_func(f"\n文件已成功下载并保存为: {output_file} (MD5: {md5.hexdigest()})", level='info')
-        self._partial_files.discard(output_file)
-        return True
+        content_range = response.headers.get('content-range', '')
+        if response.status_code == 206 and content_range.startswith(f'bytes {offset}-') \
+                and content_range.endswith(f'/{total}'):
+            metrics.add('resumes')
+            metrics.add('resumed_bytes', offset)
+            return response, offset
+        if response.status_code == 206:
+            # Content-Range 与请求不符，放弃这个连接从头下载
+            response.close()
+            headers.pop('Range')
+            response = self._request(url, headers, log_func)
+            response.raise_for_status()
+        log_func('服务器不支持断点续传，从头重新下载', level='warning')
+        metrics.add('restarts')
+        return response, 0
+
+    @staticmethod
+    def _open_reader(response):
+        """返回 readinto(memoryview) -> 读取字节数，0 表示结束
+
+        未压缩的响应直接从底层 http.client 连接读入缓冲区（零拷贝）；
+        有 Content-Encoding 时经 urllib3 解压；非真实响应（如测试替身）退回 iter_content。
+        直接读取绕过了 requests 的异常转换，这里把底层错误包装成 RequestException，
+        保证连接中途重置、读超时等仍由 download_m4a 重试。
+        """
+        raw = getattr(response, 'raw', None)
+        if isinstance(raw, io.IOBase):
+            encoding = (response.headers.get('content-encoding') or 'identity').lower()
+            fp = getattr(raw, '_fp', None)
+            if encoding == 'identity' and fp is not None and hasattr(fp, 'readinto'):
+                sock_file = getattr(fp, 'fp', None)
+                if not getattr(fp, 'chunked', True) and fp.length is not None and hasattr(sock_file, 'readinto1'):
+                    return M4ADownloader._wrap_errors(M4ADownloader._partial_reader(fp, sock_file))
+                return M4ADownloader._wrap_errors(fp.readinto)
+            raw.decode_content = True
+            return M4ADownloader._wrap_errors(raw.readinto)
+
+        chunks = iter(response.iter_content(chunk_size=64 * 1024))
+        pending = memoryview(b'')
+
+        def readinto(target):
+            nonlocal pending
+            while not pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return 0
+                pending = memoryview(chunk)
+            n = min(len(target), len(pending))
+            target[:n] = pending[:n]
+            pending = pending[n:]
+            return n
+        return readinto
+
+    @staticmethod
+    def _partial_reader(fp, sock_file):
+        """有 Content-Length 的响应：每次只做一次套接字读取，有多少数据返回多少
+
+        HTTPResponse.readinto 会一直阻塞到缓冲区填满，数据缓慢到达时调用方
+        在填满前无法检查停滞和取消；readinto1 则在收到数据后立即返回。
+        """
+        import http.client
+
+        def readinto(target):
+            remaining = fp.length
+            if not remaining:
+                fp.close()
+                return 0
+            if len(target) > remaining:
+                target = target[:remaining]
+            n = sock_file.readinto1(target)
+            if not n:
+                fp.close()
+                raise http.client.IncompleteRead(b'', remaining)
+            fp.length -= n
+            return n
+        return readinto
+
+    @staticmethod
+    def _wrap_errors(readinto):
+        """与 requests 的 iter_content 相同的异常转换规则"""
+        import http.client
+        from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError, SSLError as Urllib3SSLError
+
+        def guarded(target):
+            try:
+                return readinto(target)
+            except (ProtocolError, http.client.HTTPException) as e:
+                # 包括 IncompleteRead：服务器在 Content-Length 之前关闭了连接
+                raise requests.exceptions.ChunkedEncodingError(e)
+            except DecodeError as e:
+                raise requests.exceptions.ContentDecodingError(e)
+            except Urllib3SSLError as e:
+                raise requests.exceptions.SSLError(e)
+            except (ReadTimeoutError, OSError) as e:
+                # socket.timeout、ConnectionResetError 等
+                raise ConnectionError(e)
+        return guarded
 
-    def download_m4a(self, url, output_file, log_func=print):
+    def download_m4a(self, url, output_file, log_func=print, fail_fast=False):
+        """带重试的下载；fail_fast=True 时遇到 403/5xx 立即抛出，由调用方换用其他CDN地址"""
         for attempt in range(1, self.max_retries + 1):
             try:
-                # 控制请求频率
-                now = time.time()
-                if now - self._last_request_time < self.retry_delay:  # 使用统一延迟设置
-                    wait_time = self.retry_delay - (now - self._last_request_time)
-                    log_func(f"等待{wait_time:.1f}秒避免风控...", level='info')
-                    time.sleep(wait_time)
-                
-                self._last_request_time = time.time()
+                # 控制请求频率（使用统一延迟设置）
+                self._wait_request_slot(log_func)
                 return self._download_once(url, output_file, log_func=log_func)
             except BlockedException as e:
                 log_func(f"\n风控触发: {e}", level='error')
                 raise  # 向上抛出风控异常
             except requests.exceptions.RequestException as e:
                 error_msg = str(e)
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if fail_fast and isinstance(status, int) and (status == 403 or status >= 500):
+                    raise
                 
                 # 检查是否是403 Forbidden错误 - 在第一次遇到时就处理
                 if (hasattr(e, 'response') and e.response and 
@@ -150,9 +403,9 @@ class M4ADownloader:
         max_retries = 3
         for attempt in range(1, max_retries + 1):
             try:
-                crypted_url = fetch_track_crypted_url(int(track_id), album_id)
+                crypted_url = fetch_track_crypted_url(int(track_id), album_id, quality=self.quality)
                 if not crypted_url and album_id is not None:
-                    crypted_url = fetch_track_crypted_url(int(track_id), 0)
+                    crypted_url = fetch_track_crypted_url(int(track_id), 0, quality=self.quality)
                 if crypted_url:
                     return decrypt_url(crypted_url)
                 return None
@@ -162,7 +415,7 @@ class M4ADownloader:
                 time.sleep(1 * attempt)  # 指数退避
             except TypeError:
                 if attempt == max_retries:
-                    crypted_url = fetch_track_crypted_url(int(track_id), 0)
+                    crypted_url = fetch_track_crypted_url(int(track_id), 0, quality=self.quality)
                     if crypted_url:
                         return decrypt_url(crypted_url)
                     return None
@@ -176,9 +429,30 @@ class M4ADownloader:
         log_func(f'正在下载: {output_file}', level='info')
         
         try:
-            success = self.download_m4a(url, output_file, log_func=log_func)
+            if track_id and self._reuse_by_track_id(track_id, output_file, log_func=log_func):
+                self._record_library(track_id, album_id, output_file, log_func=log_func)
+                return True
+            candidates = self._candidate_urls(url, track_id, album_id)
+            selector = get_cdn_selector()
+            for i, candidate in enumerate(candidates):
+                is_last = i == len(candidates) - 1
+                try:
+                    # 还有其他节点可用时不在故障节点上反复重试
+                    success = self.download_m4a(candidate, output_file, log_func=log_func,
+                                                **({} if is_last else {'fail_fast': True}))
+                    break
+                except requests.exceptions.HTTPError as e:
+                    status = getattr(e.response, 'status_code', 0) or 0
+                    if status == 403 or status >= 500:
+                        selector.record_failure(candidate)
+                        if not is_last:
+                            log_func(f'CDN节点 {selector.host_of(candidate)} 返回 {status}，切换到下一个节点', level='warning')
+                            continue
+                    raise
             if success:
                 log_func('下载完成', level='info')
+                if track_id:
+                    self._record_library(track_id, album_id, output_file, log_func=log_func)
             return success
         except requests.exceptions.HTTPError as e:
             # 检查是否是403 Forbidden错误
@@ -188,22 +462,41 @@ class M4ADownloader:
                     try:
                         from utils.sqlite_cache import get_sqlite_cache
                         cache = get_sqlite_cache()
-                        cache.remove_track_cache(track_id, album_id, log_func=log_func)
+                        cache.remove_track_cache(track_id, album_id, log_func=log_func, quality=self.quality)
                         log_func(f'💡 提示：缓存已清除，请重新解析该曲目的URL后再试', level='info')
                     except Exception as cache_err:
                         log_func(f'清除缓存时出错: {cache_err}', level='error')
             raise
 
+    def _candidate_urls(self, url, track_id=None, album_id=None):
+        """url 与缓存中同一曲目的其他CDN地址，按各节点实测性能排序"""
+        urls = [url]
+        if track_id:
+            try:
+                from utils.sqlite_cache import get_sqlite_cache
+                from utils.utils import decrypt_urls
+                crypted = get_sqlite_cache().get_track_candidates(int(track_id), int(album_id or 0), quality=self.quality)
+                urls.extend(decrypt_urls(crypted))
+            except Exception:
+                pass
+        return get_cdn_selector().rank(urls)
+
     def download_track_by_id(self, track_id, album_id=None, output_file=None, log_func=print):
         """
         通过track_id和album_id直接下载音频到指定文件
         """
         try:
+            if output_file and self._reuse_by_track_id(track_id, output_file, log_func=log_func):
+                self._record_library(track_id, album_id, output_file, log_func=log_func)
+                return
             url = self.get_track_download_url(track_id, album_id)
             if not url:
                 log_func(f'未获取到下载URL: track_id={track_id}', level='error')
                 raise Exception('未获取到下载URL')
-            self.download_from_url(url, output_file, log_func=log_func)
+            # download_m4a 重试用尽后返回 False 并保留部分文件，此时不能登记到下载索引
+            if not self.download_from_url(url, output_file, log_func=log_func):
+                raise Exception(f'下载失败: track_id={track_id}')
+            self._record_library(track_id, album_id, output_file, log_func=log_func)
         except Exception as e:
             if output_file and os.path.exists(output_file):
                 try:
@@ -213,5 +506,56 @@ class M4ADownloader:
                     log_func(f'清理失败文件出错: {cleanup_err}', level='warning')
             raise
 
+    def _link_existing(self, entry, output_file, log_func=print):
+        """把已有文件链接到 output_file，成功时记下其MD5供登记索引"""
+        from utils.library_index import link_file
+        if os.path.abspath(entry.path) == os.path.abspath(output_file):
+            self._last_md5 = entry.content_hash or None
+            self._last_size = entry.expected_size
+            return True
+        try:
+            method = link_file(entry.path, output_file)
+        except OSError as e:
+            log_func(f'链接已有文件失败，改为下载: {e}', level='warning')
+            return False
+        if not method:
+            return False
+        self._last_md5 = entry.content_hash or None
+        self._last_size = entry.expected_size
+        log_func(f'内容与已下载文件相同，已通过{method}复用: {entry.path} -> {output_file}', level='info')
+        return True
+
+    def _reuse_by_track_id(self, track_id, output_file, log_func=print):
+        """同一曲目已在其他专辑目录下载过时直接链接，不请求网络"""
+        try:
+            from utils.library_index import get_library_index
+            entry = get_library_index().find_copy(track_id=track_id)
+        except Exception:
+            return False
+        return entry is not None and self._link_existing(entry, output_file, log_func)
+
+    def _link_same_content(self, total, head, output_file, log_func=print):
+        """按文件大小+头部哈希查找相同内容的已下载文件"""
+        try:
+            from utils.library_index import get_library_index, head_hash
+            entry = get_library_index().find_copy(size=total, head=head_hash(head), exclude_path=output_file)
+        except Exception:
+            return False
+        return entry is not None and self._link_existing(entry, output_file, log_func)
+
+    def _record_library(self, track_id, album_id, output_file, log_func=print):
+        """下载完成后登记到下载索引；索引不可用时不影响下载结果"""
+        if not output_file or not os.path.exists(output_file):
+            return
+        try:
+            from utils.library_index import get_library_index
+            get_library_index().record(album_id or 0, track_id, output_file, content_hash=self._last_md5,
+                                       expected_size=self._last_size)
+        except Exception as e:
+            log_func(f'登记下载索引失败: {e}', level='warning')
+        finally:
+            self._last_md5 = None
+            self._last_size = 0
+
 # 兼容旧接口，统一对外调用
 Downloader = M4ADownloader
@@ -1,7 +1,8 @@
 import os
 from downloader.downloader import Downloader
 
-def download_single_track(track_id, album_id=None, filename=None, log_func=print, save_dir=None):
+def download_single_track(track_id, album_id=None, filename=None, log_func=print, save_dir=None, bandwidth_limit=0,
+                          cancel_event=None, quality=1):
     """
     下载单个音频文件
     :param track_id: 音频ID
@@ -9,6 +10,9 @@ def download_single_track(track_id, album_id=None, filename=None, log_func=print
     :param filename: 保存文件名，默认使用音频标题.m4a
     :param log_func: 日志输出函数，支持level参数
     :param save_dir: 保存目录
+    :param bandwidth_limit: 本次下载的限速（字节/秒或 '512K' 形式），与全局限速叠加生效
+    :param cancel_event: 可选 threading.Event，置位后中止下载
+    :param quality: 音质等级（trackQualityLevel），默认1
     """
     from fetcher.track_info_fetcher import get_track_info
     # 获取音频信息用于文件名
@@ -24,7 +28,7 @@ def download_single_track(track_id, album_id=None, filename=None, log_func=print
         filepath = os.path.join(save_dir, filename)
     else:
         filepath = filename
-    downloader = Downloader()
+    downloader = Downloader(bandwidth_limit=bandwidth_limit, cancel_event=cancel_event, quality=quality)
     try:
         downloader.download_track_by_id(track_id, album_id, filepath, log_func=log_func)
         log_func(f'单曲下载完成: {filename}', level='info')
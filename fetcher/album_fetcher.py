@@ -1,10 +1,9 @@
 import requests
-import os
-from dotenv import load_dotenv
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from utils.config import get_cookies
+from utils.log import get_log
+from utils.rate_limiter import wait_for_request_slot
 
-load_dotenv()
-XIMALAYA_COOKIES = os.getenv("XIMALAYA_COOKIES", "")
 
 @dataclass
 class Album:
@@ -16,7 +15,27 @@ class Album:
     richIntro: str
     tracks: list
 
-def fetch_album(album_id):
+def fetch_album(album_id, use_cache=True, log_func=None):
+    """获取专辑信息
+
+    use_cache=True 时先查 SQLite 中的专辑信息缓存，有效期内直接返回而不发请求；
+    过期后重新请求，updateDate 变化时缓存会同时作废该专辑的曲目分页缓存。
+    请求失败时退回使用过期的缓存。
+    """
+    log = get_log('fetcher', log_func)
+    cache = None
+    cached = None
+    if use_cache:
+        try:
+            from utils.sqlite_cache import get_sqlite_cache
+            cache = get_sqlite_cache()
+            cached = cache.get_album_meta(album_id, log_func)
+        except Exception as e:
+            log.warning("[专辑信息] 缓存查询异常: %s", e)
+        if cached and cached['fresh']:
+            log.debug("[专辑信息] 使用缓存的专辑 %s 信息", album_id)
+            return Album(**dict(cached['album'], albumId=album_id, tracks=[]))
+
     url = f"https://www.ximalaya.com/revision/album/v1/simple?albumId={album_id}"
     headers = {
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
@@ -32,9 +51,10 @@ def fetch_album(album_id):
         "sec-ch-ua": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
         "sec-ch-ua-mobile": "?0",
         "sec-ch-ua-platform": '"Windows"',
-        "Cookie": XIMALAYA_COOKIES
+        "Cookie": get_cookies()
     }
     try:
+        wait_for_request_slot()  # 多进程worker共享的限流
         response = requests.get(url, headers=headers)
         response.raise_for_status()  # Raise an error for bad responses
         if response.status_code == 200:
@@ -52,13 +72,17 @@ def fetch_album(album_id):
                           richIntro=album_info.get('richIntro', ''), 
                           tracks=[]
                           )
+            if cache is not None and album_info:
+                cache.cache_album_meta(album_id, asdict(album), log_func)
             return album
         else:
             print(f"Failed to fetch album info: {response.status_code}, {response.text}")
-            return None
     except Exception as e:
         print(f"Exception fetching album info: {e}")
-        return None
+    if cached:
+        log.info("[专辑信息] 请求失败，使用过期的缓存专辑信息: %s", album_id)
+        return Album(**dict(cached['album'], albumId=album_id, tracks=[]))
+    return None
 
 # 如需用到 Track 类型或 decrypt_url，可这样导入：
 # from fetcher.track_fetcher import Track
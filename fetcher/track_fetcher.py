@@ -1,17 +1,13 @@
 class BlockedException(Exception):
     pass
+import json
 import requests
-import os
 from utils.utils import decrypt_url
-from dotenv import load_dotenv
+from utils.log import clip, get_log, lazy
+from utils.rate_limiter import wait_for_request_slot
+from utils.config import get_cookies
 from dataclasses import dataclass
 from typing import List, Optional
-import urllib3
-# 忽略 InsecureRequestWarning
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-load_dotenv()
-XIMALAYA_COOKIES = os.getenv("XIMALAYA_COOKIES", "")
 
 @dataclass
 class Track:
@@ -27,124 +23,141 @@ class Track:
     pageSize: Optional[int] = None    # 每页音频数量
     cover: Optional[str] = None       # 专辑封面
 
-def fetch_track_crypted_url(track_id: int, album_id: int, log_func=None, use_cache: bool = True) -> str:
+def _json_preview(data, limit: int = 500) -> str:
+    return clip(json.dumps(data, ensure_ascii=False), limit)
+
+
+def play_url_candidates(play_url_list: List[dict]) -> List[str]:
+    """playUrlList 中与第一项同格式的全部加密URL（不同CDN节点），去重并保持原顺序"""
+    if not play_url_list:
+        return []
+    first_type = play_url_list[0].get("type")
+    urls = [item.get("url", "") for item in play_url_list
+            if item.get("url") and (first_type is None or item.get("type") == first_type)]
+    return list(dict.fromkeys(urls))
+
+
+def record_play_url_qualities(track_id: int, track_info: dict):
+    """把 playUrlList 中各音质的格式和文件大小记入缓存，供按预算选择音质"""
+    try:
+        from utils.sqlite_cache import get_sqlite_cache, TrackQuality
+        duration = int(track_info.get("duration") or 0)
+        qualities = [TrackQuality(track_id, int(item.get("qualityLevel", 1)), item.get("type") or "",
+                                  int(item.get("fileSize") or 0), duration)
+                     for item in track_info.get("playUrlList") or []]
+        get_sqlite_cache().record_track_qualities(qualities)
+    except Exception:
+        pass
+
+
+def fetch_track_crypted_url(track_id: int, album_id: int, log_func=None, use_cache: bool = True,
+                            quality: int = 1) -> str:
+    """解析曲目的加密播放地址；quality 为 baseInfo 的 trackQualityLevel，缓存按音质分别保存"""
     import time
     import random
-    import json
     
-    # 定义日志输出函数
-    def log(msg, level='info'):
-        if log_func:
-            if callable(getattr(log_func, '__call__', None)):
-                # 检查log_func是否支持level参数
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    # 如果不支持level参数，则只传递消息
-                    log_func(msg)
-        else:
-            print(msg)
+    log = get_log('fetcher', log_func)
     
     # 尝试从缓存获取URL
     if use_cache:
-        log(f"[Track解析] 尝试从缓存获取 Track {track_id} URL...", 'info')
+        log.debug("[Track解析] 尝试从缓存获取 Track %s URL...", track_id)
         try:
             from utils.sqlite_cache import get_sqlite_cache
             cache = get_sqlite_cache()
-            cached_track = cache.get_cached_track(track_id, album_id, log_func)
+            cached_track = cache.get_cached_track(track_id, album_id, log_func, quality=quality)
             if cached_track and cached_track.crypted_url:
-                log(f"[Track解析] ✅ 缓存命中！返回缓存URL Track {track_id}", 'info')
-                log(f"[Track解析] 返回URL: {cached_track.crypted_url[:50]}{'...' if len(cached_track.crypted_url) > 50 else ''}", 'info')
+                log.debug("[Track解析] ✅ 缓存命中！返回缓存URL Track %s", track_id)
+                log.trace("[Track解析] 返回URL: %s", lazy(clip, cached_track.crypted_url))
                 return cached_track.crypted_url
             else:
-                log(f"[Track解析] ❌ 缓存未命中，需要网络解析 Track {track_id}", 'info')
+                log.debug("[Track解析] ❌ 缓存未命中，需要网络解析 Track %s", track_id)
         except Exception as e:
-            log(f"[Track解析] ❌ 缓存读取异常: {e}", 'warning')
+            log.warning("[Track解析] ❌ 缓存读取异常: %s", e)
     else:
-        log(f"[Track解析] 缓存已禁用，直接网络解析 Track {track_id}", 'info')
+        log.debug("[Track解析] 缓存已禁用，直接网络解析 Track %s", track_id)
     
     # 随机延迟2-5秒，避免请求过于频繁
     delay = random.uniform(2.0, 5.0)
-    log(f"[Track解析] 等待 {delay:.1f}秒 后请求 track_id={track_id}", 'info')
+    log.debug("[Track解析] 等待 %.1f秒 后请求 track_id=%s", delay, track_id)
     time.sleep(delay)
     
     url = f"https://www.ximalaya.com/mobile-playpage/track/v3/baseInfo/{album_id}"
     params = {
         "device": "web",
         "trackId": track_id,
-        "trackQualityLevel": 1
+        "trackQualityLevel": quality
     }
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
         "Accept": "application/json",
-        "Cookie": XIMALAYA_COOKIES
+        "Cookie": get_cookies()
     }
     
     # 打印请求信息
-    log(f"[Track解析] 请求URL: {url}", 'info')
-    log(f"[Track解析] 请求参数: {json.dumps(params, ensure_ascii=False)}", 'info')
+    log.debug("[Track解析] 请求URL: %s", url)
+    log.trace("[Track解析] 请求参数: %s", lazy(json.dumps, params, ensure_ascii=False))
     
     max_retries = 3
     for attempt in range(max_retries):
         try:
+            wait_for_request_slot()  # 多进程worker共享的限流
             response = requests.get(url, headers=headers, params=params, timeout=30)
-            log(f"[Track解析] 响应状态码: {response.status_code}", 'info')
+            log.debug("[Track解析] 响应状态码: %s", response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
-                # 打印响应数据（限制长度）
-                response_str = json.dumps(data, ensure_ascii=False)
-                if len(response_str) > 500:
-                    log(f"[Track解析] 响应数据(截取): {response_str[:500]}...", 'info')
-                else:
-                    log(f"[Track解析] 响应数据: {response_str}", 'info')
+                # 打印响应数据（限制长度，仅 trace 级别才序列化）
+                log.trace("[Track解析] 响应数据: %s", lazy(_json_preview, data))
                 
                 # 检查风控
                 if data.get("ret") == 1001 or "系统繁忙" in data.get("msg", ""):
                     if attempt < max_retries - 1:
                         # 风控触发时等待更长时间再重试
                         wait_time = random.uniform(30.0, 60.0) * (attempt + 1)
-                        log(f"[Track解析] 风控触发，等待 {wait_time:.1f} 秒后重试 (第{attempt+1}次): track {track_id}", 'warning')
+                        log.warning("[Track解析] 风控触发，等待 %.1f 秒后重试 (第%d次): track %s", wait_time, attempt + 1, track_id)
                         time.sleep(wait_time)
                         continue
                     else:
-                        log(f"[Track解析] 风控触发: track {track_id}: {response.status_code}, {response.text}", 'error')
+                        log.error("[Track解析] 风控触发: track %s: %s, %s", track_id, response.status_code, response.text)
                         raise BlockedException(f"系统繁忙，风控触发: {response.text}")
                 
                 play_url_list = data.get("trackInfo", {}).get("playUrlList", [])
+                record_play_url_qualities(track_id, data.get("trackInfo") or {})
                 if play_url_list:
                     encrypted_url = play_url_list[0].get("url", "")
-                    log(f"[Track解析] 获取到加密URL: {encrypted_url[:50]}..." if len(encrypted_url) > 50 else f"[Track解析] 获取到加密URL: {encrypted_url}", 'info')
+                    log.trace("[Track解析] 获取到加密URL: %s", lazy(clip, encrypted_url))
                     
                     # 缓存URL
                     if use_cache:
-                        log(f"[Track解析] 准备缓存解析结果 Track {track_id}...", 'info')
+                        log.trace("[Track解析] 准备缓存解析结果 Track %s...", track_id)
                         try:
                             from utils.sqlite_cache import get_sqlite_cache
                             from utils.utils import decrypt_url
                             cache = get_sqlite_cache()
                             decrypted_url = decrypt_url(encrypted_url)
-                            log(f"[Track解析] 开始写入缓存: crypted_len={len(encrypted_url)}, decrypted_len={len(decrypted_url)}", 'info')
+                            log.trace("[Track解析] 开始写入缓存: crypted_len=%d, decrypted_len=%d",
+                                      len(encrypted_url), len(decrypted_url))
                             cache.cache_track(track_id, album_id, 
                                             crypted_url=encrypted_url, 
                                             decrypted_url=decrypted_url, 
-                                            log_func=log_func)
-                            log(f"[Track解析] ✅ 缓存写入调用完成 Track {track_id}", 'info')
+                                            extra_data={'candidates': play_url_candidates(play_url_list)},
+                                            log_func=log_func, quality=quality)
+                            log.trace("[Track解析] ✅ 缓存写入调用完成 Track %s", track_id)
                         except Exception as e:
-                            log(f"[Track解析] ❌ 缓存保存失败 Track {track_id}: {e}", 'warning')
+                            log.warning("[Track解析] ❌ 缓存保存失败 Track %s: %s", track_id, e)
                             import traceback
-                            log(f"[Track解析] 详细错误: {traceback.format_exc()}", 'warning')
+                            log.debug("[Track解析] 详细错误: %s", lazy(traceback.format_exc))
                     
                     return encrypted_url
                 else:
-                    log(f"[Track解析] 未找到playUrlList，track_id={track_id}", 'warning')
+                    log.warning("[Track解析] 未找到playUrlList，track_id=%s", track_id)
                     
             else:
-                log(f"[Track解析] 请求失败 track {track_id}: {response.status_code}, {response.text[:200] if len(response.text) > 200 else response.text}", 'error')
+                log.error("[Track解析] 请求失败 track %s: %s, %s", track_id, response.status_code, response.text[:200])
             
             if attempt < max_retries - 1:
                 wait_time = random.uniform(5.0, 10.0)
-                log(f"[Track解析] 等待 {wait_time:.1f} 秒后重试", 'info')
+                log.info("[Track解析] 等待 %.1f 秒后重试", wait_time)
                 time.sleep(wait_time)
                 
         except BlockedException:
@@ -152,35 +165,23 @@ def fetch_track_crypted_url(track_id: int, album_id: int, log_func=None, use_cac
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = random.uniform(5.0, 15.0)
-                log(f"[Track解析] 请求异常，等待 {wait_time:.1f} 秒后重试: {e}", 'warning')
+                log.warning("[Track解析] 请求异常，等待 %.1f 秒后重试: %s", wait_time, e)
                 time.sleep(wait_time)
             else:
-                log(f"[Track解析] 请求失败，放弃重试: {e}", 'error')
+                log.error("[Track解析] 请求失败，放弃重试: %s", e)
                 raise
     
     return ""
 
-def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None) -> List[Track]:
+def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None, quality: int = 1) -> List[Track]:
     import time
     import random
-    import json
     
-    # 定义日志输出函数
-    def log(msg, level='info'):
-        if log_func:
-            if callable(getattr(log_func, '__call__', None)):
-                # 检查log_func是否支持level参数
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    # 如果不支持level参数，则只传递消息
-                    log_func(msg)
-        else:
-            print(msg)
+    log = get_log('fetcher', log_func)
     
     # 为专辑曲目列表请求也添加延迟
     delay = random.uniform(1.0, 3.0)
-    log(f"[专辑曲目] 等待 {delay:.1f}秒 后请求第{page}页", 'info')
+    log.debug("[专辑曲目] 等待 %.1f秒 后请求第%s页", delay, page)
     time.sleep(delay)
     
     url = f"https://m.ximalaya.com/m-revision/common/album/queryAlbumTrackRecordsByPage"
@@ -201,19 +202,20 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None)
         "sec-ch-ua": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
         "sec-ch-ua-mobile": "?0",
         "sec-ch-ua-platform": '"Windows"',
-        "Cookie": XIMALAYA_COOKIES,
+        "Cookie": get_cookies(),
         "X-Requested-With": "XMLHttpRequest"
     }
     
     # 打印请求信息
-    log(f"[专辑曲目] 请求URL: {url}", 'info')
-    log(f"[专辑曲目] 请求参数: {json.dumps(params, ensure_ascii=False)}", 'info')
+    log.debug("[专辑曲目] 请求URL: %s", url)
+    log.trace("[专辑曲目] 请求参数: %s", lazy(json.dumps, params, ensure_ascii=False))
     
     max_retries = 2
     for attempt in range(max_retries):
         try:
+            wait_for_request_slot()  # 多进程worker共享的限流
             response = requests.get(url, headers=headers, params=params, timeout=30)
-            log(f"[专辑曲目] 响应状态码: {response.status_code}", 'info')
+            log.debug("[专辑曲目] 响应状态码: %s", response.status_code)
             
             if response.status_code == 200:
                 data = response.json()
@@ -221,12 +223,13 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None)
                 # 打印响应数据的关键信息
                 total_count = data.get("data", {}).get("totalCount", 0)
                 track_count = len(data.get("data", {}).get("trackDetailInfos", []))
-                log(f"[专辑曲目] 总曲目数: {total_count}, 本页曲目数: {track_count}", 'info')
+                log.info("[专辑曲目] 总曲目数: %s, 本页曲目数: %s", total_count, track_count)
                 
                 # 打印部分响应数据
                 if track_count > 0:
                     first_track = data.get("data", {}).get("trackDetailInfos", [])[0]
-                    log(f"[专辑曲目] 第一个曲目信息: {json.dumps(first_track.get('trackInfo', {}).get('title', ''), ensure_ascii=False)}", 'info')
+                    log.trace("[专辑曲目] 第一个曲目信息: %s",
+                              lazy(json.dumps, first_track.get('trackInfo', {}).get('title', ''), ensure_ascii=False))
                 
                 track_list = data.get("data", {}).get("trackDetailInfos", [])
                 tracks = []
@@ -236,22 +239,22 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None)
                         track_title = track_info.get("title", "未知标题")
                         track_id = track_info.get("id")
                         
-                        log(f"[专辑曲目] 正在解析第{(page-1)*page_size + i + 1}个曲目: {track_title} (ID: {track_id})", 'info')
+                        log.info("[专辑曲目] 正在解析第%d个曲目: %s (ID: %s)", (page - 1) * page_size + i + 1, track_title, track_id)
                         
                         try:
-                            crypted_url = fetch_track_crypted_url(track_id, album_id, log_func=log_func)
+                            crypted_url = fetch_track_crypted_url(track_id, album_id, log_func=log_func, quality=quality)
                         except BlockedException as be:
-                            log(f"[专辑曲目] 风控终止专辑曲目拉取: {be}", 'error')
+                            log.error("[专辑曲目] 风控终止专辑曲目拉取: %s", be)
                             # 直接抛出到外层
                             raise
                         
                         if not crypted_url:
-                            log(f"[专辑曲目] 跳过: {track_title}，无有效播放链接", 'warning')
+                            log.warning("[专辑曲目] 跳过: %s，无有效播放链接", track_title)
                             continue
                         
                         # 解密URL
                         decrypted_url = decrypt_url(crypted_url)
-                        log(f"[专辑曲目] 解密后URL: {decrypted_url[:100]}..." if len(decrypted_url) > 100 else f"[专辑曲目] 解密后URL: {decrypted_url}", 'info')
+                        log.trace("[专辑曲目] 解密后URL: %s", lazy(clip, decrypted_url, 100))
                         
                         cover_path = track_info.get("cover")
                         cover_url = f"https://imagev2.xmcdn.com/{cover_path}" if cover_path and not cover_path.startswith("http") else cover_path
@@ -270,19 +273,19 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None)
                                 cover=cover_url,  # 拼接后的专辑封面
                             )
                         )
-                        log(f"[专辑曲目] 成功解析: {track_title}", 'info')
+                        log.debug("[专辑曲目] 成功解析: %s", track_title)
                     
-                    log(f"[专辑曲目] 第{page}页解析完成，共{len(tracks)}个曲目", 'info')
+                    log.info("[专辑曲目] 第%s页解析完成，共%d个曲目", page, len(tracks))
                     return tracks
                     
                 except BlockedException:
                     # 直接抛出到外层
                     raise
             else:
-                log(f"[专辑曲目] 请求失败: {response.status_code}, {response.text[:200] if len(response.text) > 200 else response.text}", 'error')
+                log.error("[专辑曲目] 请求失败: %s, %s", response.status_code, response.text[:200])
                 if attempt < max_retries - 1:
                     wait_time = random.uniform(10.0, 20.0)
-                    log(f"[专辑曲目] 等待 {wait_time:.1f} 秒后重试", 'info')
+                    log.info("[专辑曲目] 等待 %.1f 秒后重试", wait_time)
                     time.sleep(wait_time)
                     
         except BlockedException:
@@ -290,10 +293,10 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int, log_func=None)
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = random.uniform(10.0, 20.0)
-                log(f"[专辑曲目] 获取专辑曲目异常，等待 {wait_time:.1f} 秒后重试: {e}", 'warning')
+                log.warning("[专辑曲目] 获取专辑曲目异常，等待 %.1f 秒后重试: %s", wait_time, e)
                 time.sleep(wait_time)
             else:
-                log(f"[专辑曲目] 获取专辑曲目失败: {e}", 'error')
+                log.error("[专辑曲目] 获取专辑曲目失败: %s", e)
                 raise
                 
     return []
@@ -303,18 +306,8 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
     """快速获取专辑曲目列表，优先使用缓存"""
     import time
     import random
-    import json
     
-    # 定义日志输出函数
-    def log(msg, level='info'):
-        if log_func:
-            if callable(getattr(log_func, '__call__', None)):
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    log_func(msg)
-        else:
-            print(msg)
+    log = get_log('fetcher', log_func)
     
     # 尝试从专辑页面缓存获取数据
     try:
@@ -323,7 +316,7 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
         cached_page = cache.get_cached_album_page(album_id, page, page_size, log_func)
         
         if cached_page:
-            log(f"[快速解析] ✅ 专辑页面缓存命中！直接返回第{page}页数据", 'info')
+            log.debug("[快速解析] ✅ 专辑页面缓存命中！直接返回第%s页数据", page)
             tracks = []
             for track_data in cached_page['tracks']:
                 track = Track(
@@ -340,16 +333,16 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
                 )
                 tracks.append(track)
             
-            log(f"[快速解析] 从缓存返回 {len(tracks)} 个曲目", 'info')
+            log.info("[快速解析] 从缓存返回 %d 个曲目", len(tracks))
             return tracks
         else:
-            log(f"[快速解析] ❌ 专辑页面缓存未命中，需要网络请求第{page}页", 'info')
+            log.debug("[快速解析] ❌ 专辑页面缓存未命中，需要网络请求第%s页", page)
     except Exception as e:
-        log(f"[快速解析] ❌ 缓存查询异常: {e}", 'warning')
+        log.warning("[快速解析] ❌ 缓存查询异常: %s", e)
     
     # 缓存未命中，进行网络请求
     delay = random.uniform(0.5, 1.5)
-    log(f"[快速解析] 等待 {delay:.1f}秒 后请求第{page}页", 'info')
+    log.debug("[快速解析] 等待 %.1f秒 后请求第%s页", delay, page)
     time.sleep(delay)
     
     url = f"https://m.ximalaya.com/m-revision/common/album/queryAlbumTrackRecordsByPage"
@@ -370,15 +363,16 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
         "sec-ch-ua": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
         "sec-ch-ua-mobile": "?0",
         "sec-ch-ua-platform": '"Windows"',
-        "Cookie": XIMALAYA_COOKIES,
+        "Cookie": get_cookies(),
         "X-Requested-With": "XMLHttpRequest"
     }
     
-    log(f"[快速解析] 请求第{page}页曲目列表", 'info')
+    log.debug("[快速解析] 请求第%s页曲目列表", page)
     
     max_retries = 2
     for attempt in range(max_retries):
         try:
+            wait_for_request_slot()  # 多进程worker共享的限流
             response = requests.get(url, headers=headers, params=params, timeout=30)
             
             if response.status_code == 200:
@@ -386,7 +380,7 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
                 
                 total_count = data.get("data", {}).get("totalCount", 0)
                 track_count = len(data.get("data", {}).get("trackDetailInfos", []))
-                log(f"[快速解析] 第{page}页: {track_count}个曲目 (总共{total_count})", 'info')
+                log.debug("[快速解析] 第%s页: %s个曲目 (总共%s)", page, track_count, total_count)
                 
                 track_list = data.get("data", {}).get("trackDetailInfos", [])
                 tracks = []
@@ -416,7 +410,7 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
                         )
                     )
                 
-                log(f"[快速解析] 第{page}页解析完成，共{len(tracks)}个曲目", 'info')
+                log.info("[快速解析] 第%s页解析完成，共%d个曲目", page, len(tracks))
                 
                 # 缓存专辑页面数据
                 try:
@@ -434,29 +428,29 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
                             'duration': track.duration
                         })
                     
-                    log(f"[快速解析] 准备缓存专辑 {album_id} 第{page}页数据...", 'info')
+                    log.trace("[快速解析] 准备缓存专辑 %s 第%s页数据...", album_id, page)
                     cache.cache_album_page(album_id, page, page_size, tracks_data, total_count, log_func)
-                    log(f"[快速解析] ✅ 专辑页面缓存写入完成", 'info')
+                    log.trace("[快速解析] ✅ 专辑页面缓存写入完成")
                     
                 except Exception as e:
-                    log(f"[快速解析] ❌ 专辑页面缓存写入失败: {e}", 'warning')
+                    log.warning("[快速解析] ❌ 专辑页面缓存写入失败: %s", e)
                 
                 return tracks
                 
             else:
-                log(f"[快速解析] 请求失败: {response.status_code}", 'error')
+                log.error("[快速解析] 请求失败: %s", response.status_code)
                 if attempt < max_retries - 1:
                     wait_time = random.uniform(5.0, 10.0)
-                    log(f"[快速解析] 等待 {wait_time:.1f} 秒后重试", 'info')
+                    log.info("[快速解析] 等待 %.1f 秒后重试", wait_time)
                     time.sleep(wait_time)
                     
         except Exception as e:
             if attempt < max_retries - 1:
                 wait_time = random.uniform(5.0, 10.0)
-                log(f"[快速解析] 请求异常，等待 {wait_time:.1f} 秒后重试: {e}", 'warning')
+                log.warning("[快速解析] 请求异常，等待 %.1f 秒后重试: %s", wait_time, e)
                 time.sleep(wait_time)
             else:
-                log(f"[快速解析] 请求失败: {e}", 'error')
+                log.error("[快速解析] 请求失败: %s", e)
                 raise
                 
     return []
@@ -465,25 +459,18 @@ def fetch_album_tracks_fast(album_id: int, page: int, page_size: int, log_func=N
 class SmartConcurrentParser:
     """智能并发解析器，支持动态延迟调整"""
     
-    def __init__(self, album_id: int, log_func=None, max_workers: int = 3):
+    def __init__(self, album_id: int, log_func=None, max_workers: int = 3, quality: int = 1):
         self.album_id = album_id
         self.log_func = log_func
         self.max_workers = max_workers
+        self.quality = quality  # trackQualityLevel
         
         # 智能延迟参数
         self.base_delay = 2.0  # 基础延迟
         self.success_count = 0
         self.total_count = 0
         self.current_delay = self.base_delay
-        
-    def log(self, msg, level='info'):
-        if self.log_func:
-            try:
-                self.log_func(msg, level=level)
-            except TypeError:
-                self.log_func(msg)
-        else:
-            print(msg)
+        self.log = get_log('fetcher', log_func)
     
     def update_delay_strategy(self, success: bool):
         """根据成功率动态调整延迟策略"""
@@ -499,26 +486,26 @@ class SmartConcurrentParser:
         elif success_rate < 0.5:  # 成功率低，增加延迟
             self.current_delay = min(10.0, self.current_delay * 1.5)
         
-        self.log(f"[智能延迟] 成功率: {success_rate:.1%} ({self.success_count}/{self.total_count}), 当前延迟: {self.current_delay:.1f}秒", 'info')
+        self.log.debug("[智能延迟] 成功率: %.1f%% (%d/%d), 当前延迟: %.1f秒",
+                       success_rate * 100, self.success_count, self.total_count, self.current_delay)
     
     def parse_single_track_url(self, track_id: int) -> tuple:
         """解析单个曲目的URL，返回(track_id, crypted_url, decrypted_url, success)"""
         import time
         import random
-        import json
         
         try:
             # 尝试从缓存获取URL
             try:
                 from utils.sqlite_cache import get_sqlite_cache
                 cache = get_sqlite_cache()
-                cached_track = cache.get_cached_track(track_id, self.album_id, self.log_func)
+                cached_track = cache.get_cached_track(track_id, self.album_id, self.log_func, quality=self.quality)
                 if cached_track and cached_track.crypted_url:
-                    self.log(f"[并发解析] Track {track_id} 使用缓存URL", 'info')
+                    self.log.debug("[并发解析] Track %s 使用缓存URL", track_id)
                     self.update_delay_strategy(True)
                     return track_id, cached_track.crypted_url, cached_track.decrypted_url, True
             except Exception as e:
-                self.log(f"[缓存] 读取缓存失败: {e}", 'warning')
+                self.log.warning("[缓存] 读取缓存失败: %s", e)
             # 使用智能延迟
             delay = random.uniform(self.current_delay * 0.8, self.current_delay * 1.2)
             time.sleep(delay)
@@ -527,14 +514,16 @@ class SmartConcurrentParser:
             params = {
                 "device": "web",
                 "trackId": track_id,
-                "trackQualityLevel": 1
+                "trackQualityLevel": self.quality
             }
             headers = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
                 "Accept": "application/json",
-                "Cookie": XIMALAYA_COOKIES
+                "Cookie": get_cookies()
             }
             
+            wait_for_request_slot()  # 多进程worker共享的限流
+            
             response = requests.get(url, headers=headers, params=params, timeout=30)
             
             if response.status_code == 200:
@@ -542,45 +531,47 @@ class SmartConcurrentParser:
                 
                 # 检查风控
                 if data.get("ret") == 1001 or "系统繁忙" in data.get("msg", ""):
-                    self.log(f"[并发解析] Track {track_id} 风控触发", 'warning')
+                    self.log.warning("[并发解析] Track %s 风控触发", track_id)
                     self.update_delay_strategy(False)
                     return track_id, "", "", False
                 
                 play_url_list = data.get("trackInfo", {}).get("playUrlList", [])
+                record_play_url_qualities(track_id, data.get("trackInfo") or {})
                 if play_url_list:
                     crypted_url = play_url_list[0].get("url", "")
                     decrypted_url = decrypt_url(crypted_url)
                     
                     # 缓存新解析的URL
-                    self.log(f"[并发解析] 准备缓存解析结果 Track {track_id}...", 'info')
+                    self.log.trace("[并发解析] 准备缓存解析结果 Track %s...", track_id)
                     try:
                         from utils.sqlite_cache import get_sqlite_cache
                         cache = get_sqlite_cache()
-                        self.log(f"[并发解析] 开始写入缓存: crypted_len={len(crypted_url)}, decrypted_len={len(decrypted_url)}", 'info')
+                        self.log.trace("[并发解析] 开始写入缓存: crypted_len=%d, decrypted_len=%d", len(crypted_url), len(decrypted_url))
                         cache.cache_track(track_id, self.album_id, 
                                         crypted_url=crypted_url, 
                                         decrypted_url=decrypted_url, 
-                                        log_func=self.log_func)
-                        self.log(f"[并发解析] ✅ 缓存写入调用完成 Track {track_id}", 'info')
+                                        extra_data={'candidates': play_url_candidates(play_url_list)},
+                                        log_func=self.log_func, quality=self.quality)
+                        self.log.trace("[并发解析] ✅ 缓存写入调用完成 Track %s", track_id)
                     except Exception as e:
-                        self.log(f"[并发解析] ❌ 缓存保存失败 Track {track_id}: {e}", 'warning')
+                        self.log.warning("[并发解析] ❌ 缓存保存失败 Track %s: %s", track_id, e)
                         import traceback
-                        self.log(f"[并发解析] 详细错误: {traceback.format_exc()}", 'warning')
+                        self.log.debug("[并发解析] 详细错误: %s", lazy(traceback.format_exc))
                     
-                    self.log(f"[并发解析] Track {track_id} 解析成功", 'info')
+                    self.log.debug("[并发解析] Track %s 解析成功", track_id)
                     self.update_delay_strategy(True)
                     return track_id, crypted_url, decrypted_url, True
                 else:
-                    self.log(f"[并发解析] Track {track_id} 无播放链接", 'warning')
+                    self.log.warning("[并发解析] Track %s 无播放链接", track_id)
                     self.update_delay_strategy(False)
                     return track_id, "", "", False
             else:
-                self.log(f"[并发解析] Track {track_id} HTTP错误: {response.status_code}", 'error')
+                self.log.error("[并发解析] Track %s HTTP错误: %s", track_id, response.status_code)
                 self.update_delay_strategy(False)
                 return track_id, "", "", False
                 
         except Exception as e:
-            self.log(f"[并发解析] Track {track_id} 异常: {e}", 'error')
+            self.log.error("[并发解析] Track %s 异常: %s", track_id, e)
             self.update_delay_strategy(False)
             return track_id, "", "", False
     
@@ -592,7 +583,7 @@ class SmartConcurrentParser:
         if not tracks:
             return tracks
         
-        self.log(f"[并发解析] 开始并发解析 {len(tracks)} 个曲目，并发数: {self.max_workers}", 'info')
+        self.log.info("[并发解析] 开始并发解析 %d 个曲目，并发数: %d", len(tracks), self.max_workers)
         
         # 准备需要解析的track_id列表
         track_ids = [track.trackId for track in tracks]
@@ -629,12 +620,13 @@ class SmartConcurrentParser:
                 update_progress()
         
         success_count = sum(1 for track in tracks if track.url)
-        self.log(f"[并发解析] 完成！成功解析 {success_count}/{len(tracks)} 个曲目", 'info')
+        self.log.info("[并发解析] 完成！成功解析 %d/%d 个曲目", success_count, len(tracks))
         
         return tracks
 
 
-def parse_tracks_concurrent(tracks: List[Track], album_id: int, log_func=None, progress_callback=None, max_workers: int = 3) -> List[Track]:
+def parse_tracks_concurrent(tracks: List[Track], album_id: int, log_func=None, progress_callback=None, max_workers: int = 3,
+                            quality: int = 1) -> List[Track]:
     """并发解析曲目URL的便捷函数"""
-    parser = SmartConcurrentParser(album_id, log_func, max_workers)
+    parser = SmartConcurrentParser(album_id, log_func, max_workers, quality=quality)
     return parser.parse_tracks_concurrent(tracks, progress_callback)
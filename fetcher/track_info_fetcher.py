@@ -1,11 +1,9 @@
 import requests
-import os
-from dotenv import load_dotenv
 from dataclasses import dataclass
+from utils.config import get_cookies
+from utils.rate_limiter import wait_for_request_slot
 from typing import Optional
 
-load_dotenv()
-XIMALAYA_COOKIES = os.getenv("XIMALAYA_COOKIES", "")
 
 def fetch_track_info(track_id: int) -> dict:
     """
@@ -17,11 +15,12 @@ def fetch_track_info(track_id: int) -> dict:
         "Accept": "*/*",
         "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
         "Content-Type": "application/x-www-form-urlencoded;charset=UTF-8",
-        "Cookie": XIMALAYA_COOKIES,
+        "Cookie": get_cookies(),
         "Referer": f"https://www.ximalaya.com/sound/{track_id}",
         "x-kl-kfa-ajax-request": "Ajax_Request",
         "Connection": "keep-alive",
     }
+    wait_for_request_slot()  # 多进程worker共享的限流
     response = requests.get(url, headers=headers)
     if response.status_code == 200:
         try:
@@ -1,19 +1,35 @@
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
-import threading
 import re
-from PIL import Image, ImageTk
-import requests
-from io import BytesIO
-from fetcher.album_fetcher import fetch_album
-from fetcher.track_fetcher import fetch_album_tracks, fetch_album_tracks_fast, parse_tracks_concurrent
-from downloader.album_download import AlbumDownloader
-from downloader.single_track_download import download_single_track
 import tkinter.ttk as ttk
 
+# 注意：requests、PIL、抓取器和下载器等较重的模块都在首次使用时才导入，
+# 保证主窗口尽快显示（PyInstaller打包后在NAS等慢速存储上尤其明显）
+
 class XimalayaGUI:
+    # 日志框最多保留的行数，超出后删除最早的行
+    MAX_LOG_LINES = 5000
+    # 日志缓冲的批量写入间隔（毫秒）
+    LOG_DRAIN_INTERVAL_MS = 100
+    # 日志框级别筛选：显示名 -> 最低级别
+    LOG_FILTERS = {'全部': 0, '信息': 20, '警告': 30, '错误': 40}
+    # 每次空闲回调执行界面更新的时间预算（秒），超出后让出事件循环
+    UI_UPDATE_BUDGET = 0.012
+    # 关闭窗口时等待后台任务结束的最长时间（秒）
+    SHUTDOWN_TIMEOUT = 5.0
+
     def __init__(self, root, default_download_dir=None):
+        from collections import deque
+        from utils.log import LogBuffer
+        from utils.task_executor import get_task_executor
         self.root = root
+        # 后台任务统一交给有界线程池；退出时等待任务结束后把缓存和下载进度落盘
+        self.executor = get_task_executor()
+        self.executor.add_shutdown_hook(self._flush_stores)
+        # 各线程写日志只进缓冲，界面线程定时批量取出写入日志框
+        self._log_buffer = LogBuffer()
+        self._log_history = deque(maxlen=self.MAX_LOG_LINES)
+        self._log_min_level = 0
         self.default_download_dir = default_download_dir
         self.root.title('喜马拉雅批量下载工具 - 增强版')
         self.root.geometry('1200x900')  # 调整窗口大小
@@ -27,6 +43,7 @@ class XimalayaGUI:
         
         self._init_widgets()
         self.setup_log_tags()
+        self.root.protocol('WM_DELETE_WINDOW', self.on_close)
         
         # 确保初始化完成后窗口仍在前台
         self.root.after(100, lambda: self.root.lift())
@@ -63,6 +80,22 @@ class XimalayaGUI:
         self.delay_var = tk.StringVar(value='5')
         tk.Entry(input_frame, textvariable=self.delay_var, width=10).grid(row=1, column=1, sticky='w', pady=(10, 0))
         
+        # 下载限速（所有下载共享，0为不限速）
+        tk.Label(input_frame, text='限速(KB/s):').grid(row=2, column=0, sticky='w', padx=(0, 5), pady=(10, 0))
+        self.bandwidth_var = tk.StringVar(value='0')
+        tk.Entry(input_frame, textvariable=self.bandwidth_var, width=10).grid(row=2, column=1, sticky='w', pady=(10, 0))
+        
+        # 选中曲目的并发下载数（CDN下载不受 baseInfo 接口的频率限制）
+        tk.Label(input_frame, text='并发下载数:').grid(row=3, column=0, sticky='w', padx=(0, 5), pady=(10, 0))
+        self.concurrency_var = tk.StringVar(value='3')
+        tk.Entry(input_frame, textvariable=self.concurrency_var, width=10).grid(row=3, column=1, sticky='w', pady=(10, 0))
+        
+        # 实时监控下载目录（仅Linux，inotify）
+        self.watch_library_var = tk.BooleanVar(value=False)
+        self._library_watcher = None
+        tk.Checkbutton(input_frame, text='实时监控下载目录', variable=self.watch_library_var,
+                       command=self.toggle_library_watch).grid(row=2, column=2, columnspan=2, sticky='w', pady=(10, 0))
+        
         # 恢复下载按钮
         tk.Button(input_frame, text='恢复下载', command=self.resume_download, bg='lightgreen').grid(row=1, column=2, columnspan=2, sticky='e', pady=(10, 0))
         
@@ -142,18 +175,16 @@ class XimalayaGUI:
         tree_frame = tk.Frame(tracks_frame)
         tree_frame.pack(fill='both', expand=True)
         
-        # 创建优化的Treeview，提高多选响应性
-        self.tracks_tree = ttk.Treeview(tree_frame, columns=('title', 'duration', 'url_status'), show='tree headings')
-        self.tracks_tree.pack(side='left', fill='both', expand=True)
-        
-        # 配置优化设置
-        self.tracks_tree.configure(selectmode='extended')  # 明确启用多选模式
+        # 虚拟化列表：只为可见行创建Treeview行，曲目数据和选择状态保存在内存模型中
+        from gui.track_list import VirtualTrackList
+        self.track_list = VirtualTrackList(tree_frame, ('title', 'duration', 'url_status'))
+        self.tracks_tree = self.track_list.tree
         
         # 选择事件防抖处理
         self._selection_debounce_id = None
         self._last_selection_time = 0
         
-        def on_selection_change(event):
+        def on_selection_change():
             """选择事件防抖处理，避免频繁更新UI"""
             import time
             current_time = time.time()
@@ -167,7 +198,7 @@ class XimalayaGUI:
             def delayed_update():
                 if time.time() - self._last_selection_time >= 0.05:  # 50ms内没有新的选择事件
                     try:
-                        selected_count = len(self.tracks_tree.selection())
+                        selected_count = len(self.track_list.model.selection)
                         if selected_count > 0:
                             self.schedule_ui_update(lambda: self.set_button_state('download_selected', True))
                         else:
@@ -177,7 +208,7 @@ class XimalayaGUI:
                         
             self._selection_debounce_id = self.root.after(50, delayed_update)
         
-        self.tracks_tree.bind('<<TreeviewSelect>>', on_selection_change)
+        self.track_list.on_select = on_selection_change
         
         # 设置列标题和宽度
         self.tracks_tree.heading('#0', text='序号')
@@ -190,11 +221,6 @@ class XimalayaGUI:
         self.tracks_tree.column('duration', width=80, minwidth=60)
         self.tracks_tree.column('url_status', width=120, minwidth=100)
         
-        # 添加滚动条
-        self.tracks_scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', command=self.tracks_tree.yview)
-        self.tracks_scrollbar.pack(side='right', fill='y')
-        self.tracks_tree.configure(yscrollcommand=self.tracks_scrollbar.set)
-        
         # 曲目操作按钮
         tracks_btn_frame = tk.Frame(tracks_frame)
         tracks_btn_frame.pack(fill='x', pady=(10, 0))
@@ -209,11 +235,14 @@ class XimalayaGUI:
         self._main_buttons['check_status'] = tk.Button(tracks_btn_frame, text='检查文件状态', command=self.check_file_status)
         self._main_buttons['check_status'].pack(side='left', padx=(0, 5))
         
+        self._main_buttons['rescan_library'] = tk.Button(tracks_btn_frame, text='扫描下载目录', command=self.rescan_library)
+        self._main_buttons['rescan_library'].pack(side='left', padx=(0, 5))
+        
         tk.Button(tracks_btn_frame, text='缓存统计', command=self.show_cache_stats).pack(side='left', padx=(0, 5))
         tk.Button(tracks_btn_frame, text='全选', command=self.select_all_tracks).pack(side='left', padx=(0, 5))
         tk.Button(tracks_btn_frame, text='清空', command=self.clear_tracks).pack(side='left')
         
-        # 存储解析后的曲目数据
+        # 存储解析后的曲目数据（列表显示的行引用同一批 Track 对象）
         self.parsed_tracks = []
         
         # 下载进度区
@@ -227,25 +256,81 @@ class XimalayaGUI:
         self.progress_label = tk.Label(progress_frame, text='', anchor='w')
         self.progress_label.pack(fill='x')
         
+        # 当前文件的速度和剩余时间（下载器已节流，约每0.5秒更新一次）
+        self.transfer_label = tk.Label(progress_frame, text='', anchor='w', fg='gray')
+        self.transfer_label.pack(fill='x')
+        
+        # 并发下载时每个下载线程一行进度
+        self.worker_frame = tk.Frame(progress_frame)
+        self.worker_frame.pack(fill='x')
+        self._worker_labels = []
+        
         # 右侧日志输出区
         log_frame = tk.LabelFrame(right_panel, text='日志输出', padx=10, pady=10)
         log_frame.pack(fill='both', expand=True)
         
+        log_filter_frame = tk.Frame(log_frame)
+        log_filter_frame.pack(fill='x', pady=(0, 5))
+        tk.Label(log_filter_frame, text='显示级别:').pack(side='left')
+        self.log_filter_var = tk.StringVar(value='全部')
+        log_filter_box = ttk.Combobox(log_filter_frame, textvariable=self.log_filter_var, state='readonly', width=6,
+                                      values=list(self.LOG_FILTERS))
+        log_filter_box.pack(side='left', padx=(5, 0))
+        log_filter_box.bind('<<ComboboxSelected>>', lambda e: self.apply_log_filter())
+        
         self.log_text = scrolledtext.ScrolledText(log_frame, width=40, height=30, state='disabled', font=('Consolas', 9))
         self.log_text.pack(fill='both', expand=True)
 
     def log(self, msg, level='info'):
-        if callable(getattr(msg, '__call__', None)):
-            msg = str(msg)
-        def append():
-            self.log_text.config(state='normal')
-            tag = level if level in ('info', 'warning', 'error') else 'info'
-            self.log_text.insert(tk.END, msg + '\n', tag)
+        """可在任意线程调用：只放入日志缓冲，由 _drain_log 在界面线程批量写入"""
+        self._log_buffer.append(str(msg), level)
+
+    def _drain_log(self):
+        """定时取出缓冲中的全部日志，一次写入日志框"""
+        try:
+            items, dropped = self._log_buffer.drain()
+            if dropped:
+                items.insert(0, ('warning', f'[日志] 输出过快，省略了 {dropped} 条较早的日志'))
+            if items:
+                self._log_history.extend(items)
+                self._insert_log_lines(items)
+        except tk.TclError:
+            return  # 窗口已销毁
+        self.root.after(self.LOG_DRAIN_INTERVAL_MS, self._drain_log)
+
+    def _insert_log_lines(self, items):
+        from utils.log import level_value
+        # 相邻同级别的行合并为一段，整批只调用一次 insert
+        chunks = []
+        for level, msg in items:
+            if level_value(level) < self._log_min_level:
+                continue
+            tag = level if level in ('info', 'warning', 'error') else 'debug'
+            if chunks and chunks[-1] == tag:
+                chunks[-2] += msg + '\n'
+            else:
+                chunks += [msg + '\n', tag]
+        if not chunks:
+            return
+        # 用户向上翻看时不强制滚到底部
+        follow = self.log_text.yview()[1] >= 0.999
+        self.log_text.config(state='normal')
+        self.log_text.insert(tk.END, *chunks)
+        excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - self.MAX_LOG_LINES
+        if excess > 0:
+            self.log_text.delete('1.0', f'{excess + 1}.0')
+        self.log_text.config(state='disabled')
+        if follow:
             self.log_text.see(tk.END)
-            self.log_text.config(state='disabled')
-        
-        # 使用更高优先级的延迟来减少事件队列堵塞
-        self.log_text.after_idle(append)
+
+    def apply_log_filter(self):
+        """切换显示级别后按最近的日志重新填充日志框"""
+        self._log_min_level = self.LOG_FILTERS.get(self.log_filter_var.get(), 0)
+        self.log_text.config(state='normal')
+        self.log_text.delete('1.0', tk.END)
+        self.log_text.config(state='disabled')
+        self._insert_log_lines(list(self._log_history))
+        self.log_text.see(tk.END)
 
     def log_info(self, msg):
         self.log(msg, level='info')
@@ -258,13 +343,15 @@ class XimalayaGUI:
         self.log_text.tag_config('info', foreground='black')
         self.log_text.tag_config('warning', foreground='orange')
         self.log_text.tag_config('error', foreground='red')
+        self.log_text.tag_config('debug', foreground='gray')
+        self.root.after(self.LOG_DRAIN_INTERVAL_MS, self._drain_log)
         
         # 定期检查UI响应性
         self.check_ui_responsive()
         
         # UI更新管理器
-        self._ui_update_queue = []
-        self._ui_update_scheduled = False
+        from utils.ui_queue import UiUpdateQueue
+        self._ui_update_queue = UiUpdateQueue(apply_row=self._apply_tree_row)
         
         # 按钮状态管理
         self._button_states = {}
@@ -286,33 +373,39 @@ class XimalayaGUI:
         
         self.root.after(100, ui_check)
     
-    def schedule_ui_update(self, func):
-        """调度UI更新，避免事件队列堵塞"""
-        self._ui_update_queue.append(func)
-        
-        if not self._ui_update_scheduled:
-            self._ui_update_scheduled = True
+    def schedule_ui_update(self, func, key=None):
+        """调度UI更新，避免事件队列堵塞
+
+        key 相同的更新（如进度条）只执行最新一次。
+        """
+        if self._ui_update_queue.put(func, key):
+            self.root.after_idle(self._process_ui_updates)
+    
+    def schedule_row_update(self, idx, **values):
+        """调度曲目列表第 idx 行（从0开始）的列值更新，同一行尚未执行的设置会合并"""
+        if self._ui_update_queue.set_row(idx, **values):
             self.root.after_idle(self._process_ui_updates)
     
+    def _apply_tree_row(self, idx, values):
+        try:
+            self.track_list.set_row(idx, **values)
+        except tk.TclError:
+            pass  # 窗口已关闭
+    
+    def apply_row_statuses(self, statuses):
+        """在UI线程中批量设置解析状态列：{曲目序号(从0开始): 状态}，只重绘可见且有变化的行"""
+        try:
+            self.track_list.set_statuses(statuses)
+        except tk.TclError:
+            pass
+    
     def _process_ui_updates(self):
-        """批量处理UI更新"""
-        # 限制每次处理的更新数量，避免长时间阻塞
-        max_updates_per_batch = 10
-        processed = 0
-        
-        while self._ui_update_queue and processed < max_updates_per_batch:
-            try:
-                func = self._ui_update_queue.pop(0)
-                func()
-                processed += 1
-            except Exception as e:
-                self.log_error(f'UI更新异常: {e}')
-        
+        """按时间预算批量处理UI更新，超出预算后让出事件循环"""
+        more = self._ui_update_queue.drain(self.UI_UPDATE_BUDGET,
+                                           on_error=lambda e: self.log_error(f'UI更新异常: {e}'))
         # 如果还有更新待处理，安排下一批
-        if self._ui_update_queue:
+        if more:
             self.root.after_idle(self._process_ui_updates)
-        else:
-            self._ui_update_scheduled = False
     
     def set_button_state(self, button_name, enabled=True):
         """设置按钮状态，防止重复点击"""
@@ -329,43 +422,55 @@ class XimalayaGUI:
         
         self.schedule_ui_update(update_state)
 
-    def run_in_thread(self, func):
-        def wrapped_func():
-            try:
-                func()
-            except Exception as e:
-                # 确保异常信息在主线程中显示
-                self.schedule_ui_update(lambda: self.log_error(f'线程异常: {e}'))
-        threading.Thread(target=wrapped_func, daemon=True).start()
+    def run_task(self, func, pool='network', key=None, replace=False, pass_token=False):
+        """在全局任务执行器的有界线程池中运行后台任务
+
+        key 相同的任务不并行：replace=True 时取消旧任务，否则旧任务未结束前忽略本次提交并返回 None。
+        pass_token=True 时以 func(token) 调用，长任务应检查 token.is_set() 以便取消和退出。
+        """
+        def on_error(e):
+            # 确保异常信息在主线程中显示
+            self.schedule_ui_update(lambda: self.log_error(f'线程异常: {e}'))
+        handle = self.executor.submit(func, pool=pool, key=key, replace=replace,
+                                      pass_token=pass_token, on_error=on_error)
+        if handle is None and key is not None and not replace and self.executor.running(key):
+            self.log_warning('相同的任务仍在进行中，请等待其完成')
+        return handle
 
     def show_cover_image(self, url):
         target_size = (150, 150)
         if not url:
+            self.executor.cancel('cover')
             self.cover_label.config(image='', text='无封面')
             return
         
-        def load_image_async():
+        def load_image_async(token):
             try:
-                response = requests.get(url, timeout=5)  # 减少超时时间
-                img_data = response.content
-                img = Image.open(BytesIO(img_data)).convert('RGBA')
-                # 保持比例缩放并居中填充白底
-                img.thumbnail(target_size, Image.LANCZOS)
-                bg = Image.new('RGBA', target_size, (255, 255, 255, 255))
-                offset = ((target_size[0] - img.width) // 2, (target_size[1] - img.height) // 2)
-                bg.paste(img, offset, img if img.mode == 'RGBA' else None)
+                from PIL import Image, ImageTk
+                from utils.image_cache import get_image_cache
+                # 缩略图在图片缓存中已按目标尺寸缩放并居中填充白底，每个封面只下载一次
+                thumb_path = get_image_cache().get_thumbnail(url, size=target_size, log_func=self.log)
+                if thumb_path is None:
+                    raise RuntimeError('封面下载失败')
+                bg = Image.open(thumb_path)
+                bg.load()
                 
+                if token.is_set():
+                    # 已切换到其他专辑的封面
+                    return
                 # 在主线程中更新UI
                 def update_ui():
                     self.cover_imgtk = ImageTk.PhotoImage(bg)
                     self.cover_label.config(image=self.cover_imgtk, text='')
                 self.schedule_ui_update(update_ui)
             except Exception:
+                if token.is_set():
+                    return
                 # 在主线程中更新UI
                 self.schedule_ui_update(lambda: self.cover_label.config(image='', text='加载失败'))
         
-        # 异步加载图片，避免阻塞UI线程
-        self.run_in_thread(load_image_async)
+        # 异步加载图片，避免阻塞UI线程；新的封面请求取消尚未完成的旧请求
+        self.run_task(load_image_async, key='cover', replace=True, pass_token=True)
 
     def set_progress(self, current, total, filename=None):
         percent = (current / total * 100) if total else 0
@@ -379,6 +484,58 @@ class XimalayaGUI:
             # 如果窗口已关闭，忽略更新
             pass
 
+    def apply_bandwidth_limit(self):
+        """按界面上的限速设置全局下载限速，每次开始下载前调用"""
+        from utils.bandwidth import set_global_bandwidth
+        try:
+            kbps = max(float(self.bandwidth_var.get() or 0), 0)
+        except ValueError:
+            self.log_warning('限速设置无效，按不限速处理')
+            kbps = 0
+        set_global_bandwidth(kbps * 1024)
+        if kbps:
+            self.log_info(f'下载限速: {kbps:g} KB/s')
+
+    def show_transfer_progress(self, event):
+        """显示当前文件的下载速度和剩余时间（可在下载线程中调用）"""
+        text = f'{event.filename}  {event.format()}'
+        
+        def update_ui():
+            try:
+                self.transfer_label.config(text=text)
+            except tk.TclError:
+                pass
+        self.schedule_ui_update(update_ui, key='transfer')
+
+    def get_download_concurrency(self):
+        """界面上设置的并发下载数，限制在1~8之间"""
+        try:
+            return min(max(int(self.concurrency_var.get()), 1), 8)
+        except ValueError:
+            self.log_warning('并发下载数无效，按1处理')
+            return 1
+    
+    def setup_worker_rows(self, count):
+        """重建每个下载线程的进度行（可在下载线程中调用）"""
+        def update_ui():
+            for label in self._worker_labels:
+                label.destroy()
+            self._worker_labels = [tk.Label(self.worker_frame, text=f'线程{i + 1}: 空闲', anchor='w', fg='gray')
+                                   for i in range(count)]
+            for label in self._worker_labels:
+                label.pack(fill='x')
+        self.schedule_ui_update(update_ui)
+    
+    def set_worker_status(self, slot, text):
+        """更新某个下载线程的进度行（可在下载线程中调用）"""
+        def update_ui():
+            if slot < len(self._worker_labels):
+                try:
+                    self._worker_labels[slot].config(text=f'线程{slot + 1}: {text}')
+                except tk.TclError:
+                    pass
+        self.schedule_ui_update(update_ui, key=('worker', slot))
+    
     def run_album_info(self):
         album_id = self.album_id_var.get().strip()
         if not album_id:
@@ -390,7 +547,10 @@ class XimalayaGUI:
         self.set_button_state('album_info', False)
         self.log_info(f'获取专辑信息: {album_id}')
         def task():
-            album = fetch_album(int(album_id))
+            from fetcher.album_fetcher import fetch_album
+            from fetcher.track_fetcher import fetch_album_tracks
+            # 专辑信息缓存在有效期内时不发请求
+            album = fetch_album(int(album_id), log_func=self.log)
             if album:
                 # 所有UI更新都调度到主线程
                 def update_ui():
@@ -406,13 +566,16 @@ class XimalayaGUI:
                     
                 self.schedule_ui_update(update_ui)
                 
-                # 异步获取曲目总数
+                # 曲目总数：专辑的updateDate未变化时使用缓存，否则请求一条曲目取总数
                 cover_url = album.cover if album.cover else ''
-                try:
-                    tracks = fetch_album_tracks(int(album_id), 1, 1, log_func=self.log)
-                    total_count = tracks[0].totalCount if tracks and tracks[0].totalCount else ''
-                except Exception:
-                    total_count = ''
+                from utils.sqlite_cache import get_sqlite_cache
+                total_count = get_sqlite_cache().get_album_track_total(int(album_id)) or ''
+                if not total_count:
+                    try:
+                        tracks = fetch_album_tracks(int(album_id), 1, 1, log_func=self.log)
+                        total_count = tracks[0].totalCount if tracks and tracks[0].totalCount else ''
+                    except Exception:
+                        total_count = ''
                 
                 # 更新总数和封面
                 self.schedule_ui_update(lambda: self.album_count_var.set(str(total_count)))
@@ -436,7 +599,7 @@ class XimalayaGUI:
             
             # 重新启用按钮
             self.set_button_state('album_info', True)
-        self.run_in_thread(task)
+        self.run_task(task, key='album_info')
 
     def run_album_download(self):
         album_id = self.album_id_var.get().strip()
@@ -460,11 +623,14 @@ class XimalayaGUI:
                 total_count = int(self.album_count_var.get())
             except Exception:
                 total_count = None
-        def task():
+        self.apply_bandwidth_limit()
+        def task(token):
+            from downloader.downloader import DownloadCancelled
             try:
+                from downloader.album_download import AlbumDownloader
                 self.log_info('下载线程已启动')
                 def progress_hook(current, total, filename=None):
-                    self.schedule_ui_update(lambda: self.set_progress(current, total, filename))
+                    self.schedule_ui_update(lambda: self.set_progress(current, total, filename), key='progress')
                 AlbumDownloader(
                     album_id,
                     log_func=self.log,
@@ -472,12 +638,16 @@ class XimalayaGUI:
                     save_dir=self.default_download_dir,
                     progress_func=progress_hook,
                     album=album_obj,
-                    total_count=total_count
+                    total_count=total_count,
+                    progress_event_func=self.show_transfer_progress,
+                    cancel_event=token
                 ).download_album()
+            except DownloadCancelled:
+                self.log_info('专辑下载已取消')
             except Exception as e:
                 self.log_error(f'下载线程异常: {e}')
                 messagebox.showerror('错误', f'下载线程异常: {e}')
-        self.run_in_thread(task)
+        self.run_task(task, key='album_download', pass_token=True)
 
     def run_track_download(self):
         track_id = self.track_id_var.get().strip()
@@ -486,9 +656,11 @@ class XimalayaGUI:
             messagebox.showwarning('提示', '请输入音频ID')
             return
         self.log_info(f'下载单曲: track_id={track_id}')
-        def task():
-            download_single_track(track_id, log_func=self.log, save_dir=self.default_download_dir)
-        self.run_in_thread(task)
+        self.apply_bandwidth_limit()
+        def task(token):
+            from downloader.single_track_download import download_single_track
+            download_single_track(track_id, log_func=self.log, save_dir=self.default_download_dir, cancel_event=token)
+        self.run_task(task, key=('track_download', track_id), pass_token=True)
     
     def run_parse_tracks(self):
         """解析专辑中的所有曲目"""
@@ -504,10 +676,13 @@ class XimalayaGUI:
         # 显示初始状态
         self.set_progress(0, 100, "准备获取曲目列表...")
         
-        def task():
+        def task(token):
             try:
-                # 获取专辑信息 - 总是重新获取以确保album信息是最新的
-                album = fetch_album(int(album_id))
+                from fetcher.album_fetcher import fetch_album
+                from fetcher.track_fetcher import fetch_album_tracks_fast
+                # 获取专辑信息：缓存过期后重新请求，updateDate 变化时曲目分页缓存随之作废，
+                # 未变化时下面的分页全部从缓存读取，不发网络请求
+                album = fetch_album(int(album_id), log_func=self.log)
                 if album:
                     self.album = album
                     self.log_info(f'已更新专辑信息: {album.albumTitle}')
@@ -563,15 +738,19 @@ class XimalayaGUI:
                     if len(ui_updates) >= 10 or track_idx % page_size == 0:
                         batch_updates = ui_updates.copy()
                         ui_updates.clear()
-                        self.schedule_ui_update(lambda: self.batch_add_tracks(batch_updates))
+                        # 被新的解析取代后，尚未执行的旧批次不再加入列表
+                        self.schedule_ui_update(lambda: token.is_set() or self.batch_add_tracks(batch_updates))
                 
                 def update_progress_info(current_page, total_pages, current_count, total_count):
                     self.schedule_ui_update(lambda: self.set_progress(
                         current_count, total_count, 
                         f"获取曲目: 第{current_page}/{total_pages}页, {current_count}/{total_count}首"
-                    ))
+                    ), key='progress')
                 
                 while True:
+                    if token.is_set():
+                        self.log_info('曲目解析已取消')
+                        return
                     try:
                         self.log_info(f'正在快速获取第{page}页曲目...')
                         tracks = fetch_album_tracks_fast(int(album_id), page, page_size, log_func=self.log)
@@ -634,7 +813,7 @@ class XimalayaGUI:
                 
                 # 处理剩余的UI更新
                 if ui_updates:
-                    self.schedule_ui_update(lambda: self.batch_add_tracks(ui_updates))
+                    self.schedule_ui_update(lambda: token.is_set() or self.batch_add_tracks(ui_updates))
                 
                 self.parsed_tracks = all_tracks
                 
@@ -662,85 +841,44 @@ class XimalayaGUI:
                     
                 self.schedule_ui_update(lambda: self.set_progress(
                     len(all_tracks), len(all_tracks), status_msg
-                ))
+                ), key='progress')
                 
             except Exception as e:
                 self.log_error(f'解析曲目失败: {e}')
                 
-        self.run_in_thread(task)
-        
+        # 重新解析时取消仍在进行的上一次解析
+        self.run_task(task, key='parse_tracks', replace=True, pass_token=True)
+        
+    TRACK_STATUS_DISPLAY = {
+        "解析失败": '❌ 解析失败',
+        "已解析": '✅ 已解析',
+        "待解析": '⏳ 待解析',
+        "解析中": '🔄 解析中'
+    }
+    
     def add_track_to_list(self, idx, track, duration_str, url_status):
         """在UI线程中添加曲目到列表"""
-        item_id = self.tracks_tree.insert('', 'end', text=str(idx), values=(
-            track.title,
-            duration_str,
-            url_status
-        ))
-        # 根据解析状态设置显示
-        if url_status == "解析失败":
-            self.tracks_tree.set(item_id, 'url_status', '❌ 解析失败')
-        elif url_status == "已解析":
-            self.tracks_tree.set(item_id, 'url_status', '✅ 已解析')
-        elif url_status == "待解析":
-            self.tracks_tree.set(item_id, 'url_status', '⏳ 待解析')
-        elif url_status == "解析中":
-            self.tracks_tree.set(item_id, 'url_status', '🔄 解析中')
-        else:
-            self.tracks_tree.set(item_id, 'url_status', url_status)
-        
-        # 动态滚动到最新添加的项目，但不要过于频繁
-        if idx % 5 == 0:  # 每5个项目滚动一次
-            self.tracks_tree.see(item_id)
+        self.batch_add_tracks([(idx, track, duration_str, url_status)])
     
     def batch_add_tracks(self, track_updates):
-        """批量添加曲目到列表，减少UI更新频率"""
+        """批量添加曲目到列表：只写入列表模型，可见窗口内的行才会重绘"""
         try:
-            # 临时禁用滚动条更新以提高性能
-            self.tracks_tree.configure(yscrollcommand=None)
-            
-            # 批量插入优化：减少对tkinter的调用次数
-            status_map = {
-                "解析失败": '❌ 解析失败',
-                "已解析": '✅ 已解析', 
-                "待解析": '⏳ 待解析',
-                "解析中": '🔄 解析中'
-            }
-            
-            # 预处理所有数据，减少循环中的计算
-            prepared_items = []
-            for idx, track, duration_str, url_status in track_updates:
-                display_status = status_map.get(url_status, url_status)
-                prepared_items.append((str(idx), track.title, duration_str, display_status))
-            
-            # 批量插入
-            last_item_id = None
-            for text, title, duration, status in prepared_items:
-                item_id = self.tracks_tree.insert('', 'end', text=text, values=(title, duration, status))
-                last_item_id = item_id
-            
-            # 重新启用滚动条
-            self.tracks_tree.configure(yscrollcommand=self.tracks_scrollbar.set)
-            
-            # 只在有新增内容且是首次加载时才自动滚动到底部
-            if last_item_id and len(track_updates) > 5:
-                self.tracks_tree.see(last_item_id)
-                
+            # 根据解析状态设置显示
+            self.track_list.append_rows([(idx, track, duration_str, self.TRACK_STATUS_DISPLAY.get(url_status, url_status))
+                                         for idx, track, duration_str, url_status in track_updates])
+            # 加载过程中跟随显示最新添加的曲目
+            if len(track_updates) > 5:
+                self.track_list.see(len(self.track_list.model) - 1)
         except Exception as e:
             self.log_error(f'批量添加曲目时出错: {e}')
-            # 确保滚动条重新启用
-            try:
-                self.tracks_tree.configure(yscrollcommand=self.tracks_scrollbar.set)
-            except:
-                pass
     
     def select_all_tracks(self):
         """全选所有曲目"""
         try:
-            # 一次性选择所有项目，比逐个添加更高效
-            all_items = self.tracks_tree.get_children()
-            if all_items:
-                self.tracks_tree.selection_set(all_items)
-                self.log_info(f'已选择 {len(all_items)} 个曲目')
+            count = len(self.track_list.model)
+            if count:
+                self.track_list.select_all()
+                self.log_info(f'已选择 {count} 个曲目')
             else:
                 self.log_warning('没有曲目可选择')
         except Exception as e:
@@ -748,14 +886,13 @@ class XimalayaGUI:
     
     def clear_tracks(self):
         """清空曲目列表"""
-        for item in self.tracks_tree.get_children():
-            self.tracks_tree.delete(item)
+        self.track_list.clear()
         self.parsed_tracks = []
     
     def parse_selected_urls(self):
         """解析选中曲目的播放URL"""
-        selected_items = self.tracks_tree.selection()
-        if not selected_items:
+        selected_rows = self.track_list.selected_rows()
+        if not selected_rows:
             self.log_warning('请先选择要解析URL的曲目')
             messagebox.showwarning('提示', '请先选择要解析URL的曲目')
             return
@@ -774,23 +911,22 @@ class XimalayaGUI:
         selected_indices = []
         skipped_tracks = []
         
-        for item in selected_items:
-            idx = int(self.tracks_tree.item(item, 'text')) - 1
-            if 0 <= idx < len(self.parsed_tracks):
+        for idx in selected_rows:
+            if idx < len(self.parsed_tracks):
                 track = self.parsed_tracks[idx]
                 # 检查是否已经解析过URL
                 if track.url and track.url.strip():
-                    skipped_tracks.append((item, idx, track))
+                    skipped_tracks.append((idx, track))
                     self.log_info(f'跳过已解析URL的曲目: {track.title}')
                 else:
                     selected_tracks.append(track)
-                    selected_indices.append((item, idx))
+                    selected_indices.append(idx)
         
         if skipped_tracks:
             self.log_info(f'跳过 {len(skipped_tracks)} 个已解析URL的曲目')
             # 更新界面显示为已解析状态
-            for item, idx, track in skipped_tracks:
-                self.schedule_ui_update(lambda i=item: self.tracks_tree.set(i, 'url_status', '✅ 已解析'))
+            for idx, track in skipped_tracks:
+                self.schedule_row_update(idx, url_status='✅ 已解析')
         
         if not selected_tracks:
             if skipped_tracks:
@@ -803,13 +939,14 @@ class XimalayaGUI:
         
         def task():
             try:
+                from fetcher.track_fetcher import parse_tracks_concurrent
                 # 先更新状态为"解析中"
-                for item, idx in selected_indices:
-                    self.schedule_ui_update(lambda i=item: self.tracks_tree.set(i, 'url_status', '🔄 解析中'))
+                for idx in selected_indices:
+                    self.schedule_row_update(idx, url_status='🔄 解析中')
                 
                 # 进度回调函数
                 def progress_callback(completed, total):
-                    self.schedule_ui_update(lambda: self.set_progress(completed, total, f"解析URL: {completed}/{total}"))
+                    self.schedule_ui_update(lambda: self.set_progress(completed, total, f"解析URL: {completed}/{total}"), key='progress')
                 
                 # 并发解析URL
                 parsed_tracks = parse_tracks_concurrent(
@@ -821,7 +958,7 @@ class XimalayaGUI:
                 )
                 
                 # 更新解析结果
-                for i, (item, idx) in enumerate(selected_indices):
+                for i, idx in enumerate(selected_indices):
                     track = parsed_tracks[i]
                     # 更新原始数据
                     self.parsed_tracks[idx] = track
@@ -832,7 +969,7 @@ class XimalayaGUI:
                     else:
                         status = '❌ 解析失败'
                     
-                    self.schedule_ui_update(lambda i=item, s=status: self.tracks_tree.set(i, 'url_status', s))
+                    self.schedule_row_update(idx, url_status=status)
                 
                 success_count = sum(1 for track in parsed_tracks if track.url)
                 self.log_info(f'URL解析完成！成功解析 {success_count}/{len(selected_tracks)} 个曲目')
@@ -840,20 +977,19 @@ class XimalayaGUI:
                 # SQLite缓存自动保存，无需手动保存
                 self.log_info('[缓存] SQLite缓存已自动保存')
                 
-                self.schedule_ui_update(lambda: self.set_progress(len(selected_tracks), len(selected_tracks), "URL解析完成"))
+                self.schedule_ui_update(lambda: self.set_progress(len(selected_tracks), len(selected_tracks), "URL解析完成"), key='progress')
                 
             except Exception as e:
                 self.log_error(f'URL解析异常: {e}')
                 # 恢复状态
-                for item, idx in selected_indices:
-                    self.schedule_ui_update(lambda i=item: self.tracks_tree.set(i, 'url_status', '⏳ 待解析'))
+                for idx in selected_indices:
+                    self.schedule_row_update(idx, url_status='⏳ 待解析')
                 
-        self.run_in_thread(task)
+        self.run_task(task, key='parse_urls')
     
     def save_album_info_for_selected(self, save_dir, album_id, selected_tracks_with_idx):
         """为下载选中曲目生成专辑信息文件"""
         import json
-        import requests
         import re
         import os
         from html import unescape
@@ -1025,16 +1161,11 @@ class XimalayaGUI:
             if not os.path.exists(cover_path):
                 cover_url = getattr(album, 'cover', None)
                 if cover_url:
-                    try:
-                        resp = requests.get(cover_url, timeout=10)
-                        if resp.status_code == 200:
-                            with open(cover_path, 'wb') as f:
-                                f.write(resp.content)
-                            self.log_info(f'✅ 已下载封面图片 cover.jpg')
-                        else:
-                            self.log_warning(f'封面下载失败，状态码: {resp.status_code}')
-                    except Exception as e:
-                        self.log_warning(f'下载封面失败: {e}')
+                    from utils.image_cache import get_image_cache
+                    if get_image_cache().export(cover_url, cover_path, log_func=self.log):
+                        self.log_info(f'✅ 已保存封面图片 cover.jpg')
+                    else:
+                        self.log_warning('封面下载失败')
                 else:
                     self.log_info('专辑无封面图片')
             else:
@@ -1051,8 +1182,8 @@ class XimalayaGUI:
         self.set_button_state('download_selected', False)
         
         try:
-            selected_items = self.tracks_tree.selection()
-            if not selected_items:
+            selected_rows = self.track_list.selected_rows()
+            if not selected_rows:
                 self.log_warning('请先选择要下载的曲目')
                 messagebox.showwarning('提示', '请先选择要下载的曲目')
                 return
@@ -1080,7 +1211,9 @@ class XimalayaGUI:
         except Exception:
             delay = 5
         
-        def task():
+        self.apply_bandwidth_limit()
+        concurrency = self.get_download_concurrency()
+        def task(token):
             try:
                 # 标记下载正在进行
                 self._download_in_progress = True
@@ -1089,8 +1222,6 @@ class XimalayaGUI:
                 import os
                 import re
                 
-                downloader = M4ADownloader()
-                
                 # 创建下载目录
                 if hasattr(self, 'album') and self.album and self.album.albumTitle and self.album.albumTitle.strip():
                     safe_album_title = re.sub(r'[\\/:*?"<>|]', '_', self.album.albumTitle.strip())
@@ -1102,10 +1233,8 @@ class XimalayaGUI:
                 os.makedirs(save_dir, exist_ok=True)
                 
                 selected_tracks = []
-                for item in selected_items:
-                    # 获取序号
-                    idx = int(self.tracks_tree.item(item, 'text')) - 1
-                    if 0 <= idx < len(self.parsed_tracks):
+                for idx in selected_rows:
+                    if idx < len(self.parsed_tracks):
                         selected_tracks.append((idx + 1, self.parsed_tracks[idx]))
                 
                 # 生成专辑信息文件
@@ -1120,15 +1249,18 @@ class XimalayaGUI:
                 tracks_with_url = [(idx, track) for idx, track in selected_tracks if track.url]
                 tracks_without_url = [(idx, track) for idx, track in selected_tracks if not track.url]
                 
-                # 进一步检查已存在的文件
-                tracks_to_download = []
+                # 进一步检查已存在的文件：按曲目ID查询下载索引
+                from utils.library_index import get_library_index
+                expected = []
                 for idx, track in tracks_with_url:
                     safe_title = re.sub(r'[\\/:*?"<>|]', '_', track.title)
-                    filename = f'{idx:03d}_{safe_title}.m4a'
-                    filepath = os.path.join(save_dir, filename)
-                    
-                    if os.path.exists(filepath) and os.path.getsize(filepath) > 1024 * 10:
-                        self.log_info(f'[{idx}] 文件已存在，跳过下载: {filename}')
+                    expected.append((track.trackId, f'{idx:03d}_{safe_title}.m4a'))
+                library = get_library_index().downloaded_tracks(int(album_id), save_dir, expected=expected)
+                tracks_to_download = []
+                for idx, track in tracks_with_url:
+                    entry = library.get(int(track.trackId))
+                    if entry is not None:
+                        self.log_info(f'[{idx}] 文件已存在，跳过下载: {os.path.basename(entry.path)}')
                         skipped_existing += 1
                     else:
                         tracks_to_download.append((idx, track))
@@ -1148,18 +1280,44 @@ class XimalayaGUI:
                         self.log_error('没有已解析URL的曲目可供下载')
                     return
                 
-                self.log_info(f'开始下载 {len(tracks_to_download)} 个需要下载的曲目')
+                workers = min(concurrency, len(tracks_to_download))
+                self.log_info(f'开始下载 {len(tracks_to_download)} 个需要下载的曲目，并发数: {workers}')
+                
+                # 有界下载线程池：共用一个线程安全的下载器，每个线程占用一个进度行
+                import queue
+                import threading
+                import time
+                import concurrent.futures
+                free_slots = queue.Queue()
+                for slot in range(workers):
+                    free_slots.put(slot)
+                thread_slots = {}
+                counter_lock = threading.Lock()
+                counts = {'done': 0, 'ok': 0}
+                total_to_download = len(tracks_to_download)
                 
-                for track_idx, track in tracks_to_download:
+                def on_transfer(event):
+                    slot = thread_slots.get(threading.get_ident())
+                    if slot is not None:
+                        self.set_worker_status(slot, f'{event.filename}  {event.format()}')
+                
+                downloader = M4ADownloader(progress_callback=on_transfer, cancel_event=token)
+                self.setup_worker_rows(workers)
+                
+                def download_one(track_idx, track):
+                    if token.is_set():
+                        return
+                    slot = free_slots.get()
+                    thread_slots[threading.get_ident()] = slot
+                    ok = False
                     try:
-                        self.set_progress(downloaded, len(tracks_to_download), f"准备下载: {track.title}")
-                        
                         # 创建安全的文件名
                         safe_title = re.sub(r'[\\/:*?"<>|]', '_', track.title)
                         filename = f'{track_idx:03d}_{safe_title}.m4a'
                         filepath = os.path.join(save_dir, filename)
                         
-                        self.log_info(f'[{track_idx}/{len(tracks_to_download)}] 开始下载: {track.title}')
+                        self.set_worker_status(slot, f'准备下载: {track.title}')
+                        self.log_info(f'[{track_idx}/{total_to_download}] 开始下载: {track.title}')
                         
                         # 传递track_id和album_id以便在403错误时清除缓存
                         downloader.download_from_url(
@@ -1170,21 +1328,28 @@ class XimalayaGUI:
                             album_id=int(album_id)
                         )
                         self.log_info(f'[{track_idx}] 下载完成: {filename}')
-                        
-                        downloaded += 1
-                        self.set_progress(downloaded, len(tracks_to_download), f"已完成: {track.title}")
-                        
-                        # 延迟避免风控
-                        if delay > 0:
-                            import time
-                            time.sleep(delay)
-                            
+                        ok = True
                     except Exception as e:
                         self.log_error(f'[{track_idx}] 下载失败: {track.title}, 错误: {e}')
-                        downloaded += 1
-                        
-                self.log_info(f'选中曲目下载完成！共 {total_selected} 个，成功 {downloaded} 个')
-                self.set_progress(total_selected, total_selected, "下载完成")
+                    finally:
+                        with counter_lock:
+                            counts['done'] += 1
+                            counts['ok'] += ok
+                            done = counts['done']
+                        self.schedule_ui_update(lambda: self.set_progress(done, total_to_download, f"已完成: {track.title}"), key='progress')
+                        self.set_worker_status(slot, '空闲')
+                    # 延迟避免风控：每个线程下载完一首后各自等待
+                    if delay > 0:
+                        time.sleep(delay)
+                    free_slots.put(slot)
+                
+                self.schedule_ui_update(lambda: self.set_progress(0, total_to_download, '准备下载'), key='progress')
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download') as executor:
+                    for track_idx, track in tracks_to_download:
+                        executor.submit(download_one, track_idx, track)
+                
+                self.log_info(f'选中曲目下载完成！共 {total_selected} 个，下载 {total_to_download} 个，成功 {counts["ok"]} 个')
+                self.schedule_ui_update(lambda: self.set_progress(total_selected, total_selected, "下载完成"), key='progress')
                 
             except Exception as e:
                 self.log_error(f'批量下载异常: {e}')
@@ -1194,7 +1359,7 @@ class XimalayaGUI:
                     delattr(self, '_download_in_progress')
                 self.set_button_state('download_selected', True)
                 
-        self.run_in_thread(task)
+        self.run_task(task, key='download_selected', pass_token=True)
     
     def check_file_status(self):
         """检查曲目的文件状态（是否已下载）"""
@@ -1225,42 +1390,36 @@ class XimalayaGUI:
                 
                 self.log_info(f'开始检查 {total_count} 个曲目的文件状态...')
                 
-                # 遍历所有曲目检查状态
+                # 一次查询下载索引得到全部已下载曲目
+                from utils.library_index import get_library_index
+                expected = []
+                for track_idx, track in enumerate(self.parsed_tracks, start=1):
+                    safe_title = re.sub(r'[\\/:*?"<>|]', '_', track.title)
+                    expected.append((track.trackId, f'{track_idx:03d}_{safe_title}.m4a'))
+                library = get_library_index().downloaded_tracks(int(album_id), save_dir, expected=expected)
+                
+                # 遍历所有曲目检查状态，最后一次性批量更新界面
+                statuses = {}
                 for idx, track in enumerate(self.parsed_tracks):
-                    track_idx = idx + 1
-                    
                     # 检查URL解析状态
                     url_parsed = bool(track.url and track.url.strip())
                     if url_parsed:
                         parsed_count += 1
                     
                     # 检查文件下载状态
-                    safe_title = re.sub(r'[\\/:*?"<>|]', '_', track.title)
-                    filename = f'{track_idx:03d}_{safe_title}.m4a'
-                    filepath = os.path.join(save_dir, filename)
-                    
-                    file_exists = os.path.exists(filepath) and os.path.getsize(filepath) > 1024 * 10
+                    file_exists = int(track.trackId) in library
                     if file_exists:
                         downloaded_count += 1
                     
-                    # 更新界面显示状态
-                    def update_status(idx=idx, url_parsed=url_parsed, file_exists=file_exists):
-                        items = self.tracks_tree.get_children()
-                        if idx < len(items):
-                            item_id = items[idx]
-                            if file_exists:
-                                status = '📁 已下载'
-                            elif url_parsed:
-                                status = '✅ 已解析'
-                            else:
-                                status = '⏳ 待解析'
-                            self.tracks_tree.set(item_id, 'url_status', status)
-                    
-                    self.schedule_ui_update(update_status)
-                    
-                    # 更新进度
-                    if track_idx % 10 == 0 or track_idx == total_count:
-                        self.schedule_ui_update(lambda c=track_idx, t=total_count: self.set_progress(c, t, f"检查状态: {c}/{t}"))
+                    if file_exists:
+                        statuses[idx] = '📁 已下载'
+                    elif url_parsed:
+                        statuses[idx] = '✅ 已解析'
+                    else:
+                        statuses[idx] = '⏳ 待解析'
+                
+                # 更新界面显示状态
+                self.schedule_ui_update(lambda: self.apply_row_statuses(statuses))
                 
                 # 显示检查结果
                 self.log_info(f'文件状态检查完成:')
@@ -1270,12 +1429,88 @@ class XimalayaGUI:
                 self.log_info(f'  待解析: {total_count - parsed_count}')
                 self.log_info(f'  待下载: {parsed_count - downloaded_count}')
                 
-                self.schedule_ui_update(lambda: self.set_progress(total_count, total_count, "状态检查完成"))
+                self.schedule_ui_update(lambda: self.set_progress(total_count, total_count, "状态检查完成"), key='progress')
                 
             except Exception as e:
                 self.log_error(f'检查文件状态异常: {e}')
                 
-        self.run_in_thread(task)
+        self.run_task(task, pool='disk', key='check_status', replace=True)
+    
+    def rescan_library(self):
+        """在后台增量扫描下载目录，重建下载索引"""
+        from utils.library_scanner import LibraryScanner
+        self.set_button_state('rescan_library', False)
+        self.log_info(f'开始扫描下载目录: {self.default_download_dir}')
+        
+        def on_progress(current, total, name):
+            self.schedule_ui_update(lambda: self.set_progress(current, total, f'扫描: {name}'), key='progress')
+        
+        scanner = LibraryScanner(self.default_download_dir, progress_func=on_progress, log_func=self.log)
+        
+        def task(token):
+            token.on_cancel(scanner.stop)
+            try:
+                scanner.scan()
+            finally:
+                self.set_button_state('rescan_library', True)
+        
+        self.run_task(task, pool='disk', key='rescan_library', pass_token=True)
+    
+    def toggle_library_watch(self):
+        """开启/关闭下载目录实时监控：其他工具增删或移动文件时自动更新下载索引和状态列"""
+        if not self.watch_library_var.get():
+            if self._library_watcher is not None:
+                self._library_watcher.stop()
+                self._library_watcher = None
+                self.log_info('已停止监控下载目录')
+            return
+        from utils.library_watcher import LibraryWatcher
+        
+        def on_change(album_dir, album_ids):
+            # 在监控线程中回调：Tk 变量只能在主线程读取
+            def check_current():
+                current = self.album_id_var.get().strip()
+                if current.isdigit() and int(current) in album_ids:
+                    self.refresh_download_status(int(current))
+            self.schedule_ui_update(check_current)
+        
+        watcher = LibraryWatcher(self.default_download_dir, on_change=on_change, log_func=self.log)
+        if watcher.start():
+            self._library_watcher = watcher
+        else:
+            self.watch_library_var.set(False)
+    
+    def on_close(self):
+        """关闭窗口：停止目录监控线程，取消并等待后台任务，缓存和进度落盘后再销毁窗口"""
+        if self._library_watcher is not None:
+            self._library_watcher.stop()
+            self._library_watcher = None
+        self.log_info('正在停止后台任务...')
+        self.executor.shutdown(timeout=self.SHUTDOWN_TIMEOUT)
+        self.root.destroy()
+
+    def _flush_stores(self):
+        """退出钩子：SQLite缓存的WAL写回主库，关闭仍打开的下载进度日志"""
+        from utils.progress_journal import close_open_journals
+        from utils.sqlite_cache import flush_sqlite_cache
+        flush_sqlite_cache()
+        close_open_journals()
+    
+    def refresh_download_status(self, album_id):
+        """按下载索引刷新曲目列表的状态列（不重新列举文件）"""
+        from utils.library_index import get_library_index
+        entries = get_library_index().get_album_entries(album_id)
+        tracks = list(self.parsed_tracks)
+        
+        statuses = {}
+        for idx, track in enumerate(tracks):
+            if int(track.trackId) in entries:
+                statuses[idx] = '📁 已下载'
+            elif track.url and track.url.strip():
+                statuses[idx] = '✅ 已解析'
+            else:
+                statuses[idx] = '⏳ 待解析'
+        self.schedule_ui_update(lambda: self.apply_row_statuses(statuses))
     
     def show_cache_stats(self):
         """显示URL缓存统计信息"""
@@ -1335,29 +1570,37 @@ class XimalayaGUI:
         except Exception:
             delay = 10.0
         
-        def task():
+        self.apply_bandwidth_limit()
+        def task(token):
+            from downloader.downloader import DownloadCancelled
             try:
-                # 等待一段时间让API冷却
-                import time
+                # 等待一段时间让API冷却（可被取消打断）
                 self.log_info('等待60秒让API冷却...')
-                time.sleep(60)
+                if token.wait(60):
+                    return
                 
                 def progress_hook(current, total, filename=None):
-                    self.schedule_ui_update(lambda: self.set_progress(current, total, filename))
+                    self.schedule_ui_update(lambda: self.set_progress(current, total, filename), key='progress')
                 
                 self.log_info('开始恢复下载，使用更保守的请求策略')
+                from downloader.album_download import AlbumDownloader
                 AlbumDownloader(
                     album_id,
                     log_func=self.log,
                     delay=delay,
                     save_dir=self.default_download_dir,
-                    progress_func=progress_hook
+                    progress_func=progress_hook,
+                    progress_event_func=self.show_transfer_progress,
+                    cancel_event=token
                 ).download_album()
                 
+            except DownloadCancelled:
+                self.log_info('恢复下载已取消')
             except Exception as e:
                 self.log_error(f'恢复下载异常: {e}')
                 
-        self.run_in_thread(task)
+        # 与“下载专辑”共用同一个 key，避免同一专辑被两个任务同时下载
+        self.run_task(task, key='album_download', pass_token=True)
     
     def show_login_dialog(self):
         """显示登录管理对话框"""
@@ -1,26 +1,29 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
 import base64
 import time
 import json
 import os
-from PIL import Image, ImageTk
 from io import BytesIO
 from dotenv import load_dotenv, set_key
-import threading
+
+from utils.task_executor import get_task_executor
+
+# requests 与 PIL 只在真正打开登录对话框时导入；
+# 启动时仅调用 check_cookie_exists()，不需要这些重量级模块
 
 class XimalayaLoginDialog:
     def __init__(self, parent, show_first_time_info=True):
         self.parent = parent
         self.result = None
         self.qr_id = None
-        self.qr_check_thread = None
+        self.qr_check_task = None
         self.qr_check_running = False
         self.show_first_time_info = show_first_time_info
         
         
         # 设置请求session
+        import requests
         self.session = requests.Session()
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
@@ -202,6 +205,7 @@ class XimalayaLoginDialog:
                 headers = self.headers.copy()
                 headers['Cookie'] = cookie
                 
+                import requests
                 response = requests.get(user_url, headers=headers, timeout=10)
                 data = response.json()
                 
@@ -215,8 +219,8 @@ class XimalayaLoginDialog:
             except Exception as e:
                 self.safe_ui_update(lambda: self.manual_status_label.config(text=f"验证失败: {str(e)}", foreground="red"))
         
-        # 启动后台验证线程
-        threading.Thread(target=validate_in_background, daemon=True).start()
+        # 在后台任务中验证
+        get_task_executor().submit(validate_in_background)
             
     def get_qrcode(self):
         """获取并显示二维码"""
@@ -254,8 +258,8 @@ class XimalayaLoginDialog:
                 self.safe_ui_update(lambda: self.qr_status_label.config(text=f"获取二维码错误: {str(e)}", foreground="red"))
                 self.safe_ui_update(lambda: self.get_qr_btn.config(state="normal"))
         
-        # 启动后台线程
-        threading.Thread(target=get_qr_in_background, daemon=True).start()
+        # 在后台任务中获取
+        get_task_executor().submit(get_qr_in_background)
             
     def display_qrcode(self, img_data):
         """在GUI中显示二维码"""
@@ -268,6 +272,7 @@ class XimalayaLoginDialog:
             img_bytes = base64.b64decode(img_data)
             print(f"解码后字节长度: {len(img_bytes)}")
             
+            from PIL import Image, ImageTk
             img = Image.open(BytesIO(img_bytes))
             print(f"PIL打开成功，图片大小: {img.size}, 格式: {img.format}")
             
@@ -293,17 +298,25 @@ class XimalayaLoginDialog:
     def start_qr_check(self):
         """开始检查扫码状态"""
         self.qr_check_running = True
-        self.qr_check_thread = threading.Thread(target=self.check_qr_status, daemon=True)
-        self.qr_check_thread.start()
+        # 重新获取二维码时取消上一次的轮询
+        self.qr_check_task = get_task_executor().submit(self.check_qr_status, key='qr_check',
+                                                        replace=True, pass_token=True)
         
-    def check_qr_status(self):
-        """检查扫码状态（在后台线程运行）"""
+    def stop_qr_check(self):
+        """停止扫码状态轮询"""
+        self.qr_check_running = False
+        if self.qr_check_task is not None:
+            self.qr_check_task.cancel()
+            self.qr_check_task = None
+        
+    def check_qr_status(self, token):
+        """检查扫码状态（在后台任务中运行，token 取消或超时后结束）"""
         start_time = time.time()
         timeout = 180  # 3分钟超时
         
         print(f"开始检查扫码状态，qr_id: {self.qr_id}")
         
-        while self.qr_check_running and time.time() - start_time < timeout:
+        while self.qr_check_running and not token.is_set() and time.time() - start_time < timeout:
             try:
                 # 使用参考项目的正确格式：添加时间戳
                 timestamp = int(time.time() * 1000)
@@ -330,14 +343,14 @@ class XimalayaLoginDialog:
                     # 非JSON响应
                     print(f"非JSON响应: {response.text[:100]}...")
                 
-                time.sleep(3)  # 每3秒检查一次
+                token.wait(3)  # 每3秒检查一次
                 
             except Exception as e:
                 print(f"检查状态错误: {e}")
                 self.safe_ui_update(lambda: self.qr_status_label.config(text=f"检查状态错误: {str(e)}", foreground="red"))
-                time.sleep(3)
+                token.wait(3)
         
-        if self.qr_check_running and time.time() - start_time >= timeout:
+        if self.qr_check_running and not token.is_set() and time.time() - start_time >= timeout:
             self.safe_ui_update(lambda: self.qr_status_label.config(text="扫码超时，请重新获取二维码", foreground="red"))
             self.safe_ui_update(lambda: self.get_qr_btn.config(state="normal"))
             
@@ -443,8 +456,8 @@ class XimalayaLoginDialog:
             except Exception as e:
                 self.safe_ui_update(lambda: self.qr_status_label.config(text=f"获取登录信息错误: {str(e)}", foreground="red"))
         
-        # 启动后台线程
-        threading.Thread(target=get_info_in_background, daemon=True).start()
+        # 在后台任务中获取
+        get_task_executor().submit(get_info_in_background)
             
     def get_user_info(self, cookie):
         """获取用户信息"""
@@ -453,6 +466,7 @@ class XimalayaLoginDialog:
             headers = self.headers.copy()
             headers['Cookie'] = cookie
             
+            import requests
             response = requests.get(user_url, headers=headers, timeout=10)
             data = response.json()
             
@@ -501,11 +515,12 @@ class XimalayaLoginDialog:
         else:
             messagebox.showwarning("警告", f"登录成功，但保存Cookie失败\n用户: {self.result['username']}")
             
+        self.stop_qr_check()
         self.dialog.destroy()
         
     def cancel(self):
         """取消按钮处理"""
-        self.qr_check_running = False
+        self.stop_qr_check()
         self.result = None
         self.dialog.destroy()
         
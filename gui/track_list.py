@@ -0,0 +1,211 @@
+import tkinter as tk
+import tkinter.ttk as ttk
+
+from gui.track_rows import TrackListModel
+
+
+class VirtualTrackList:
+    """虚拟化的曲目列表
+
+    数据和选择状态都在 TrackListModel 中，Treeview 只保留可见行数加少量余量的行；
+    滚动时改写这些行的内容，而不是为每个曲目插入一行，几万首的专辑也能立即显示。
+    Treeview 自身的选择和滚动不使用（selectmode='none'），点击、Shift/Ctrl 选择、拖动、
+    滚轮和方向键都由这里处理。
+    """
+
+    MARGIN = 2  # 可见行之外多建的行数，避免窗口高度不是整行时底部留空
+    WHEEL_UNITS = 3
+
+    def __init__(self, parent, columns, model: TrackListModel = None, on_select=None):
+        self.model = model or TrackListModel()
+        self.on_select = on_select
+        self.first = 0
+        self._pool = []
+        self._pool_pos = {}
+        self._capacity = 20
+        self._visible = 20
+
+        self.tree = ttk.Treeview(parent, columns=columns, show='tree headings', selectmode='none')
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar = ttk.Scrollbar(parent, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.tree.bind('<Configure>', lambda e: self.tree.after_idle(self._resize))
+        self.tree.bind('<MouseWheel>', self._on_wheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_units(-self.WHEEL_UNITS))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_units(self.WHEEL_UNITS))
+        self.tree.bind('<Button-1>', self._on_click)
+        self.tree.bind('<B1-Motion>', self._on_drag)
+        for key, step in (('Up', -1), ('Down', 1)):
+            self.tree.bind(f'<{key}>', lambda e, s=step: self._move_cursor(s, e))
+            self.tree.bind(f'<Shift-{key}>', lambda e, s=step: self._move_cursor(s, e, shift=True))
+        self.tree.bind('<Prior>', lambda e: self._move_cursor(-self._visible, e))
+        self.tree.bind('<Next>', lambda e: self._move_cursor(self._visible, e))
+        self.tree.bind('<Home>', lambda e: self._move_cursor(-len(self.model), e))
+        self.tree.bind('<End>', lambda e: self._move_cursor(len(self.model), e))
+        self.tree.bind('<Control-a>', lambda e: self.select_all() or 'break')
+
+    # 数据
+    def append_rows(self, rows):
+        """rows: [(序号(从1开始), track, 时长, 状态)]"""
+        old_len = len(self.model)
+        for idx, track, duration, status in rows:
+            self.model.put(idx - 1, track, duration, status)
+        if old_len < self.first + self._capacity:
+            self._render()
+        else:
+            self._update_scrollbar()
+
+    def clear(self):
+        self.model.clear()
+        self.first = 0
+        self._render()
+
+    def refresh_rows(self, indices):
+        """重绘在可见窗口内的指定行"""
+        last = self.first + len(self._pool)
+        for idx in indices:
+            if self.first <= idx < last:
+                self._render_row(idx - self.first)
+
+    def set_row(self, idx, **values):
+        if self.model.set_values(idx, **values):
+            self.refresh_rows([idx])
+
+    def set_statuses(self, statuses):
+        self.refresh_rows(self.model.status_changes(statuses))
+
+    # 选择
+    def select_all(self):
+        self.model.select_all()
+        self._render_selection()
+        self._notify()
+
+    def selected_rows(self):
+        return self.model.selected_rows()
+
+    # 滚动
+    def see(self, idx):
+        if idx < self.first:
+            self.first = idx
+        elif idx >= self.first + self._visible:
+            self.first = idx - self._visible + 1
+        else:
+            return
+        self._render()
+
+    def yview(self, *args):
+        """滚动条回调：moveto 比例 / scroll n units|pages"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * len(self.model))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.first += step * (self._visible if args[2] == 'pages' else 1)
+        self._render()
+
+    def _scroll_units(self, units):
+        self.first += units
+        self._render()
+        return 'break'
+
+    def _on_wheel(self, event):
+        if event.delta:
+            units = -self.WHEEL_UNITS if event.delta > 0 else self.WHEEL_UNITS
+            return self._scroll_units(units)
+
+    # 事件
+    def _row_at(self, y):
+        item = self.tree.identify_row(y)
+        pos = self._pool_pos.get(item)
+        return None if pos is None else self.first + pos
+
+    def _on_click(self, event):
+        self.tree.focus_set()
+        idx = self._row_at(event.y)
+        if idx is None:
+            return
+        self.model.click(idx, shift=bool(event.state & 0x0001), ctrl=bool(event.state & 0x0004))
+        self._render_selection()
+        self._notify()
+
+    def _on_drag(self, event):
+        if event.y < 0:
+            self._scroll_units(-1)
+        elif event.y > self.tree.winfo_height():
+            self._scroll_units(1)
+        y = min(max(event.y, 1), self.tree.winfo_height() - 1)
+        idx = self._row_at(y)
+        if idx is not None and idx != self.model.cursor:
+            self.model.click(idx, shift=True, ctrl=bool(event.state & 0x0004))
+            self._render_selection()
+            self._notify()
+
+    def _move_cursor(self, step, event, shift=False):
+        if not len(self.model):
+            return 'break'
+        current = self.model.cursor if self.model.cursor is not None else self.first
+        idx = min(max(current + step, 0), len(self.model) - 1)
+        self.model.click(idx, shift=shift)
+        self.see(idx)
+        self._render_selection()
+        self._notify()
+        return 'break'
+
+    def _notify(self):
+        if self.on_select:
+            self.on_select()
+
+    # 绘制
+    def _resize(self):
+        try:
+            height = self.tree.winfo_height()
+        except tk.TclError:
+            return
+        rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        capacity = max(height // rowheight, 1) + self.MARGIN
+        if capacity != self._capacity:
+            self._capacity = capacity
+            self._visible = max(capacity - self.MARGIN, 1)
+            self._render()
+        # 行数足够填满窗口时，按实际显示出来的行数（扣除表头）校正翻页和滚动条比例
+        if len(self._pool) == self._capacity:
+            visible = sum(1 for item in self._pool if self.tree.bbox(item))
+            if visible and visible != self._visible:
+                self._visible = visible
+                self._render()
+
+    def _render(self):
+        total = len(self.model)
+        self.first = max(0, min(self.first, total - self._visible))
+        want = min(self._capacity, total - self.first)
+        while len(self._pool) < want:
+            item = self.tree.insert('', 'end')
+            self._pool_pos[item] = len(self._pool)
+            self._pool.append(item)
+        if len(self._pool) > want:
+            extra = self._pool[want:]
+            self.tree.delete(*extra)
+            for item in extra:
+                del self._pool_pos[item]
+            del self._pool[want:]
+        for pos in range(want):
+            self._render_row(pos)
+        self._render_selection()
+        self._update_scrollbar()
+
+    def _render_row(self, pos):
+        text, title, duration, status = self.model.row_values(self.first + pos)
+        self.tree.item(self._pool[pos], text=text, values=(title, duration, status))
+
+    def _render_selection(self):
+        selected = [item for pos, item in enumerate(self._pool) if self.model.is_selected(self.first + pos)]
+        self.tree.selection_set(selected)
+
+    def _update_scrollbar(self):
+        total = len(self.model)
+        if total <= self._visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first / total, min(self.first + self._visible, total) / total)
@@ -0,0 +1,98 @@
+from typing import Dict, List, Optional, Tuple
+
+
+class TrackListModel:
+    """虚拟曲目列表的数据与选择状态
+
+    行号即曲目序号（从0开始）。曲目对象与 parsed_tracks 共用同一批 Track，不另存副本，
+    每行只额外保存时长和解析状态两列显示文字。选择用行号集合表示，全选、范围选择都不涉及界面控件。
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._tracks: List = []
+        self._durations: List[str] = []
+        self._statuses: List[str] = []
+        self._by_track: Dict[int, int] = {}
+        self.selection = set()
+        self.anchor: Optional[int] = None  # Shift 范围选择的起点
+        self.cursor: Optional[int] = None  # 键盘移动的当前行
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def put(self, idx: int, track, duration: str = '', status: str = ''):
+        """设置第 idx 行（可超出当前行数，中间补空行）"""
+        if idx >= len(self._tracks):
+            grow = idx + 1 - len(self._tracks)
+            self._tracks.extend([None] * grow)
+            self._durations.extend([''] * grow)
+            self._statuses.extend([''] * grow)
+        self._tracks[idx] = track
+        self._durations[idx] = duration
+        self._statuses[idx] = status
+        if track is not None:
+            self._by_track[int(track.trackId)] = idx
+
+    def track(self, idx: int):
+        return self._tracks[idx] if 0 <= idx < len(self._tracks) else None
+
+    def row_of_track(self, track_id) -> Optional[int]:
+        return self._by_track.get(int(track_id))
+
+    def row_values(self, idx: int) -> Tuple[str, str, str, str]:
+        """(序号, 标题, 时长, 状态)"""
+        track = self._tracks[idx]
+        title = track.title if track is not None else ''
+        return str(idx + 1), title, self._durations[idx], self._statuses[idx]
+
+    def status(self, idx: int) -> str:
+        return self._statuses[idx]
+
+    def set_values(self, idx: int, url_status: str = None, duration: str = None) -> bool:
+        """修改一行的显示列，返回是否有变化"""
+        if not 0 <= idx < len(self._tracks):
+            return False
+        changed = False
+        if url_status is not None and self._statuses[idx] != url_status:
+            self._statuses[idx] = url_status
+            changed = True
+        if duration is not None and self._durations[idx] != duration:
+            self._durations[idx] = duration
+            changed = True
+        return changed
+
+    def status_changes(self, statuses: Dict[int, str]) -> List[int]:
+        """批量设置解析状态，返回真正发生变化的行号"""
+        return [idx for idx, status in statuses.items() if self.set_values(idx, url_status=status)]
+
+    # 选择
+    def select_all(self):
+        self.selection = set(range(len(self._tracks)))
+
+    def clear_selection(self):
+        self.selection = set()
+
+    def click(self, idx: int, shift: bool = False, ctrl: bool = False):
+        """按鼠标/键盘操作更新选择：普通点击单选，Ctrl 切换，Shift 从起点选到 idx"""
+        if not 0 <= idx < len(self._tracks):
+            return
+        if shift and self.anchor is not None:
+            lo, hi = sorted((self.anchor, idx))
+            span = set(range(lo, hi + 1))
+            self.selection = self.selection | span if ctrl else span
+        elif ctrl:
+            self.selection ^= {idx}
+            self.anchor = idx
+        else:
+            self.selection = {idx}
+            self.anchor = idx
+        self.cursor = idx
+
+    def is_selected(self, idx: int) -> bool:
+        return idx in self.selection
+
+    def selected_rows(self) -> List[int]:
+        return sorted(idx for idx in self.selection if idx < len(self._tracks))
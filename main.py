@@ -1,14 +1,12 @@
-from fetcher.track_fetcher import fetch_album_tracks, Track
-from fetcher.album_fetcher import fetch_album, Album
-from downloader.downloader import M4ADownloader
-from dataclasses import asdict
-import tkinter as tk
-from tkinter import messagebox
-from gui.gui import XimalayaGUI
-from gui.login_dialog import check_cookie_exists, show_login_dialog
 import os, sys
 
 def main():
+    # GUI相关模块在这里才导入，保证 `import main` 本身足够轻量
+    import tkinter as tk
+    from tkinter import messagebox
+    from gui.gui import XimalayaGUI
+    from gui.login_dialog import check_cookie_exists, show_login_dialog
+
     if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
         base_dir = os.path.dirname(sys.executable)
     else:
@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_library_index(tmp_path, monkeypatch):
+    """全局下载索引指向临时目录，运行测试不会在工作目录下生成 cache/library.db"""
+    import utils.library_index as library_index
+    monkeypatch.setattr(library_index, '_global_index', library_index.LibraryIndex(str(tmp_path / 'library-cache')))
+
+
+@pytest.fixture(autouse=True)
+def isolated_sqlite_cache(tmp_path, monkeypatch):
+    """全局SQLite缓存指向临时目录，各测试之间不共享专辑信息等缓存"""
+    import utils.sqlite_cache as sqlite_cache
+    monkeypatch.setattr(sqlite_cache, '_global_cache', sqlite_cache.SqliteCache(str(tmp_path / 'sqlite-cache')))
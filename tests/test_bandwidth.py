@@ -0,0 +1,79 @@
+import datetime
+import pytest
+from utils.bandwidth import BandwidthSchedule, TokenBucket, parse_rate, set_global_bandwidth, get_global_bandwidth
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_parse_rate():
+    assert parse_rate('512K') == 512 * 1024
+    assert parse_rate('2mb') == 2 * 1024 * 1024
+    assert parse_rate('1000') == 1000
+    assert parse_rate('') == 0
+    with pytest.raises(ValueError):
+        parse_rate('fast')
+
+
+def test_schedule_wraps_midnight():
+    schedule = BandwidthSchedule.parse('08:00-23:00=512K,23:00-08:00=0', default=100)
+    assert schedule.rate_at(datetime.datetime(2024, 1, 1, 12, 0)) == 512 * 1024
+    assert schedule.rate_at(datetime.datetime(2024, 1, 1, 23, 30)) == 0
+    assert schedule.rate_at(datetime.datetime(2024, 1, 1, 3, 0)) == 0
+    assert BandwidthSchedule.parse('01:00-02:00=1K', default=100).rate_at(datetime.datetime(2024, 1, 1, 5, 0)) == 100
+
+
+def test_token_bucket_limits_average_rate():
+    t = FakeTime()
+    bucket = TokenBucket(100 * 1024, clock=t.clock, sleep=t.sleep)
+    for _ in range(40):
+        bucket.consume(64 * 1024)
+    # 40 * 64KB = 2560KB，速率100KB/s，首秒的突发额度之外约需24.6秒
+    assert 24 <= t.now <= 26
+    assert bucket.suggested_chunk(512 * 1024) == 25 * 1024
+
+
+def test_unlimited_bucket_never_sleeps():
+    t = FakeTime()
+    bucket = TokenBucket(0, clock=t.clock, sleep=t.sleep)
+    bucket.consume(10 ** 9)
+    assert t.now == 0
+
+
+def test_global_bandwidth_toggle():
+    set_global_bandwidth('1M')
+    assert get_global_bandwidth().rate == 1024 * 1024
+    set_global_bandwidth(0)
+    assert get_global_bandwidth() is None
+
+
+def test_shared_bucket_splits_rate_across_processes(tmp_path):
+    from utils.bandwidth import SharedTokenBucket
+    t = FakeTime()
+    t.now = 1000.0
+    db_path = str(tmp_path / 'worker.db')
+    # 两个实例模拟两个worker进程，共享同一个数据库里的配额
+    a = SharedTokenBucket(db_path, rate=1000, clock=t.clock, sleep=t.sleep)
+    b = SharedTokenBucket(db_path, rate=1000, clock=t.clock, sleep=t.sleep)
+    for _ in range(5):
+        a.consume(1000)
+        b.consume(1000)
+    # 10000字节，速率1000字节/秒，扣除1秒突发额度后约需9秒
+    assert 8.9 <= t.now - 1000.0 <= 9.1
+
+
+def test_global_bandwidth_shared_with_db_path(tmp_path):
+    from utils.bandwidth import SharedTokenBucket
+    set_global_bandwidth('512K', db_path=str(tmp_path / 'worker.db'))
+    try:
+        assert isinstance(get_global_bandwidth(), SharedTokenBucket)
+    finally:
+        set_global_bandwidth(0)
@@ -0,0 +1,40 @@
+from utils.cdn_selector import CdnSelector
+from fetcher.track_fetcher import play_url_candidates
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rank_prefers_faster_hosts():
+    selector = CdnSelector(typical_size=1024 * 1024)
+    selector.record_success('http://slow.example/a.m4a', ttfb=0.2, nbytes=1024 * 1024, seconds=10)
+    selector.record_success('http://fast.example/a.m4a', ttfb=0.3, nbytes=1024 * 1024, seconds=1)
+    urls = ['http://slow.example/b.m4a', 'http://fast.example/b.m4a']
+    assert selector.rank(urls) == ['http://fast.example/b.m4a', 'http://slow.example/b.m4a']
+
+
+def test_recent_failure_demotes_host_until_penalty_expires():
+    clock = FakeClock()
+    selector = CdnSelector(failure_penalty=60, clock=clock)
+    urls = ['http://a.example/x', 'http://b.example/x']
+    selector.record_failure(urls[0])
+    assert selector.rank(urls) == [urls[1], urls[0]]
+    clock.now += 61
+    assert selector.rank(urls) == urls
+    assert selector.snapshot()['a.example'].failures == 1
+
+
+def test_play_url_candidates_keeps_same_format_and_dedupes():
+    play_url_list = [
+        {'type': 'M4A_64', 'url': 'c1'},
+        {'type': 'MP3_64', 'url': 'm1'},
+        {'type': 'M4A_64', 'url': 'c2'},
+        {'type': 'M4A_64', 'url': 'c1'},
+    ]
+    assert play_url_candidates(play_url_list) == ['c1', 'c2']
+    assert play_url_candidates([]) == []
@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+import cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_read_ids_file(tmp_path):
+    path = tmp_path / 'ids.txt'
+    path.write_text('# 注释\n123\nalbum: 456\ntrack:789\n\n', encoding='utf-8')
+    assert cli.read_ids_file(str(path)) == [('album', 123), ('album', 456), ('track', 789)]
+
+
+def test_reporter_writes_json_lines_and_filters_logs():
+    stream = io.StringIO()
+    reporter = cli.JsonLinesReporter(stream=stream, log_level='warning')
+    reporter.log('详细信息', level='info')
+    reporter.log('出错了', level='error')
+    reporter.progress_func(1)(2, 10, 'a.m4a')
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [l['event'] for l in lines] == ['log', 'progress']
+    assert lines[0]['msg'] == '出错了'
+    assert lines[1]['current'] == 2 and lines[1]['total'] == 10
+
+
+def test_list_command_emits_tracks():
+    from fetcher.track_fetcher import Track
+    tracks = [Track(trackId=i, title=f'T{i}', createTime='', updateTime='', cryptedUrl='', url='',
+                    duration=60, totalCount=2) for i in (1, 2)]
+    stream = io.StringIO()
+    with patch('fetcher.track_fetcher.fetch_album_tracks_fast', return_value=tracks), \
+            patch('sys.stdout', stream):
+        assert cli.main(['list', '--album-id', '99']) == 0
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e['track_id'] for e in events if e['event'] == 'track'] == [1, 2]
+    assert events[-1] == {**events[-1], 'event': 'done', 'tracks': 2}
+
+
+def test_cli_never_imports_gui_modules():
+    code = (
+        'import sys, cli, fetcher.track_fetcher, fetcher.album_fetcher, '
+        'downloader.album_download, downloader.single_track_download\n'
+        'bad = [m for m in ("tkinter", "PIL", "gui.gui") if m in sys.modules]\n'
+        'assert not bad, bad\n'
+    )
+    subprocess.run([sys.executable, '-c', code], cwd=ROOT, check=True)
+
+
+def test_download_rejects_invalid_rate_with_json_error(tmp_path):
+    stream = io.StringIO()
+    with patch('sys.stdout', stream):
+        assert cli.main(['download', '--track-id', '5', '--download-dir', str(tmp_path), '--max-rate', 'fast']) == 1
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e['event'] for e in events] == ['error']
+
+
+def test_download_stdout_is_pure_json_lines(tmp_path):
+    from fetcher.track_info_fetcher import TrackInfo
+
+    def noisy_track_info(track_id):
+        print('[Track解析] 模拟模块直接打印的日志')
+        return TrackInfo(trackId=track_id, title='T', cover='', duration=1)
+
+    def noisy_download(self, track_id, album_id=None, output_file=None, log_func=print):
+        print('[缓存-读取] 模拟未传 log_func 的调用')
+
+    stdout, stderr = io.StringIO(), io.StringIO()
+    with patch('fetcher.track_info_fetcher.get_track_info', side_effect=noisy_track_info), \
+            patch('downloader.downloader.M4ADownloader.download_track_by_id', noisy_download), \
+            patch('sys.stdout', stdout), patch('sys.stderr', stderr):
+        assert cli.main(['--log-level', 'info', 'download', '--track-id', '5', '--download-dir', str(tmp_path)]) == 0
+    events = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [e['event'] for e in events if e['event'] != 'log'] == ['start', 'done']
+    assert '[Track解析]' in stderr.getvalue() and '[缓存-读取]' in stderr.getvalue()
@@ -0,0 +1,26 @@
+import base64
+
+from utils.utils import decrypt_url, decrypt_urls, key
+
+
+def encrypt(plain):
+    from Crypto.Cipher import AES
+    data = plain.encode()
+    pad = 16 - len(data) % 16
+    return base64.urlsafe_b64encode(AES.new(key, AES.MODE_ECB).encrypt(data + bytes([pad]) * pad)).decode().rstrip('=')
+
+
+def test_decrypt_urls_matches_single_decrypt_and_keeps_order():
+    urls = [f'https://cdn{i}.example.com/a/{i}.m4a' for i in range(5)]
+    ciphertexts = [encrypt(u) for u in urls]
+    batch = ciphertexts + [ciphertexts[0], '', 'not-base64!', encrypt('x')[:-2]]
+    assert decrypt_urls(batch) == urls + [urls[0], '', '', '']
+    assert [decrypt_url(c) for c in ciphertexts] == urls
+
+
+def test_decrypt_url_memoizes_results():
+    decrypt_url.cache_clear()
+    ciphertext = encrypt('https://cdn.example.com/x.m4a')
+    decrypt_url(ciphertext)
+    decrypt_url(ciphertext)
+    assert decrypt_url.cache_info().hits == 1
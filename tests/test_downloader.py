@@ -3,6 +3,7 @@ from unittest.mock import patch, MagicMock, mock_open
 import requests
 import os
 from downloader.downloader import M4ADownloader
+from utils.library_index import HEAD_HASH_BYTES
 
 # Test cases for M4ADownloader
 class TestM4ADownloader:
@@ -80,7 +81,7 @@ class TestM4ADownloader:
         downloader = M4ADownloader()
         url = downloader.get_track_download_url(123, 456)
         assert url == "decrypted_url"
-        mock_fetch_crypted_url.assert_called_once_with(123, 456)
+        mock_fetch_crypted_url.assert_called_once_with(123, 456, quality=1)
         mock_decrypt_url.assert_called_once_with("crypted_url")
 
     @patch("fetcher.track_fetcher.fetch_track_crypted_url")
@@ -90,7 +91,7 @@ class TestM4ADownloader:
         downloader = M4ADownloader()
         url = downloader.get_track_download_url(123, 456)
         assert url is None
-        mock_fetch_crypted_url.assert_called_once_with(123, 456)
+        mock_fetch_crypted_url.assert_called_once_with(123, 456, quality=1)
         mock_decrypt_url.assert_not_called()
 
     @patch("fetcher.track_fetcher.fetch_track_crypted_url", side_effect=TypeError)
@@ -131,4 +132,399 @@ class TestM4ADownloader:
         downloader = M4ADownloader()
         with pytest.raises(Exception, match="未获取到下载URL"):
             downloader.download_track_by_id(123, 456, "output.m4a", log_func=mock_log_func)
-        mock_log_func.assert_called_once_with('未获取到下载URL: track_id=123', level='error')
\ No newline at end of file
+        mock_log_func.assert_called_once_with('未获取到下载URL: track_id=123', level='error')
+
+# Test cases for AlbumDownloader
+class TestAlbumDownloader:
+    def _make_tracks(self, n):
+        from fetcher.track_fetcher import Track
+        return [Track(trackId=i, title=f'T{i}', createTime='', updateTime='', cryptedUrl='', url='',
+                      duration=10, totalCount=n) for i in range(1, n + 1)]
+
+    def test_failed_track_backs_off_without_blocking_others(self, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        from utils.library_index import LibraryIndex
+        clock = [1000.0]
+        order = []
+
+        def fake_download(track_id, album_id, output_file, log_func=None):
+            order.append(track_id)
+            if track_id == 1 and order.count(1) == 1:
+                raise Exception('timeout')
+
+        def fake_sleep(seconds):
+            clock[0] += seconds
+
+        downloader = AlbumDownloader(1, log_func=MagicMock(), save_dir=str(tmp_path))
+        downloader.save_dir = str(tmp_path)
+        downloader.downloader.download_track_by_id = MagicMock(side_effect=fake_download)
+        index = LibraryIndex(str(tmp_path / 'cache'))
+        with patch("downloader.album_download.fetch_album_tracks", return_value=self._make_tracks(2)), \
+                patch("utils.library_index.get_library_index", return_value=index), \
+                patch("time.time", side_effect=lambda: clock[0]), \
+                patch("time.sleep", side_effect=fake_sleep):
+            downloader.fetch_and_download_tracks()
+
+        # 曲目1失败后进入延迟队列，曲目2先下载，退避到期后再重试曲目1
+        assert order == [1, 2, 1]
+        progress = downloader.load_progress()
+        track1 = progress['1']['tracks']['1']
+        assert track1['done'] is True
+        assert [a['error'] for a in track1['attempts']] == ['timeout']
+        assert progress['1']['done'] is True
+
+
+    def test_failed_track_is_retried_on_next_run(self, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        from utils.library_index import LibraryIndex
+        index = LibraryIndex(str(tmp_path / 'cache'))
+        clock = [1000.0]
+        calls = []
+
+        def fake_download(track_id, album_id, output_file, log_func=None):
+            calls.append(track_id)
+            if track_id == 1:
+                raise Exception('always fails')
+
+        def fake_sleep(seconds):
+            clock[0] += seconds
+
+        def run():
+            downloader = AlbumDownloader(1, log_func=MagicMock(), save_dir=str(tmp_path))
+            downloader.downloader.download_track_by_id = MagicMock(side_effect=fake_download)
+            with patch("downloader.album_download.fetch_album_tracks", return_value=self._make_tracks(2)), \
+                    patch("utils.library_index.get_library_index", return_value=index), \
+                    patch("time.time", side_effect=lambda: clock[0]), \
+                    patch("time.sleep", side_effect=fake_sleep):
+                downloader.fetch_and_download_tracks()
+            return downloader
+
+        downloader = run()
+        # 曲目2先于曲目1的最终结果成功，整页不能因此被标记为完成
+        assert downloader.load_progress()['1']['done'] is False
+        calls.clear()
+        run()
+        assert calls and set(calls) == {1}
+
+# Test cases for cross-album de-duplication
+class TestDownloadDedup:
+    def test_download_track_by_id_links_existing_copy(self, tmp_path):
+        from utils.library_index import LibraryIndex
+        index = LibraryIndex(str(tmp_path / 'cache'))
+        src = tmp_path / 'album_a' / '001_x.m4a'
+        src.parent.mkdir()
+        src.write_bytes(b'z' * 20 * 1024)
+        index.record(1, 555, str(src), expected_size=20 * 1024)
+        dst = tmp_path / 'album_b' / '003_x.m4a'
+        dst.parent.mkdir()
+
+        downloader = M4ADownloader()
+        with patch("utils.library_index.get_library_index", return_value=index), \
+                patch.object(M4ADownloader, "get_track_download_url") as mock_get_url:
+            downloader.download_track_by_id(555, 2, str(dst), log_func=MagicMock())
+        mock_get_url.assert_not_called()
+        assert dst.read_bytes() == src.read_bytes()
+        assert index.get_album_entries(2)[555].content_hash == index.get_album_entries(1)[555].content_hash
+
+    def test_download_track_by_id_does_not_index_failed_download(self, tmp_path):
+        from utils.library_index import LibraryIndex
+        index = LibraryIndex(str(tmp_path / 'cache'))
+        out = tmp_path / 'x.m4a'
+
+        def partial_download(url, output_file, log_func=None):
+            # 重试用尽：保留了部分文件并返回 False
+            out.write_bytes(b'p' * 50000)
+            return False
+
+        downloader = M4ADownloader()
+        with patch("utils.library_index.get_library_index", return_value=index), \
+                patch.object(M4ADownloader, "get_track_download_url", return_value="http://x/a.m4a"), \
+                patch.object(M4ADownloader, "download_from_url", side_effect=partial_download):
+            with pytest.raises(Exception, match="下载失败"):
+                downloader.download_track_by_id(777, 1, str(out), log_func=MagicMock())
+        assert index.get_album_entries(1) == {}
+        assert not out.exists()
+
+    @patch("requests.get")
+    def test_download_once_links_when_size_and_head_match(self, mock_get, tmp_path):
+        from utils.library_index import LibraryIndex
+        index = LibraryIndex(str(tmp_path / 'cache'))
+        data = os.urandom(200 * 1024)
+        src = tmp_path / 'old.m4a'
+        src.write_bytes(data)
+        index.record(1, 1, str(src), expected_size=len(data))
+
+        served = []
+        def iter_content(chunk_size):
+            for i in range(0, len(data), chunk_size):
+                chunk = data[i:i + chunk_size]
+                served.append(len(chunk))
+                yield chunk
+        mock_response = MagicMock()
+        mock_response.headers = {'content-length': str(len(data))}
+        mock_response.iter_content = iter_content
+        mock_get.return_value = mock_response
+
+        dst = tmp_path / 'new.m4a'
+        with patch("utils.library_index.get_library_index", return_value=index):
+            assert M4ADownloader()._download_once("http://test.url/x.m4a", str(dst), log_func=MagicMock()) is True
+        assert dst.read_bytes() == data
+        assert sum(served) == HEAD_HASH_BYTES  # 只读了文件头部
+
+
+# Test cases for the readinto download path against a real local HTTP server
+class TestReadintoDownload:
+    def test_download_once_streams_into_reused_buffer(self, tmp_path):
+        import hashlib
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from utils.library_index import LibraryIndex
+        data = os.urandom(3 * 1024 * 1024 + 123)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            out = tmp_path / 'x.m4a'
+            downloader = M4ADownloader(buffer_size=256 * 1024)
+            with patch("utils.library_index.get_library_index", return_value=LibraryIndex(str(tmp_path / 'cache'))):
+                assert downloader._download_once(f'http://127.0.0.1:{server.server_address[1]}/x.m4a',
+                                                 str(out), log_func=MagicMock()) is True
+        finally:
+            server.shutdown()
+        assert out.read_bytes() == data
+        assert downloader._last_md5 == hashlib.md5(data).hexdigest()
+
+    def test_download_once_consumes_bandwidth_tokens(self, tmp_path):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from utils.bandwidth import TokenBucket
+        from utils.library_index import LibraryIndex
+        data = os.urandom(1024 * 1024)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            out = tmp_path / 'x.m4a'
+            downloader = M4ADownloader(buffer_size=512 * 1024)
+            # 不真正等待，只记录消耗的令牌
+            downloader.bandwidth = MagicMock(wraps=TokenBucket(128 * 1024, sleep=lambda s: None))
+            with patch("utils.library_index.get_library_index", return_value=LibraryIndex(str(tmp_path / 'cache'))):
+                assert downloader._download_once(f'http://127.0.0.1:{server.server_address[1]}/x.m4a',
+                                                 str(out), log_func=MagicMock()) is True
+        finally:
+            server.shutdown()
+        consumed = [c.args[0] for c in downloader.bandwidth.consume.call_args_list]
+        assert sum(consumed) == len(data)
+        # 128KB/s 时单次读取量缩小到 32KB
+        assert max(consumed[1:]) <= 32 * 1024
+        assert out.read_bytes() == data
+
+    def test_download_m4a_retries_when_server_closes_early(self, tmp_path):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from utils.library_index import LibraryIndex
+        data = os.urandom(512 * 1024)
+        requests_seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                requests_seen.append(self.path)
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                # 第一次只发送一半就断开连接
+                self.wfile.write(data if len(requests_seen) > 1 else data[:len(data) // 2])
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            out = tmp_path / 'x.m4a'
+            downloader = M4ADownloader(retry_delay=0, buffer_size=128 * 1024)
+            with patch("utils.library_index.get_library_index", return_value=LibraryIndex(str(tmp_path / 'cache'))):
+                assert downloader.download_m4a(f'http://127.0.0.1:{server.server_address[1]}/x.m4a',
+                                               str(out), log_func=MagicMock()) is True
+        finally:
+            server.shutdown()
+        assert len(requests_seen) == 2
+        assert out.read_bytes() == data
+
+
+# Test cases for sharing one downloader between download threads
+class TestSharedDownloader:
+    def test_last_result_is_per_thread(self):
+        import threading
+        downloader = M4ADownloader()
+        downloader._last_md5 = 'main'
+        seen = []
+
+        def worker():
+            seen.append(downloader._last_md5)
+            downloader._last_md5 = 'worker'
+
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+        assert seen == [None]
+        assert downloader._last_md5 == 'main'
+
+    @patch("time.sleep")
+    def test_request_slots_are_spaced_across_threads(self, mock_sleep):
+        import threading
+        downloader = M4ADownloader(retry_delay=2)
+        with patch("time.time", return_value=100.0):
+            threads = [threading.Thread(target=downloader._wait_request_slot, args=(MagicMock(),)) for _ in range(3)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert sorted(c.args[0] for c in mock_sleep.call_args_list) == [2.0, 4.0]
+
+
+# Test cases for stall detection and Range resume
+class TestStallResume:
+    def _serve(self, handler_cls):
+        import threading
+        from http.server import ThreadingHTTPServer
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler_cls)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def test_stalled_connection_resumes_with_range(self, tmp_path):
+        import time
+        from http.server import BaseHTTPRequestHandler
+        from utils.library_index import LibraryIndex
+        from utils.progress import get_stall_metrics
+        data = os.urandom(256 * 1024)
+        ranges = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                ranges.append(self.headers.get('Range'))
+                if self.headers.get('Range'):
+                    start = int(self.headers['Range'][len('bytes='):-1])
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+                    self.send_header('Content-Length', str(len(data) - start))
+                    self.end_headers()
+                    self.wfile.write(data[start:])
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data[:100 * 1024])
+                self.wfile.flush()
+                # 之后每0.05秒只发1个字节，永远不会触发读超时
+                try:
+                    for i in range(100 * 1024, 100 * 1024 + 60):
+                        time.sleep(0.05)
+                        self.wfile.write(data[i:i + 1])
+                        self.wfile.flush()
+                except OSError:
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        before = get_stall_metrics().snapshot()
+        server = self._serve(Handler)
+        try:
+            out = tmp_path / 'x.m4a'
+            downloader = M4ADownloader(stall_min_rate=10 * 1024, stall_window=0.5)
+            with patch("utils.library_index.get_library_index", return_value=LibraryIndex(str(tmp_path / 'cache'))):
+                assert downloader._download_once(f'http://127.0.0.1:{server.server_address[1]}/x.m4a',
+                                                 str(out), log_func=MagicMock()) is True
+        finally:
+            server.shutdown()
+        assert out.read_bytes() == data
+        assert ranges[0] is None and ranges[1].startswith('bytes=') and int(ranges[1][6:-1]) >= 100 * 1024
+        after = get_stall_metrics().snapshot()
+        assert after['stalls'] == before['stalls'] + 1
+        assert after['resumes'] == before['resumes'] + 1
+
+    def test_restarts_from_scratch_without_range_support(self, tmp_path):
+        from http.server import BaseHTTPRequestHandler
+        from utils.library_index import LibraryIndex
+        data = os.urandom(256 * 1024)
+        seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                seen.append(self.headers.get('Range'))
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                # 第一次只发一部分就断开，之后忽略 Range 返回完整内容
+                self.wfile.write(data if len(seen) > 1 else data[:150 * 1024])
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        server = self._serve(Handler)
+        try:
+            out = tmp_path / 'x.m4a'
+            downloader = M4ADownloader()
+            with patch("utils.library_index.get_library_index", return_value=LibraryIndex(str(tmp_path / 'cache'))):
+                assert downloader._download_once(f'http://127.0.0.1:{server.server_address[1]}/x.m4a',
+                                                 str(out), log_func=MagicMock()) is True
+        finally:
+            server.shutdown()
+        assert len(seen) == 2 and seen[1] is not None
+        assert out.read_bytes() == data
+
+
+# Test cases for failing over between CDN candidates
+class TestCdnFailover:
+    def test_download_from_url_fails_over_on_5xx(self, tmp_path):
+        from utils.cdn_selector import CdnSelector
+        response = MagicMock(status_code=503)
+        calls = []
+
+        def fake_download_m4a(url, output_file, log_func=print, fail_fast=False):
+            calls.append((url, fail_fast))
+            if 'bad' in url:
+                raise requests.exceptions.HTTPError('503', response=response)
+            return True
+
+        selector = CdnSelector()
+        downloader = M4ADownloader()
+        with patch('downloader.downloader.get_cdn_selector', return_value=selector), \
+                patch.object(M4ADownloader, '_candidate_urls', return_value=['http://bad.example/a', 'http://good.example/a']), \
+                patch.object(M4ADownloader, 'download_m4a', side_effect=fake_download_m4a), \
+                patch.object(M4ADownloader, '_reuse_by_track_id', return_value=False), \
+                patch.object(M4ADownloader, '_record_library'):
+            assert downloader.download_from_url('http://bad.example/a', str(tmp_path / 'a.m4a'),
+                                                log_func=MagicMock(), track_id=1, album_id=2) is True
+        assert calls == [('http://bad.example/a', True), ('http://good.example/a', False)]
+        assert selector.snapshot()['bad.example'].failures == 1
+        assert selector.rank(['http://bad.example/b', 'http://good.example/b'])[0] == 'http://good.example/b'
+
+    def test_candidate_urls_include_cached_alternatives(self):
+        with patch('utils.sqlite_cache.SqliteCache.get_track_candidates', return_value=['c1', 'c2']), \
+                patch('utils.utils.decrypt_urls', side_effect=lambda cs: [f'http://{c}.example/a' for c in cs]):
+            urls = M4ADownloader()._candidate_urls('http://c1.example/a', track_id=1, album_id=2)
+        assert sorted(urls) == ['http://c1.example/a', 'http://c2.example/a']
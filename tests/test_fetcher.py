@@ -196,4 +196,26 @@ def test_fetch_album_exception():
         mock_get.side_effect = Exception("Network Error")
 
         album = fetch_album(123)
-        assert album is None
\ No newline at end of file
+        assert album is None
+def test_fetch_album_uses_cache_and_falls_back_when_offline():
+    from utils.sqlite_cache import get_sqlite_cache
+    with patch("requests.get") as mock_get:
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "data": {"albumPageMainInfo": {"albumTitle": "Cached Album", "updateDate": "2023-01-02"}}
+        }
+        mock_get.return_value = mock_response
+        assert fetch_album(123).albumTitle == "Cached Album"
+        # 有效期内不再请求
+        assert fetch_album(123).albumTitle == "Cached Album"
+        assert mock_get.call_count == 1
+
+        cache = get_sqlite_cache()
+        with cache._connect() as conn:
+            conn.execute("UPDATE album_meta SET checked_at = 0")
+        mock_get.side_effect = Exception("Network Error")
+        # 过期后重新请求失败，使用过期的缓存
+        album = fetch_album(123)
+        assert mock_get.call_count == 2
+        assert album.albumTitle == "Cached Album" and album.albumId == 123
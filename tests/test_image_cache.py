@@ -0,0 +1,74 @@
+import os
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+
+from utils.image_cache import ImageCache
+
+
+def make_png(color, size=(300, 200)):
+    from PIL import Image
+    buf = BytesIO()
+    Image.new('RGB', size, color).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class FakeSession:
+    def __init__(self, images):
+        self.images = images  # url -> bytes
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append((url, dict(headers or {})))
+        if (headers or {}).get('If-None-Match') == f'"{url}"':
+            return SimpleNamespace(status_code=304, content=b'', headers={})
+        return SimpleNamespace(status_code=200, content=self.images[url], headers={'ETag': f'"{url}"'})
+
+
+def test_cover_is_downloaded_once_and_shared_by_content(tmp_path):
+    pytest.importorskip('PIL')
+    red = make_png('red')
+    session = FakeSession({'http://a/cover.jpg': red, 'http://b/same.jpg': red})
+    cache = ImageCache(str(tmp_path), session=session)
+
+    thumb = cache.get_thumbnail('http://a/cover.jpg')
+    assert cache.get_thumbnail('http://a/cover.jpg') == thumb
+    assert cache.export('http://a/cover.jpg', str(tmp_path / 'cover.jpg'))
+    assert (tmp_path / 'cover.jpg').read_bytes() == red
+    assert len(session.calls) == 1
+
+    from PIL import Image
+    assert Image.open(thumb).size == (150, 150)
+    # 内容相同的另一个URL共用同一份原图
+    assert cache.get('http://b/same.jpg') == cache.get('http://a/cover.jpg')
+    # 新的实例（下次启动）直接使用磁盘上的文件
+    assert ImageCache(str(tmp_path), session=session).get_thumbnail('http://a/cover.jpg') == thumb
+    assert len(session.calls) == 2
+
+
+def test_stale_entries_revalidate_with_etag(tmp_path):
+    session = FakeSession({'http://a/cover.jpg': make_png('blue')})
+    cache = ImageCache(str(tmp_path), revalidate_hours=0, session=session)
+    path = cache.get('http://a/cover.jpg')
+    assert cache.get('http://a/cover.jpg') == path
+    assert session.calls[1] == ('http://a/cover.jpg', {'If-None-Match': '"http://a/cover.jpg"'})
+
+    def offline(url, headers=None, timeout=None):
+        raise OSError('offline')
+    session.get = offline
+    # 网络不可用时使用本地副本
+    assert cache.get('http://a/cover.jpg') == path
+
+
+def test_lru_budget_evicts_least_recently_used(tmp_path):
+    images = {f'http://a/{i}.jpg': bytes([i]) * 1000 for i in range(4)}
+    cache = ImageCache(str(tmp_path), max_bytes=2500, session=FakeSession(images))
+    first = cache.get('http://a/0.jpg')
+    cache.get('http://a/1.jpg')
+    cache.get('http://a/0.jpg')  # 0 最近使用过，应保留
+    cache.get('http://a/2.jpg')
+    assert cache.total_size() <= 2500
+    assert cache._lookup('http://a/1.jpg') is None
+    assert cache._lookup('http://a/0.jpg') is not None
+    assert os.path.exists(first)
@@ -0,0 +1,89 @@
+import os
+import time
+import pytest
+from unittest.mock import patch
+from utils.job_queue import JobQueue
+from utils.rate_limiter import SqliteRateLimiter, set_global_rate_limiter, wait_for_request_slot
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(os.path.join(tmp_path, 'worker.db'), max_attempts=2)
+
+
+def test_enqueue_deduplicates_open_jobs(queue):
+    assert queue.enqueue('album', 123) is not None
+    assert queue.enqueue('album', 123) is None
+    assert queue.enqueue('track', 123) is not None
+    assert queue.stats()['pending'] == 2
+
+
+def test_enqueue_rejects_unknown_type(queue):
+    with pytest.raises(ValueError):
+        queue.enqueue('playlist', 1)
+
+
+def test_claim_is_exclusive_until_lease_expires(queue):
+    queue.enqueue('album', 1)
+    job = queue.claim('w1', lease_seconds=60)
+    assert job is not None and job.target_id == 1 and job.attempts == 1
+    assert queue.claim('w2', lease_seconds=60) is None
+
+    # 租约过期后可被其他worker接管，原worker不能再提交
+    with patch('utils.job_queue.time.time', return_value=time.time() + 120):
+        taken = queue.claim('w2', lease_seconds=60)
+    assert taken.job_id == job.job_id and taken.worker_id == 'w2'
+    assert queue.complete(job.job_id, 'w1') is False
+    assert queue.complete(job.job_id, 'w2') is True
+    assert queue.stats()['done'] == 1
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.enqueue('album', 1)
+    now = time.time()
+    # 每次认领后worker都崩溃（不提交也不续约）
+    for i in range(2):
+        with patch('utils.job_queue.time.time', return_value=now + i * 120):
+            assert queue.claim(f'w{i}', lease_seconds=60) is not None
+    with patch('utils.job_queue.time.time', return_value=now + 360):
+        assert queue.claim('w9', lease_seconds=60) is None
+    stats = queue.stats()
+    assert stats['failed'] == 1 and stats['running'] == 0
+
+
+def test_heartbeat_extends_lease(queue):
+    queue.enqueue('track', 5, album_id=9)
+    job = queue.claim('w1', lease_seconds=1)
+    assert queue.heartbeat(job.job_id, 'w1', lease_seconds=600) is True
+    assert queue.heartbeat(job.job_id, 'other', lease_seconds=600) is False
+    with patch('utils.job_queue.time.time', return_value=time.time() + 300):
+        assert queue.claim('w2') is None
+
+
+def test_fail_requeues_then_marks_failed(queue):
+    queue.enqueue('album', 1)
+    job = queue.claim('w1')
+    assert queue.fail(job.job_id, 'w1', 'boom', retry_delay=0) is True
+    assert queue.stats()['pending'] == 1
+
+    job = queue.claim('w1')
+    assert job.attempts == 2
+    queue.fail(job.job_id, 'w1', 'boom again', retry_delay=0)
+    stats = queue.stats()
+    assert stats['failed'] == 1 and stats['pending'] == 0
+    assert queue.list_jobs(status='failed')[0].last_error == 'boom again'
+
+
+def test_rate_limiter_spaces_reservations(tmp_path):
+    db_path = os.path.join(tmp_path, 'worker.db')
+    limiter_a = SqliteRateLimiter(db_path, min_interval=10)
+    limiter_b = SqliteRateLimiter(db_path, min_interval=10)
+    assert limiter_a.reserve() == pytest.approx(0, abs=0.5)
+    # 另一个进程（实例）预约到的时间槽排在后面
+    assert limiter_b.reserve() == pytest.approx(10, abs=0.5)
+    assert limiter_a.reserve() == pytest.approx(20, abs=0.5)
+
+
+def test_wait_for_request_slot_without_limiter_is_noop():
+    set_global_rate_limiter(None)
+    assert wait_for_request_slot() == 0.0
@@ -0,0 +1,72 @@
+import os
+from utils.library_index import LibraryIndex, file_md5
+
+
+def _write(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+    return str(path)
+
+
+def test_record_and_lookup_survives_rename_of_title(tmp_path):
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    save_dir = tmp_path / 'album'
+    save_dir.mkdir()
+    path = _write(save_dir / '001_old title.m4a', 20 * 1024)
+    entry = index.record(9, 101, path)
+    assert entry.content_hash == file_md5(path)
+
+    # 服务器改了标题、序号也变了，仍按曲目ID识别为已下载
+    present = index.downloaded_tracks(9, str(save_dir), expected=[(101, '002_new title.m4a')])
+    assert present[101].path == os.path.abspath(path)
+
+
+def test_stale_entries_are_dropped(tmp_path):
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    path = _write(tmp_path / 'a.m4a', 20 * 1024)
+    index.record(9, 101, path)
+    os.remove(path)
+    assert index.downloaded_tracks(9) == {}
+    assert index.get_album_entries(9) == {}
+
+
+def test_backfills_files_downloaded_before_index(tmp_path):
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    _write(tmp_path / '001_a.m4a', 20 * 1024)
+    _write(tmp_path / '002_b.m4a', 100)  # 太小，视为未完成
+    present = index.downloaded_tracks(9, str(tmp_path), expected=[(1, '001_a.m4a'), (2, '002_b.m4a'), (3, '003_c.m4a')])
+    assert set(present) == {1}
+    assert set(index.get_album_entries(9)) == {1}
+
+
+def test_find_copy_by_track_id_and_by_content(tmp_path):
+    from utils.library_index import head_hash, link_file
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    data = os.urandom(100 * 1024)
+    src = tmp_path / 'a.m4a'
+    src.write_bytes(data)
+    index.record(1, 101, str(src), expected_size=len(data))
+
+    assert index.find_copy(track_id=101).path == str(src)
+    assert index.find_copy(track_id=999) is None
+    assert index.find_copy(size=len(data), head=head_hash(data)).path == str(src)
+    assert index.find_copy(size=len(data), head=head_hash(data), exclude_path=str(src)) is None
+    assert index.find_copy(size=len(data) + 1, head=head_hash(data)) is None
+
+    dst = tmp_path / 'b.m4a'
+    assert link_file(str(src), str(dst)) in ('hardlink', 'reflink')
+    assert dst.read_bytes() == data
+
+
+def test_find_copy_skips_unverified_entries(tmp_path):
+    from utils.library_index import head_hash
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    data = os.urandom(50 * 1000)
+    partial = tmp_path / 'partial.m4a'
+    partial.write_bytes(data)
+    # 服务器声明1MB但只收到50KB；扫描补登记的文件同样没有下载时的 Content-Length
+    index.record(1, 101, str(partial), expected_size=1024 * 1024)
+    index.record(2, 102, str(partial))
+    assert index.find_copy(track_id=101) is None
+    assert index.find_copy(track_id=102) is None
+    assert index.find_copy(size=len(data), head=head_hash(data)) is None
@@ -0,0 +1,71 @@
+import json
+import os
+from unittest.mock import patch
+from utils.library_index import LibraryIndex
+from utils.library_scanner import LibraryScanner
+
+
+def _make_album(root, album_id, tracks):
+    album_dir = root / f'Album_{album_id}'
+    album_dir.mkdir()
+    info = {'albumId': album_id, 'tracks': [
+        {'index': idx, 'trackId': track_id, 'title': title} for idx, track_id, title in tracks]}
+    (album_dir / 'album_info.json').write_text(json.dumps(info), encoding='utf-8')
+    for idx, _, title in tracks:
+        (album_dir / f'{idx:03d}_{title}.m4a').write_bytes(b'a' * 20 * 1024)
+    return album_dir
+
+
+def test_scan_adds_then_only_rehashes_changed_files(tmp_path):
+    root = tmp_path / 'AudioBook'
+    root.mkdir()
+    album_dir = _make_album(root, 7, [(1, 101, 'one'), (2, 102, 'two')])
+    (album_dir / 'stray.m4a').write_bytes(b'b' * 20 * 1024)
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    progress = []
+
+    stats = LibraryScanner(str(root), index=index, progress_func=lambda c, t, n: progress.append((c, t, n)),
+                           log_func=lambda *a, **k: None).scan()
+    assert (stats['added'], stats['unmatched']) == (2, 1)
+    assert set(index.get_album_entries(7)) == {101, 102}
+    assert progress == [(1, 1, 'Album_7')]
+
+    # 一个文件被修改、一个被删除；未变化的文件不应再读取
+    (album_dir / '001_one.m4a').write_bytes(b'c' * 30 * 1024)
+    os.remove(album_dir / '002_two.m4a')
+    with patch('utils.library_scanner.file_md5', return_value='new') as md5:
+        stats = LibraryScanner(str(root), index=index, log_func=lambda *a, **k: None).scan()
+    assert md5.call_count == 1
+    assert (stats['hashed'], stats['removed'], stats['unchanged']) == (1, 1, 0)
+    entries = index.get_album_entries(7)
+    assert set(entries) == {101} and entries[101].content_hash == 'new'
+
+    with patch('utils.library_scanner.file_md5') as md5:
+        stats = LibraryScanner(str(root), index=index, log_func=lambda *a, **k: None).scan()
+    md5.assert_not_called()
+    assert stats['unchanged'] == 1
+
+
+def test_background_scan_reports_done(tmp_path):
+    root = tmp_path / 'AudioBook'
+    root.mkdir()
+    _make_album(root, 8, [(1, 201, 'a')])
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    results = []
+    LibraryScanner(str(root), index=index, log_func=lambda *a, **k: None).start(on_done=results.append).join(10)
+    assert results and results[0]['added'] == 1
+
+
+def test_scan_reads_legacy_progress_without_migrating(tmp_path):
+    root = tmp_path / 'AudioBook'
+    root.mkdir()
+    album_dir = _make_album(root, 9, [])
+    (album_dir / '005_old.m4a').write_bytes(b'a' * 20 * 1024)
+    legacy = {'1': {'tracks': {'301': {'done': True, 'filename': '005_old.m4a'}}}}
+    (album_dir / 'download_progress.json').write_text(json.dumps(legacy), encoding='utf-8')
+    index = LibraryIndex(str(tmp_path / 'cache'))
+
+    stats = LibraryScanner(str(root), index=index, log_func=lambda *a, **k: None).scan()
+    assert stats['added'] == 1 and set(index.get_album_entries(9)) == {301}
+    # 扫描是只读的：旧进度文件原样保留，不生成 .jsonl
+    assert sorted(os.listdir(album_dir)) == ['005_old.m4a', 'album_info.json', 'download_progress.json']
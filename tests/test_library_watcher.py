@@ -0,0 +1,41 @@
+import json
+import os
+import threading
+import pytest
+from utils.library_index import LibraryIndex
+from utils.library_watcher import LibraryWatcher, is_supported
+
+pytestmark = pytest.mark.skipif(not is_supported(), reason='需要Linux inotify')
+
+
+def test_watcher_tracks_added_and_removed_files(tmp_path):
+    root = tmp_path / 'AudioBook'
+    album_dir = root / 'Album_5'
+    album_dir.mkdir(parents=True)
+    info = {'albumId': 5, 'tracks': [{'index': 1, 'trackId': 501, 'title': 'a'}]}
+    (album_dir / 'album_info.json').write_text(json.dumps(info), encoding='utf-8')
+    index = LibraryIndex(str(tmp_path / 'cache'))
+    changed = threading.Event()
+    watcher = LibraryWatcher(str(root), index=index, on_change=lambda d, ids: changed.set(),
+                             log_func=lambda *a, **k: None, debounce=0.1)
+    assert watcher.start()
+    try:
+        (album_dir / '001_a.m4a').write_bytes(b'a' * 20 * 1024)
+        assert changed.wait(5)
+        assert set(index.get_album_entries(5)) == {501}
+
+        changed.clear()
+        os.remove(album_dir / '001_a.m4a')
+        assert changed.wait(5)
+        assert index.get_album_entries(5) == {}
+
+        # 整个专辑目录被移出下载根目录
+        changed.clear()
+        (album_dir / '001_a.m4a').write_bytes(b'a' * 20 * 1024)
+        assert changed.wait(5)
+        changed.clear()
+        os.rename(album_dir, tmp_path / 'moved')
+        assert changed.wait(5)
+        assert index.get_album_entries(5) == {}
+    finally:
+        watcher.stop()
@@ -0,0 +1,64 @@
+import logging
+
+import pytest
+
+from utils.log import TRACE, get_log, get_logger, lazy, set_log_levels
+
+
+@pytest.fixture(autouse=True)
+def restore_levels():
+    loggers = [logging.getLogger('ximalaya')] + [get_logger(name) for name in ('cache', 'fetcher', 'testsys')]
+    saved = [logger.level for logger in loggers]
+    yield
+    for logger, level in zip(loggers, saved):
+        logger.setLevel(level)
+
+
+def test_disabled_levels_do_not_format_or_evaluate_lazy_args():
+    calls = []
+    messages = []
+    log = get_log('testsys', lambda msg, level='info': messages.append((level, msg)))
+    log.trace('%s', lazy(calls.append, 'trace'))
+    log.debug('%s', lazy(calls.append, 'debug'))
+    assert calls == [] and messages == []
+
+    log.info('共%d个曲目', 3)
+    assert messages == [('info', '共3个曲目')]
+
+
+def test_per_subsystem_levels():
+    messages = []
+    sink = lambda msg, level='info': messages.append((level, msg))
+    set_log_levels('warning,testsys=trace')
+    get_log('testsys', sink).trace('细节 %s', lazy(str, 42))
+    get_log('fetcher', sink).info('不输出')
+    assert messages == [('trace', '细节 42')]
+    assert get_logger('testsys').isEnabledFor(TRACE)
+
+    with pytest.raises(ValueError):
+        set_log_levels('testsys=verbose')
+
+
+def test_log_func_without_level_parameter_and_stdlib_fallback(caplog):
+    plain = []
+    get_log('testsys', plain.append).warning('重试 %d 次', 2)
+    assert plain == ['重试 2 次']
+
+    root = logging.getLogger('ximalaya')
+    root.addHandler(caplog.handler)
+    try:
+        get_log('testsys').error('失败: %s', 'boom')
+    finally:
+        root.removeHandler(caplog.handler)
+    assert [r.getMessage() for r in caplog.records] == ['失败: boom']
+
+
+def test_log_buffer_drains_in_order_and_counts_dropped():
+    from utils.log import LogBuffer
+    buffer = LogBuffer(maxlen=3)
+    for i in range(5):
+        buffer.append(f'第{i}条', 'debug' if i % 2 else 'info')
+    items, dropped = buffer.drain()
+    assert items == [('info', '第2条'), ('debug', '第3条'), ('info', '第4条')]
+    assert dropped == 2
+    assert buffer.drain() == ([], 0) and len(buffer) == 0
@@ -0,0 +1,102 @@
+from utils.progress import ProgressEvent, ProgressThrottle, throttle_calls
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_throttle_bounds_updates_by_time_and_reports_rate():
+    clock = FakeClock()
+    events = []
+    throttle = ProgressThrottle(events.append, min_interval=0.5, clock=clock)
+    total = 100 * 8192
+    for i in range(1, 101):
+        clock.now = i * 0.01  # 每块10ms，共1秒
+        throttle.update(i * 8192, total, 'a.m4a')
+    # 首次 + 每0.5秒一次 + 完成
+    assert len(events) == 3
+    assert events[-1].done and events[-1].percent == 100
+    assert abs(events[-1].rate - total / 0.99) < 1
+    assert events[1].eta is not None and events[1].eta > 0
+
+
+def test_throttle_respects_min_bytes_and_force():
+    clock = FakeClock()
+    events = []
+    throttle = ProgressThrottle(events.append, min_interval=0, min_bytes=1000, clock=clock)
+    throttle.update(10, 0)
+    throttle.update(500, 0)
+    throttle.update(1500, 0)
+    throttle.update(1600, 0, force=True)
+    assert [e.downloaded for e in events] == [10, 1500, 1600]
+
+
+def test_throttle_calls_keeps_final_call():
+    clock = FakeClock()
+    calls = []
+    wrapped = throttle_calls(lambda *a: calls.append(a), min_interval=0.2, clock=clock)
+    for i in range(1, 11):
+        wrapped(i, 10, 'x')
+    assert calls == [(1, 10, 'x'), (10, 10, 'x')]
+    assert throttle_calls(None) is None
+
+
+def test_throttle_calls_flushes_last_dropped_call():
+    clock = FakeClock()
+    calls = []
+    timers = []
+
+    class FakeTimer:
+        def __init__(self, delay, fn):
+            self.delay, self.fn, self.cancelled = delay, fn, False
+            timers.append(self)
+
+        def start(self):
+            pass
+
+        def cancel(self):
+            self.cancelled = True
+
+    wrapped = throttle_calls(lambda *a: calls.append(a), min_interval=0.2, clock=clock, timer_factory=FakeTimer)
+    wrapped(0, 10, 'a')
+    clock.now = 0.05
+    wrapped(1, 10, 'b')
+    clock.now = 0.1
+    wrapped(2, 10, 'c')  # 开始下载第3首，间隔内被暂存
+    assert calls == [(0, 10, 'a')]
+    assert len(timers) == 1 and abs(timers[0].delay - 0.15) < 1e-9
+    clock.now = 0.2
+    timers[0].fn()
+    assert calls == [(0, 10, 'a'), (2, 10, 'c')]
+    # 最终调用立即送达并取消尚未触发的补发
+    clock.now = 0.25
+    wrapped(3, 10, 'd')
+    wrapped(10, 10, 'e')
+    assert calls[-1] == (10, 10, 'e') and timers[-1].cancelled
+
+
+def test_event_format():
+    text = ProgressEvent('a', 512 * 1024, 1024 * 1024, rate=1024 * 1024, eta=0.5).format()
+    assert '50%' in text and 'MB/s' in text
+
+
+def test_stall_watchdog_uses_rolling_window():
+    from utils.progress import StallWatchdog
+    clock = FakeClock()
+    watchdog = StallWatchdog(min_rate=1000, window=10, clock=clock)
+    for t in range(1, 10):
+        clock.now = t
+        assert not watchdog.update(5000)  # 窗口未满不判定
+    # 之后每秒只到1字节：旧样本滑出窗口后判定为停滞
+    stalled = []
+    for t in range(10, 25):
+        clock.now = t
+        stalled.append(watchdog.update(1))
+    assert not stalled[0] and stalled[-1]
+    watchdog.reset()
+    assert not watchdog.update(1)
+    assert not StallWatchdog(min_rate=0, clock=clock).update(0)
@@ -0,0 +1,69 @@
+import json
+import os
+from utils.progress_journal import ProgressJournal, close_open_journals
+
+
+def test_migrates_legacy_json_on_first_open(tmp_path):
+    legacy = {'1': {'tracks': {'11': {'url': '', 'done': True, 'filename': 'a.m4a'}}, 'done': True}}
+    with open(os.path.join(tmp_path, 'download_progress.json'), 'w', encoding='utf-8') as f:
+        json.dump(legacy, f)
+
+    journal = ProgressJournal(str(tmp_path))
+    assert journal.load() == legacy
+    assert not os.path.exists(os.path.join(tmp_path, 'download_progress.json'))
+    assert os.path.exists(os.path.join(tmp_path, 'download_progress.json.migrated'))
+    assert ProgressJournal(str(tmp_path)).load() == legacy
+
+
+def test_updates_append_and_replay(tmp_path):
+    journal = ProgressJournal(str(tmp_path))
+    journal.load()
+    journal.record_track(1, 11, {'done': True, 'filename': 'a.m4a'})
+    journal.record_track(1, 12, {'done': True, 'filename': 'b.m4a'}, page_done=True)
+    journal.set_flag('blocked', True)
+    journal.close()
+
+    with open(journal.path, encoding='utf-8') as f:
+        assert len(f.readlines()) == 3
+    progress = ProgressJournal(str(tmp_path)).load()
+    assert progress['1']['done'] is True
+    assert set(progress['1']['tracks']) == {'11', '12'}
+    assert progress['blocked'] is True
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    journal = ProgressJournal(str(tmp_path))
+    journal.record_track(1, 11, {'done': True})
+    journal.close()
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"t": "track", "p": "1", "id": "1')
+
+    journal = ProgressJournal(str(tmp_path))
+    assert list(journal.load()['1']['tracks']) == ['11']
+    journal.record_track(1, 12, {'done': True})
+    journal.close()
+    assert set(ProgressJournal(str(tmp_path)).load()['1']['tracks']) == {'11', '12'}
+
+
+def test_compacts_into_single_snapshot(tmp_path):
+    journal = ProgressJournal(str(tmp_path), compact_min_ops=10)
+    for _ in range(3):
+        for track_id in range(4):
+            journal.record_track(1, track_id, {'done': False})
+    journal.close()
+
+    with open(journal.path, encoding='utf-8') as f:
+        lines = f.readlines()
+    assert len(lines) < 12
+    assert json.loads(lines[0])['t'] == 'snapshot'
+    assert len(ProgressJournal(str(tmp_path)).load()['1']['tracks']) == 4
+
+
+def test_close_open_journals_releases_append_handles(tmp_path):
+    journal = ProgressJournal(str(tmp_path))
+    journal.load()
+    journal.record_track(1, 11, {'done': True, 'filename': 'a.m4a'})
+    assert journal._fh is not None
+    close_open_journals()
+    assert journal._fh is None
+    assert ProgressJournal(str(tmp_path)).load()['1']['tracks']['11']['done'] is True
@@ -0,0 +1,22 @@
+from utils.quality_planner import NOMINAL_BITRATES, estimate_bytes, plan_quality
+from utils.sqlite_cache import TrackQuality
+
+
+def test_estimate_uses_recorded_sizes_then_measured_bitrate():
+    durations = {1: 100, 2: 200}
+    known = {1: [TrackQuality(1, 2, 'M4A_128', file_size=2_000_000, duration=100)]}
+    # 曲目1用实际大小，曲目2按曲目1的实测码率(20000字节/秒)估算
+    assert estimate_bytes(durations, 2, known) == 2_000_000 + 200 * 20000
+    assert estimate_bytes(durations, 0) == int(300 * NOMINAL_BITRATES[0])
+
+
+def test_plan_picks_highest_quality_within_budget():
+    durations = {i: 3600 for i in range(10)}  # 10小时
+    high = estimate_bytes(durations, 2)
+    mid = estimate_bytes(durations, 1)
+    assert plan_quality(durations).quality == 2
+    assert plan_quality(durations, disk_budget=mid).quality == 1
+    # 带宽+期限：按1MB/s，期限刚好容纳中等音质
+    plan = plan_quality(durations, bandwidth=1024 * 1024, deadline=mid / (1024 * 1024))
+    assert plan.quality == 1 and plan.fits and plan.estimated_bytes == mid < high
+    assert not plan_quality(durations, disk_budget=1).fits
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+from utils.sqlite_cache import SqliteCache, TrackQuality
+
+
+def quiet(*args, **kwargs):
+    pass
+
+
+def test_quality_is_part_of_the_cache_key(tmp_path):
+    cache = SqliteCache(str(tmp_path))
+    cache.cache_track(1, 2, crypted_url='low', decrypted_url='d0', quality=0, log_func=quiet)
+    cache.cache_track(1, 2, crypted_url='std', decrypted_url='d1', log_func=quiet)
+    assert cache.get_cached_track(1, 2, log_func=quiet, quality=0).crypted_url == 'low'
+    assert cache.get_cached_track(1, 2, log_func=quiet).crypted_url == 'std'
+    assert cache.get_cached_track(1, 2, log_func=quiet, quality=2) is None
+
+
+def test_legacy_track_cache_is_migrated_to_default_quality(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'track_cache.db'))
+    conn.execute('''CREATE TABLE track_cache (track_id INTEGER NOT NULL, album_id INTEGER NOT NULL,
+        title TEXT DEFAULT '', duration INTEGER DEFAULT 0, crypted_url TEXT DEFAULT '',
+        decrypted_url TEXT DEFAULT '', file_size INTEGER DEFAULT 0, cache_time REAL NOT NULL,
+        last_verified REAL NOT NULL, is_valid BOOLEAN DEFAULT 1, verify_count INTEGER DEFAULT 0,
+        extra_data TEXT DEFAULT '', PRIMARY KEY (track_id, album_id))''')
+    now = time.time()
+    conn.execute("INSERT INTO track_cache (track_id, album_id, crypted_url, cache_time, last_verified) "
+                 "VALUES (1, 2, 'old', ?, ?)", (now, now))
+    conn.commit()
+    conn.close()
+    cache = SqliteCache(str(tmp_path))
+    cached = cache.get_cached_track(1, 2, log_func=quiet)
+    assert cached.crypted_url == 'old' and cached.quality == 1
+
+
+def test_track_qualities_round_trip(tmp_path):
+    cache = SqliteCache(str(tmp_path))
+    cache.record_track_qualities([TrackQuality(1, 0, 'M4A_24', 300_000, 100),
+                                  TrackQuality(1, 1, 'M4A_64', 800_000, 100)])
+    qualities = cache.get_track_qualities([1, 2])
+    assert [q.quality for q in qualities[1]] == [0, 1]
+    assert qualities[1][1].bitrate == 8000
+    assert 2 not in qualities
+
+
+def _age_album_pages(cache, hours):
+    with cache._connect() as conn:
+        conn.execute('UPDATE album_page_cache SET cache_time = cache_time - ?', (hours * 3600,))
+
+
+def test_album_listing_is_trusted_while_update_date_is_unchanged(tmp_path):
+    cache = SqliteCache(str(tmp_path))
+    album = {'albumId': 7, 'albumTitle': '专辑', 'updateDate': '2024-01-01'}
+    assert cache.cache_album_meta(7, album, log_func=quiet) is False
+    cache.cache_album_page(7, 1, 20, [{'trackId': 1, 'title': 'a'}], 1, log_func=quiet)
+    _age_album_pages(cache, 12)
+    # 分页已超过6小时，但专辑 updateDate 未变，仍直接使用
+    assert cache.get_cached_album_page(7, 1, 20, log_func=quiet)['total_count'] == 1
+    assert cache.get_album_track_total(7) == 1
+    meta = cache.get_album_meta(7, log_func=quiet)
+    assert meta['fresh'] and meta['album']['albumTitle'] == '专辑'
+
+    # 重新验证发现专辑有更新：分页缓存作废
+    assert cache.cache_album_meta(7, dict(album, updateDate='2024-02-01'), log_func=quiet) is True
+    assert cache.get_cached_album_page(7, 1, 20, log_func=quiet) is None
+    assert cache.get_album_track_total(7) == 0
+
+
+def test_stale_album_meta_no_longer_vouches_for_listing(tmp_path):
+    cache = SqliteCache(str(tmp_path))
+    cache.cache_album_meta(7, {'updateDate': '2024-01-01'}, log_func=quiet)
+    cache.cache_album_page(7, 1, 20, [{'trackId': 1, 'title': 'a'}], 1, log_func=quiet)
+    _age_album_pages(cache, 12)
+    with cache._connect() as conn:
+        conn.execute('UPDATE album_meta SET checked_at = checked_at - ?', ((cache.album_meta_ttl_hours + 1) * 3600,))
+    assert cache.get_album_meta(7, log_func=quiet)['fresh'] is False
+    assert cache.get_cached_album_page(7, 1, 20, log_func=quiet) is None
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _loaded_heavy_modules(imports):
+    code = (
+        f'import sys, {imports}\n'
+        'heavy = ("PIL", "requests", "Crypto", "fetcher.track_fetcher", "downloader.downloader")\n'
+        'print(",".join(m for m in heavy if m in sys.modules))\n'
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def test_gui_import_defers_heavy_modules():
+    pytest.importorskip('tkinter')
+    assert _loaded_heavy_modules('main, gui.gui, gui.login_dialog') == ''
+
+
+def test_cache_import_defers_requests():
+    assert _loaded_heavy_modules('utils.sqlite_cache, utils.utils') == ''
@@ -0,0 +1,83 @@
+import threading
+
+from utils.task_executor import CancelToken, TaskExecutor
+
+
+def test_keyed_tasks_replace_or_reject_while_running():
+    executor = TaskExecutor(pools={'network': 2})
+    started = threading.Event()
+    seen = []
+
+    def long_task(token):
+        started.set()
+        token.wait(5)
+        seen.append(('first', token.is_set()))
+
+    first = executor.submit(long_task, key='cover', pass_token=True)
+    assert started.wait(5)
+    # 同 key 的任务仍在运行：默认忽略重复提交
+    assert executor.submit(lambda: seen.append('dup'), key='cover') is None
+    assert executor.running('cover')
+    # replace=True 取消旧任务再提交
+    second = executor.submit(lambda: seen.append('second'), key='cover', replace=True)
+    second.future.result(timeout=5)
+    first.future.result(timeout=5)
+    assert first.cancelled and ('first', True) in seen and 'second' in seen and 'dup' not in seen
+    assert executor.shutdown(timeout=5)
+
+
+def test_pool_is_bounded_and_errors_are_reported():
+    executor = TaskExecutor(pools={'disk': 2})
+    lock = threading.Lock()
+    state = {'active': 0, 'peak': 0}
+    release = threading.Event()
+
+    def work():
+        with lock:
+            state['active'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+        release.wait(5)
+        with lock:
+            state['active'] -= 1
+
+    handles = [executor.submit(work, pool='disk') for _ in range(6)]
+    errors = []
+    failing = executor.submit(lambda: 1 / 0, pool='disk', on_error=errors.append)
+    release.set()
+    for handle in handles + [failing]:
+        handle.future.result(timeout=5)
+    assert state['peak'] == 2
+    assert len(errors) == 1 and isinstance(errors[0], ZeroDivisionError)
+    assert executor.shutdown(timeout=5)
+
+
+def test_shutdown_cancels_tasks_then_runs_hooks():
+    executor = TaskExecutor(pools={'network': 1})
+    order = []
+    started = threading.Event()
+
+    def loop(token):
+        started.set()
+        while not token.wait(0.01):
+            pass
+        order.append('task stopped')
+
+    executor.submit(loop, pass_token=True)
+    queued = executor.submit(lambda: order.append('never'))
+    executor.add_shutdown_hook(lambda: order.append('flush'))
+    assert started.wait(5)
+    assert executor.shutdown(timeout=5) is True
+    assert order == ['task stopped', 'flush']
+    assert queued.future.cancelled()
+    # 关闭后不再接受任务
+    assert executor.submit(lambda: None) is None
+
+
+def test_cancel_token_callbacks_run_once():
+    token = CancelToken()
+    calls = []
+    token.on_cancel(lambda: calls.append(1))
+    token.cancel()
+    token.cancel()
+    token.on_cancel(lambda: calls.append(2))
+    assert calls == [1, 2] and token.cancelled and token.wait(0)
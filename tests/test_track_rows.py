@@ -0,0 +1,50 @@
+import time
+from types import SimpleNamespace
+
+from gui.track_rows import TrackListModel
+
+
+def make_model(count):
+    model = TrackListModel()
+    for idx in range(count):
+        model.put(idx, SimpleNamespace(trackId=100 + idx, title=f'第{idx + 1}集'), '1:00', '⏳ 待解析')
+    return model
+
+
+def test_rows_share_track_objects_and_map_track_ids():
+    model = make_model(3)
+    assert model.row_values(1) == ('2', '第2集', '1:00', '⏳ 待解析')
+    assert model.row_of_track('102') == 2 and model.track(0).trackId == 100
+    assert model.track(3) is None and len(model) == 3
+
+    model.clear()
+    assert len(model) == 0 and model.row_of_track(100) is None
+
+
+def test_click_shift_and_ctrl_selection():
+    model = make_model(10)
+    model.click(2)
+    model.click(5, shift=True)
+    assert model.selected_rows() == [2, 3, 4, 5]
+    model.click(8, ctrl=True)
+    model.click(3, ctrl=True)
+    assert model.selected_rows() == [2, 4, 5, 8]
+    # Ctrl+Shift 在已有选择上追加范围，起点为最后一次 Ctrl 点击的行
+    model.click(1, shift=True, ctrl=True)
+    assert model.selected_rows() == [1, 2, 3, 4, 5, 8]
+    model.click(7)
+    assert model.selected_rows() == [7] and model.cursor == 7
+
+
+def test_large_album_select_all_and_status_updates_are_fast():
+    count = 20000
+    start = time.perf_counter()
+    model = make_model(count)
+    model.select_all()
+    statuses = {idx: '📁 已下载' if idx % 100 == 0 else '⏳ 待解析' for idx in range(count)}
+    changed = model.status_changes(statuses)
+    elapsed = time.perf_counter() - start
+    assert len(model.selected_rows()) == count
+    assert changed == list(range(0, count, 100))
+    assert model.status_changes(statuses) == []
+    assert elapsed < 1.0
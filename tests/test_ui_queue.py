@@ -0,0 +1,53 @@
+from utils.ui_queue import UiUpdateQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_keyed_updates_keep_only_latest_and_rows_merge():
+    calls = []
+    rows = []
+    queue = UiUpdateQueue(apply_row=lambda row, values: rows.append((row, values)))
+    assert queue.put(lambda: calls.append('a')) is True
+    for i in range(100):
+        assert queue.put(lambda i=i: calls.append(('progress', i)), key='progress') is False
+    queue.set_row('I001', url_status='🔄 解析中')
+    queue.set_row('I002', url_status='⏳ 待解析')
+    queue.set_row('I001', url_status='✅ 已解析', duration='01:00')
+    assert len(queue) == 4
+
+    assert queue.drain(budget=1.0) is False
+    assert calls == ['a', ('progress', 99)]
+    assert rows == [('I001', {'url_status': '✅ 已解析', 'duration': '01:00'}),
+                    ('I002', {'url_status': '⏳ 待解析'})]
+    # 队列空闲后再次放入需要重新安排
+    assert queue.put(lambda: None) is True
+
+
+def test_drain_stops_at_time_budget_and_reports_errors():
+    clock = FakeClock()
+    calls = []
+    errors = []
+    queue = UiUpdateQueue(clock=clock)
+
+    def step(i):
+        calls.append(i)
+        clock.now += 0.004
+        if i == 1:
+            raise RuntimeError('boom')
+
+    for i in range(10):
+        queue.put(lambda i=i: step(i))
+    assert queue.drain(budget=0.01, on_error=errors.append) is True
+    assert calls == [0, 1, 2]
+    assert [str(e) for e in errors] == ['boom']
+    # 预算为0时每次至少执行一项
+    assert queue.drain(budget=0) is True and calls[-1] == 3
+    while queue.drain(budget=0.01):
+        pass
+    assert calls == list(range(10)) and len(queue) == 0
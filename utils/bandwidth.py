@@ -0,0 +1,231 @@
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+_SIZE_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)[bB]?\s*$')
+_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_rate(text) -> float:
+    """解析速率：'512K'、'2M'、'1048576'，单位字节/秒；0 或空表示不限速"""
+    if text is None or text == '':
+        return 0.0
+    if isinstance(text, (int, float)):
+        return max(0.0, float(text))
+    match = _SIZE_RE.match(str(text))
+    if not match:
+        raise ValueError(f'无法解析的速率: {text}')
+    return float(match.group(1)) * _UNITS[match.group(2).lower()]
+
+
+class BandwidthSchedule:
+    """按时段设置限速，例如 '08:00-23:00=512K,23:00-08:00=0'
+
+    时段可跨午夜；未被任何时段覆盖的时间使用 default。
+    """
+
+    def __init__(self, rules: List[Tuple[int, int, float]], default: float = 0.0):
+        self.rules = rules  # [(开始分钟, 结束分钟, 字节/秒)]
+        self.default = default
+
+    @classmethod
+    def parse(cls, text: str, default: float = 0.0) -> 'BandwidthSchedule':
+        rules = []
+        for part in filter(None, (p.strip() for p in text.split(','))):
+            try:
+                span, rate = part.split('=', 1)
+                start, end = span.split('-', 1)
+                rules.append((cls._minutes(start), cls._minutes(end), parse_rate(rate)))
+            except ValueError:
+                raise ValueError(f'无法解析的限速时段: {part}')
+        return cls(rules, default)
+
+    @staticmethod
+    def _minutes(hhmm: str) -> int:
+        hours, minutes = hhmm.strip().split(':')
+        value = int(hours) * 60 + int(minutes)
+        if not 0 <= value <= 24 * 60:
+            raise ValueError(hhmm)
+        return value
+
+    def rate_at(self, when: Optional[datetime.datetime] = None) -> float:
+        when = when or datetime.datetime.now()
+        minute = when.hour * 60 + when.minute
+        for start, end, rate in self.rules:
+            if start <= end:
+                if start <= minute < end:
+                    return rate
+            elif minute >= start or minute < end:
+                return rate
+        return self.default
+
+
+class TokenBucket:
+    """令牌桶字节限速器（线程安全）
+
+    consume(n) 在令牌不足时阻塞到可用为止；rate 为0表示不限速。
+    设置了 schedule 时每隔 schedule_check 秒按当前时段刷新速率。
+    """
+
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None,
+                 schedule: Optional[BandwidthSchedule] = None, schedule_check: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._sleep = sleep
+        self.schedule = schedule
+        self.schedule_check = schedule_check
+        self._next_schedule_check = 0.0
+        self._burst_override = burst
+        self.rate = 0.0
+        self.burst = 0.0
+        self._tokens = 0.0
+        self._last = clock()
+        self.set_rate(schedule.rate_at() if schedule else rate)
+        if schedule:
+            self._next_schedule_check = self._last + schedule_check
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self.rate = max(0.0, float(rate or 0))
+            # 默认允许1秒的突发量
+            self.burst = self._burst_override or self.rate
+            self._tokens = min(self._tokens, self.burst)
+
+    def suggested_chunk(self, default: int) -> int:
+        """限速较低时缩小单次读取量，避免一次读入大块后长时间停顿"""
+        if self.rate <= 0:
+            return default
+        return max(16 * 1024, min(default, int(self.rate / 4)))
+
+    def _refresh_schedule(self, now: float):
+        """按时段刷新速率（调用方持有 self._lock）"""
+        if self.schedule and now >= self._next_schedule_check:
+            self._next_schedule_check = now + self.schedule_check
+            rate = self.schedule.rate_at()
+            if rate != self.rate:
+                self.rate = rate
+                self.burst = self._burst_override or rate
+
+    def consume(self, n: int) -> float:
+        """消耗 n 字节的令牌，返回实际等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._refresh_schedule(now)
+                if self.rate <= 0:
+                    return waited
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                # 留1字节余量，避免浮点误差导致反复极短的等待
+                if self._tokens >= n - 1 or self._tokens >= self.burst - 1:
+                    # 大于桶容量的请求在桶满后放行，并把令牌扣成负数（欠账由后续请求偿还）
+                    self._tokens -= n
+                    return waited
+                delay = (min(n, self.burst) - self._tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+
+
+class SharedTokenBucket(TokenBucket):
+    """跨进程共享的令牌桶
+
+    多个worker进程通过同一个SQLite文件共享字节配额（与 SqliteRateLimiter 相同的做法）：
+    表中记录“理论到达时间”，每次 consume(n) 在写事务中把它推后 n/rate 秒，
+    超出突发量的部分在事务外等待。速率和时段由各进程按相同的配置各自计算。
+    """
+
+    def __init__(self, db_path: str, name: str = 'download', rate: float = 0.0, burst: Optional[float] = None,
+                 schedule: Optional[BandwidthSchedule] = None, schedule_check: float = 30.0,
+                 busy_timeout_ms: int = 30000, clock: Callable[[], float] = time.time,
+                 sleep: Callable[[float], None] = time.sleep):
+        # 各进程需要同一个时间基准，因此使用墙上时钟而不是 monotonic
+        super().__init__(rate, burst, schedule, schedule_check, clock=clock, sleep=sleep)
+        self.db_path = db_path
+        self.name = name
+        self.busy_timeout_ms = busy_timeout_ms
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS bandwidth (
+                    name TEXT PRIMARY KEY,
+                    tat REAL NOT NULL
+                )
+            ''')
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        return conn
+
+    def _reserve(self, n: int, rate: float, burst: float) -> float:
+        """在共享时间轴上预约 n 字节，返回需要等待的秒数"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tat FROM bandwidth WHERE name = ?', (self.name,)).fetchone()
+            now = self._clock()
+            tat = max(now, row[0] if row else 0.0) + n / rate
+            conn.execute('INSERT OR REPLACE INTO bandwidth (name, tat) VALUES (?, ?)', (self.name, tat))
+            conn.execute('COMMIT')
+            # 允许 burst 字节（默认1秒）的突发量
+            return tat - now - burst / rate
+        except Exception:
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def consume(self, n: int) -> float:
+        with self._lock:
+            self._refresh_schedule(self._clock())
+            rate, burst = self.rate, self.burst
+        if rate <= 0 or n <= 0:
+            return 0.0
+        try:
+            wait = self._reserve(n, rate, burst)
+        except sqlite3.Error:
+            # 共享数据库不可用时退回进程内限速，不中断下载
+            return super().consume(n)
+        if wait <= 0:
+            return 0.0
+        self._sleep(wait)
+        return wait
+
+
+_global_bucket: Optional[TokenBucket] = None
+_global_lock = threading.Lock()
+
+
+def set_global_bandwidth(rate=0, schedule: Optional[str] = None, db_path: Optional[str] = None):
+    """设置所有下载共享的限速；rate 与 schedule 都为空时取消限速
+
+    提供 db_path 时限速由使用同一数据库文件的所有进程共享（worker 多进程模式），
+    否则只在本进程内共享。
+    """
+    global _global_bucket
+    with _global_lock:
+        default = parse_rate(rate)
+        parsed = BandwidthSchedule.parse(schedule, default=default) if schedule else None
+        if parsed is None and default <= 0:
+            _global_bucket = None
+        elif db_path:
+            _global_bucket = SharedTokenBucket(db_path, rate=default, schedule=parsed)
+        else:
+            _global_bucket = TokenBucket(default, schedule=parsed)
+
+
+def get_global_bandwidth() -> Optional[TokenBucket]:
+    return _global_bucket
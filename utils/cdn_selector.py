@@ -0,0 +1,100 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+
+@dataclass
+class HostStats:
+    """单个CDN节点的性能记录（指数滑动平均）"""
+    host: str
+    ttfb: Optional[float] = None        # 首字节时间（秒）
+    throughput: Optional[float] = None  # 下载速度（字节/秒）
+    successes: int = 0
+    failures: int = 0
+    last_failure: float = 0.0
+
+
+class CdnSelector:
+    """按实测性能在同一音频的多个播放地址（不同CDN节点）之间选择
+
+    每次下载结束后记录首字节时间和吞吐量；rank() 按“首字节时间 + 典型文件传输时间”
+    估算耗时排序，最近返回过 403/5xx 的节点排到最后。没有记录的节点按已知节点的中位水平估计，
+    保证新节点也有机会被测量。
+    """
+
+    def __init__(self, alpha: float = 0.3, typical_size: int = 8 * 1024 * 1024,
+                 failure_penalty: float = 600.0, clock: Callable[[], float] = time.time):
+        self.alpha = alpha
+        self.typical_size = typical_size        # 估算传输时间使用的文件大小
+        self.failure_penalty = failure_penalty  # 失败后降级的秒数
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, HostStats] = {}
+
+    @staticmethod
+    def host_of(url: str) -> str:
+        return urlsplit(url).netloc.lower()
+
+    def _stats(self, url: str) -> HostStats:
+        host = self.host_of(url)
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = self._hosts[host] = HostStats(host)
+        return stats
+
+    def _smooth(self, old: Optional[float], new: float) -> float:
+        return new if old is None else old + self.alpha * (new - old)
+
+    def record_success(self, url: str, ttfb: float, nbytes: int = 0, seconds: float = 0.0):
+        with self._lock:
+            stats = self._stats(url)
+            stats.successes += 1
+            stats.ttfb = self._smooth(stats.ttfb, max(ttfb, 0.0))
+            # 太小的传输主要反映握手开销，不计入吞吐量
+            if nbytes >= 256 * 1024 and seconds > 0:
+                stats.throughput = self._smooth(stats.throughput, nbytes / seconds)
+
+    def record_failure(self, url: str):
+        with self._lock:
+            stats = self._stats(url)
+            stats.failures += 1
+            stats.last_failure = self._clock()
+
+    def _estimate(self, stats: Optional[HostStats], default_ttfb: float, default_throughput: float) -> float:
+        ttfb = stats.ttfb if stats and stats.ttfb is not None else default_ttfb
+        throughput = stats.throughput if stats and stats.throughput else default_throughput
+        cost = ttfb + self.typical_size / throughput
+        if stats and stats.last_failure and self._clock() - stats.last_failure < self.failure_penalty:
+            cost += self.failure_penalty
+        return cost
+
+    def rank(self, urls: Iterable[str]) -> List[str]:
+        """按预计下载耗时从快到慢排序（稳定排序，性能相同时保持原顺序）"""
+        urls = list(dict.fromkeys(u for u in urls if u))
+        with self._lock:
+            known = list(self._hosts.values())
+            ttfbs = sorted(s.ttfb for s in known if s.ttfb is not None)
+            rates = sorted(s.throughput for s in known if s.throughput)
+            default_ttfb = ttfbs[len(ttfbs) // 2] if ttfbs else 0.5
+            default_throughput = rates[len(rates) // 2] if rates else 1024 * 1024
+            costs = {u: self._estimate(self._hosts.get(self.host_of(u)), default_ttfb, default_throughput)
+                     for u in urls}
+        return sorted(urls, key=lambda u: costs[u])
+
+    def snapshot(self) -> Dict[str, HostStats]:
+        with self._lock:
+            return {host: HostStats(**vars(stats)) for host, stats in self._hosts.items()}
+
+
+_selector: Optional[CdnSelector] = None
+_selector_lock = threading.Lock()
+
+
+def get_cdn_selector() -> CdnSelector:
+    global _selector
+    with _selector_lock:
+        if _selector is None:
+            _selector = CdnSelector()
+        return _selector
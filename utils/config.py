@@ -0,0 +1,34 @@
+import os
+import threading
+
+_dotenv_loaded = False
+_warnings_disabled = False
+_lock = threading.Lock()
+
+
+def load_env_once():
+    """首次需要配置时才加载 .env，避免导入模块时就读取文件"""
+    global _dotenv_loaded
+    if _dotenv_loaded:
+        return
+    with _lock:
+        if not _dotenv_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _dotenv_loaded = True
+
+
+def get_cookies() -> str:
+    """获取喜马拉雅Cookie；每次调用都读取环境变量，登录后无需重启即可生效"""
+    load_env_once()
+    return os.getenv("XIMALAYA_COOKIES", "")
+
+
+def disable_insecure_warnings():
+    """下载使用 verify=False，首次发请求前关闭 InsecureRequestWarning"""
+    global _warnings_disabled
+    if _warnings_disabled:
+        return
+    import urllib3
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    _warnings_disabled = True
@@ -0,0 +1,264 @@
+import glob
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+from utils.log import get_log
+
+# GUI 专辑信息区显示的封面尺寸
+THUMBNAIL_SIZE = (150, 150)
+
+
+class ImageCache:
+    """封面图片缓存：按内容哈希保存原图和预先缩放好的缩略图
+
+    - images/<sha256>.img 为原图，images/<sha256>_150x150.png 为白底居中的缩略图；
+      不同URL指向相同内容时共用同一份文件
+    - image_url 表记录 URL -> 内容哈希及 ETag/Last-Modified，超过 revalidate_hours
+      后用条件请求重新验证，304 时沿用本地文件；网络失败时也使用已有文件
+    - 文件总大小超过 max_bytes 时按最近使用时间淘汰
+    """
+
+    def __init__(self, cache_dir: str = None, db_name: str = 'image_cache.db',
+                 max_bytes: int = 100 * 1024 * 1024, revalidate_hours: float = 24 * 7, session=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get('XIMALAYA_CACHE_DIR') or os.path.join(os.getcwd(), 'cache')
+        self.cache_dir = cache_dir
+        self.image_dir = os.path.join(cache_dir, 'images')
+        self.db_path = os.path.join(cache_dir, db_name)
+        self.max_bytes = max_bytes
+        self.revalidate_hours = revalidate_hours
+        self.busy_timeout_ms = 30000
+        # 可注入带 get(url, headers=, timeout=) 的会话对象，默认使用 requests
+        self._session = session
+        self._lock = threading.Lock()
+        os.makedirs(self.image_dir, exist_ok=True)
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        return conn
+
+    def _init_database(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS image_url (
+                    url TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    etag TEXT DEFAULT '',
+                    last_modified TEXT DEFAULT '',
+                    checked_at REAL NOT NULL
+                )
+            ''')
+            # size 为原图与各尺寸缩略图的字节数之和
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS image_blob (
+                    digest TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_image_url_digest ON image_url(digest)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_image_blob_last_used ON image_blob(last_used)')
+            conn.commit()
+
+    def original_path(self, digest: str) -> str:
+        return os.path.join(self.image_dir, f'{digest}.img')
+
+    def thumbnail_path(self, digest: str, size: Tuple[int, int] = THUMBNAIL_SIZE) -> str:
+        return os.path.join(self.image_dir, f'{digest}_{size[0]}x{size[1]}.png')
+
+    def _http_get(self, url: str, headers: dict):
+        if self._session is not None:
+            return self._session.get(url, headers=headers, timeout=10)
+        import requests
+        return requests.get(url, headers=headers, timeout=10)
+
+    def _lookup(self, url: str):
+        with self._lock:
+            with self._connect() as conn:
+                return conn.execute('SELECT digest, etag, last_modified, checked_at FROM image_url WHERE url = ?',
+                                    (url,)).fetchone()
+
+    def _touch(self, digest: str, checked_url: Optional[str] = None):
+        now = time.time()
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute('UPDATE image_blob SET last_used = ? WHERE digest = ?', (now, digest))
+                if checked_url is not None:
+                    conn.execute('UPDATE image_url SET checked_at = ? WHERE url = ?', (now, checked_url))
+                conn.commit()
+
+    def _write_file(self, path: str, data: bytes):
+        fd, tmp = tempfile.mkstemp(dir=self.image_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def _store(self, url: str, content: bytes, etag: str, last_modified: str) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.original_path(digest)
+        if not os.path.exists(path):
+            self._write_file(path, content)
+        now = time.time()
+        with self._lock:
+            with self._connect() as conn:
+                known = conn.execute('SELECT 1 FROM image_blob WHERE digest = ?', (digest,)).fetchone()
+                if known:
+                    conn.execute('UPDATE image_blob SET last_used = ? WHERE digest = ?', (now, digest))
+                else:
+                    conn.execute('INSERT INTO image_blob (digest, size, last_used) VALUES (?, ?, ?)',
+                                 (digest, len(content), now))
+                conn.execute('''
+                    INSERT OR REPLACE INTO image_url (url, digest, etag, last_modified, checked_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (url, digest, etag or '', last_modified or '', now))
+                conn.commit()
+        self._evict(keep=digest)
+        return digest
+
+    def fetch(self, url: str, log_func=None) -> Optional[str]:
+        """返回 url 对应原图的内容哈希；需要时下载或重新验证，失败且没有本地副本时返回 None"""
+        if not url:
+            return None
+        log = get_log('cache', log_func)
+        row = self._lookup(url)
+        headers = {}
+        if row is not None and os.path.exists(self.original_path(row[0])):
+            digest, etag, last_modified, checked_at = row
+            if time.time() - checked_at < self.revalidate_hours * 3600:
+                log.trace('[图片缓存] 命中: %s', url)
+                self._touch(digest)
+                return digest
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        else:
+            row = None
+
+        try:
+            resp = self._http_get(url, headers)
+        except Exception as e:
+            if row is not None:
+                log.debug('[图片缓存] 重新验证失败，使用本地副本: %s', e)
+                self._touch(row[0])
+                return row[0]
+            log.warning('[图片缓存] 下载失败: %s', e)
+            return None
+
+        if resp.status_code == 304 and row is not None:
+            log.debug('[图片缓存] 未修改: %s', url)
+            self._touch(row[0], checked_url=url)
+            return row[0]
+        if resp.status_code != 200:
+            log.warning('[图片缓存] 下载失败，状态码: %s', resp.status_code)
+            return row[0] if row is not None else None
+        digest = self._store(url, resp.content, resp.headers.get('ETag', ''), resp.headers.get('Last-Modified', ''))
+        log.debug('[图片缓存] 已保存: %s (%s 字节)', url, len(resp.content))
+        return digest
+
+    def get(self, url: str, log_func=None) -> Optional[str]:
+        """原图的本地路径"""
+        digest = self.fetch(url, log_func=log_func)
+        return self.original_path(digest) if digest else None
+
+    def get_thumbnail(self, url: str, size: Tuple[int, int] = THUMBNAIL_SIZE, log_func=None) -> Optional[str]:
+        """保持比例缩放并在白底上居中的PNG缩略图路径，只在第一次使用时生成"""
+        digest = self.fetch(url, log_func=log_func)
+        if not digest:
+            return None
+        path = self.thumbnail_path(digest, size)
+        if os.path.exists(path):
+            return path
+        from io import BytesIO
+        from PIL import Image
+        try:
+            img = Image.open(self.original_path(digest)).convert('RGBA')
+            img.thumbnail(size, Image.LANCZOS)
+            bg = Image.new('RGBA', size, (255, 255, 255, 255))
+            offset = ((size[0] - img.width) // 2, (size[1] - img.height) // 2)
+            bg.paste(img, offset, img)
+            buf = BytesIO()
+            bg.save(buf, format='PNG')
+        except Exception as e:
+            get_log('cache', log_func).warning('[图片缓存] 生成缩略图失败: %s', e)
+            return None
+        self._write_file(path, buf.getvalue())
+        with self._lock:
+            with self._connect() as conn:
+                conn.execute('UPDATE image_blob SET size = size + ? WHERE digest = ?', (len(buf.getvalue()), digest))
+                conn.commit()
+        return path
+
+    def export(self, url: str, dest_path: str, log_func=None) -> bool:
+        """把原图复制到 dest_path（如专辑目录下的 cover.jpg），返回是否成功"""
+        path = self.get(url, log_func=log_func)
+        if path is None:
+            return False
+        try:
+            shutil.copyfile(path, dest_path)
+        except OSError as e:
+            get_log('cache', log_func).warning('[图片缓存] 写入 %s 失败: %s', dest_path, e)
+            return False
+        return True
+
+    def total_size(self) -> int:
+        with self._lock:
+            with self._connect() as conn:
+                return conn.execute('SELECT COALESCE(SUM(size), 0) FROM image_blob').fetchone()[0]
+
+    def _evict(self, keep: Optional[str] = None):
+        """总大小超出预算时从最久未使用的图片开始删除，keep 为刚保存的图片"""
+        with self._lock:
+            with self._connect() as conn:
+                total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM image_blob').fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                rows = conn.execute('SELECT digest, size FROM image_blob ORDER BY last_used').fetchall()
+                removed = []
+                for digest, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    if digest == keep:
+                        continue
+                    removed.append(digest)
+                    total -= size
+                for digest in removed:
+                    conn.execute('DELETE FROM image_blob WHERE digest = ?', (digest,))
+                    conn.execute('DELETE FROM image_url WHERE digest = ?', (digest,))
+                conn.commit()
+        for digest in removed:
+            for path in [self.original_path(digest)] + glob.glob(os.path.join(self.image_dir, f'{digest}_*.png')):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if removed:
+            get_log('cache').debug('[图片缓存] 淘汰了 %s 张图片', len(removed))
+
+
+_global_image_cache = None
+_global_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """获取全局图片缓存实例"""
+    global _global_image_cache
+    if _global_image_cache is None:
+        with _global_image_cache_lock:
+            if _global_image_cache is None:
+                _global_image_cache = ImageCache()
+    return _global_image_cache
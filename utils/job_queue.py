@@ -0,0 +1,256 @@
+import os
+import sqlite3
+import time
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+
+def read_ids_file(path: str) -> List[Tuple[str, int]]:
+    """读取ID文件，返回 [(job_type, id), ...]
+
+    每行一个ID，可用 album:/track: 前缀区分类型（默认为专辑），#开头为注释。
+    """
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            job_type = 'album'
+            if ':' in line:
+                job_type, line = line.split(':', 1)
+            job_type = job_type.strip()
+            if job_type not in ('album', 'track'):
+                raise ValueError(f'未知ID类型: {job_type}')
+            entries.append((job_type, int(line.strip())))
+    return entries
+
+
+@dataclass
+class Job:
+    """队列中的一个下载任务"""
+    job_id: int
+    job_type: str          # 'album' 或 'track'
+    target_id: int         # 专辑ID 或 音频ID
+    album_id: int = 0      # 单曲任务可选的专辑ID
+    payload: str = ""      # JSON格式的附加参数
+    status: str = "pending"
+    attempts: int = 0
+    worker_id: str = ""
+    lease_until: float = 0.0
+    last_error: str = ""
+
+    def payload_dict(self) -> Dict:
+        try:
+            return json.loads(self.payload) if self.payload else {}
+        except ValueError:
+            return {}
+
+
+class JobQueue:
+    """基于SQLite的跨进程任务队列
+
+    worker通过租约(lease)认领任务：认领后在 lease_until 之前该任务归该worker所有，
+    worker需定期 heartbeat() 续约；进程崩溃后租约过期，任务会被其他worker重新认领。
+    """
+
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+
+    def __init__(self, db_path: str, max_attempts: int = 5, busy_timeout_ms: int = 30000):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.busy_timeout_ms = busy_timeout_ms
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_type TEXT NOT NULL,
+                    target_id INTEGER NOT NULL,
+                    album_id INTEGER DEFAULT 0,
+                    payload TEXT DEFAULT '',
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER DEFAULT 0,
+                    worker_id TEXT DEFAULT '',
+                    lease_until REAL DEFAULT 0,
+                    not_before REAL DEFAULT 0,
+                    last_error TEXT DEFAULT '',
+                    created_time REAL NOT NULL,
+                    updated_time REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, not_before)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_target ON jobs(job_type, target_id)')
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _rollback(conn):
+        try:
+            conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            pass
+
+    @staticmethod
+    def _row_to_job(row) -> Job:
+        return Job(
+            job_id=row['job_id'],
+            job_type=row['job_type'],
+            target_id=row['target_id'],
+            album_id=row['album_id'],
+            payload=row['payload'],
+            status=row['status'],
+            attempts=row['attempts'],
+            worker_id=row['worker_id'],
+            lease_until=row['lease_until'],
+            last_error=row['last_error'],
+        )
+
+    def enqueue(self, job_type: str, target_id: int, album_id: int = 0, payload: Dict = None) -> Optional[int]:
+        """加入任务；同一目标已有未完成任务时不重复加入，返回job_id或None"""
+        if job_type not in ('album', 'track'):
+            raise ValueError(f'未知任务类型: {job_type}')
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('''
+                SELECT job_id FROM jobs
+                WHERE job_type = ? AND target_id = ? AND status IN (?, ?)
+            ''', (job_type, int(target_id), self.STATUS_PENDING, self.STATUS_RUNNING)).fetchone()
+            if row:
+                conn.execute('COMMIT')
+                return None
+            cursor = conn.execute('''
+                INSERT INTO jobs (job_type, target_id, album_id, payload, status, created_time, updated_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (job_type, int(target_id), int(album_id or 0),
+                  json.dumps(payload or {}, ensure_ascii=False), self.STATUS_PENDING, now, now))
+            conn.execute('COMMIT')
+            return cursor.lastrowid
+        except Exception:
+            self._rollback(conn)
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, worker_id: str, lease_seconds: float = 600) -> Optional[Job]:
+        """认领一个可执行任务：待处理的任务，或租约已过期的运行中任务"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            # 租约过期且已用完尝试次数的任务（例如每次都让worker崩溃的任务）直接标记失败，不再无限重领
+            conn.execute('''
+                UPDATE jobs SET status = ?, lease_until = 0, updated_time = ?,
+                                last_error = CASE WHEN last_error = '' THEN ? ELSE last_error END
+                WHERE status = ? AND lease_until < ? AND attempts >= ?
+            ''', (self.STATUS_FAILED, now, '租约过期（worker可能已崩溃），已达到最大尝试次数',
+                  self.STATUS_RUNNING, now, self.max_attempts))
+            row = conn.execute('''
+                SELECT * FROM jobs
+                WHERE (status = ? AND not_before <= ?)
+                   OR (status = ? AND lease_until < ?)
+                ORDER BY job_id
+                LIMIT 1
+            ''', (self.STATUS_PENDING, now, self.STATUS_RUNNING, now)).fetchone()
+            if not row:
+                conn.execute('COMMIT')
+                return None
+            lease_until = now + lease_seconds
+            conn.execute('''
+                UPDATE jobs SET status = ?, worker_id = ?, lease_until = ?,
+                                attempts = attempts + 1, updated_time = ?
+                WHERE job_id = ?
+            ''', (self.STATUS_RUNNING, worker_id, lease_until, now, row['job_id']))
+            conn.execute('COMMIT')
+            job = self._row_to_job(row)
+            job.status = self.STATUS_RUNNING
+            job.worker_id = worker_id
+            job.lease_until = lease_until
+            job.attempts += 1
+            return job
+        except Exception:
+            self._rollback(conn)
+            raise
+        finally:
+            conn.close()
+
+    def _update_owned(self, job_id: int, worker_id: str, sql: str, params: tuple) -> bool:
+        """只有仍持有租约的worker才能更新任务，防止过期worker覆盖他人结果"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql + ' WHERE job_id = ? AND worker_id = ? AND status = ?',
+                                  params + (job_id, worker_id, self.STATUS_RUNNING))
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float = 600) -> bool:
+        """续约；返回False表示租约已丢失"""
+        now = time.time()
+        return self._update_owned(job_id, worker_id,
+                                  'UPDATE jobs SET lease_until = ?, updated_time = ?',
+                                  (now + lease_seconds, now))
+
+    def complete(self, job_id: int, worker_id: str) -> bool:
+        now = time.time()
+        return self._update_owned(job_id, worker_id,
+                                  "UPDATE jobs SET status = ?, lease_until = 0, last_error = '', updated_time = ?",
+                                  (self.STATUS_DONE, now))
+
+    def fail(self, job_id: int, worker_id: str, error: str = '', retry_delay: float = 60) -> bool:
+        """任务失败：未超过最大次数时延迟后重新排队，否则标记为失败"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute('SELECT attempts FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+            if not row:
+                return False
+            if row['attempts'] >= self.max_attempts:
+                status, not_before = self.STATUS_FAILED, 0
+            else:
+                status, not_before = self.STATUS_PENDING, now + retry_delay
+        finally:
+            conn.close()
+        return self._update_owned(job_id, worker_id,
+                                  'UPDATE jobs SET status = ?, not_before = ?, lease_until = 0, last_error = ?, updated_time = ?',
+                                  (status, not_before, str(error)[:2000], now))
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+            result = {self.STATUS_PENDING: 0, self.STATUS_RUNNING: 0, self.STATUS_DONE: 0, self.STATUS_FAILED: 0}
+            for row in rows:
+                result[row['status']] = row['n']
+            return result
+        finally:
+            conn.close()
+
+    def list_jobs(self, status: str = None, limit: int = 100) -> List[Job]:
+        conn = self._connect()
+        try:
+            if status:
+                rows = conn.execute('SELECT * FROM jobs WHERE status = ? ORDER BY job_id LIMIT ?',
+                                    (status, limit)).fetchall()
+            else:
+                rows = conn.execute('SELECT * FROM jobs ORDER BY job_id LIMIT ?', (limit,)).fetchall()
+            return [self._row_to_job(row) for row in rows]
+        finally:
+            conn.close()
@@ -0,0 +1,275 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 小于该大小的文件视为下载未完成（与原先的判断标准一致）
+MIN_COMPLETE_SIZE = 1024 * 10
+# 头部哈希覆盖的字节数：下载时读到这么多数据即可判断是否与已有文件内容相同
+HEAD_HASH_BYTES = 64 * 1024
+# Linux FICLONE ioctl，在 btrfs/xfs 等文件系统上创建共享数据块的副本
+_FICLONE = 0x40049409
+
+
+@dataclass
+class LibraryEntry:
+    """一首已下载曲目在本地的记录"""
+    album_id: int
+    track_id: int
+    path: str
+    size: int
+    content_hash: str
+    mtime: float
+    head_hash: str = ''
+    expected_size: int = 0  # 下载时服务器给出的 Content-Length；0 表示未经下载校验（扫描/补登记的文件）
+
+    @property
+    def verified(self) -> bool:
+        """大小与下载时的 Content-Length 一致且有完整MD5，才可作为链接复用的来源"""
+        return bool(self.content_hash) and self.expected_size > 0 and self.size == self.expected_size
+
+
+def file_md5(path: str, chunk_size: int = 1024 * 1024) -> str:
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def head_hash(data: bytes) -> str:
+    """文件前 HEAD_HASH_BYTES 字节的MD5"""
+    return hashlib.md5(data[:HEAD_HASH_BYTES]).hexdigest()
+
+
+def file_head_hash(path: str) -> str:
+    with open(path, 'rb') as f:
+        return head_hash(f.read(HEAD_HASH_BYTES))
+
+
+def link_file(src: str, dst: str) -> Optional[str]:
+    """用硬链接或reflink让 dst 复用 src 的数据，返回使用的方式；都不支持时返回 None"""
+    tmp = f'{dst}.link-{os.getpid()}-{threading.get_ident()}'
+    try:
+        os.link(src, tmp)
+        method = 'hardlink'
+    except OSError:
+        method = None
+        try:
+            import fcntl
+            with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            method = 'reflink'
+        except (ImportError, OSError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return None
+    os.replace(tmp, dst)
+    return method
+
+
+class LibraryIndex:
+    """已下载文件索引：(album_id, track_id) -> 路径、大小、内容哈希、修改时间
+
+    “是否已下载”不再依赖按序号和标题拼出的文件名，服务器改标题或序号变化后
+    仍能找到原文件。状态检查是一次按专辑的索引查询加一次目录列举，
+    不再对每首曲目单独探测文件系统。
+    """
+
+    def __init__(self, cache_dir: str = None, db_name: str = 'library.db'):
+        if cache_dir is None:
+            cache_dir = os.environ.get('XIMALAYA_CACHE_DIR') or os.path.join(os.getcwd(), 'cache')
+        self.cache_dir = cache_dir
+        self.db_path = os.path.join(cache_dir, db_name)
+        self.busy_timeout_ms = 30000
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        return conn
+
+    def _init_database(self):
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS library (
+                    album_id INTEGER NOT NULL,
+                    track_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_hash TEXT DEFAULT '',
+                    mtime REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    head_hash TEXT DEFAULT '',
+                    expected_size INTEGER DEFAULT 0,
+                    PRIMARY KEY (album_id, track_id)
+                )
+            ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(library)')}
+            if 'head_hash' not in columns:
+                conn.execute("ALTER TABLE library ADD COLUMN head_hash TEXT DEFAULT ''")
+            if 'expected_size' not in columns:
+                conn.execute('ALTER TABLE library ADD COLUMN expected_size INTEGER DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_library_track_id ON library(track_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_library_content ON library(size, head_hash)')
+            conn.commit()
+
+    def record(self, album_id: int, track_id: int, path: str, content_hash: Optional[str] = None,
+               expected_size: int = 0) -> LibraryEntry:
+        """下载完成后登记文件；未提供哈希时读取文件计算MD5
+
+        expected_size 为下载时的 Content-Length，只有与文件大小一致的记录才会被 find_copy 用于链接。
+        """
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        if content_hash is None:
+            content_hash = file_md5(path)
+        entry = LibraryEntry(int(album_id or 0), int(track_id), path, st.st_size, content_hash, st.st_mtime,
+                             file_head_hash(path), int(expected_size or 0))
+        self.upsert([entry])
+        return entry
+
+    def upsert(self, entries: Iterable[LibraryEntry]):
+        now = time.time()
+        rows = [(e.album_id, e.track_id, e.path, e.size, e.content_hash, e.mtime, now, e.head_hash, e.expected_size)
+                for e in entries]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany('''
+                INSERT OR REPLACE INTO library
+                (album_id, track_id, path, size, content_hash, mtime, updated_at, head_hash, expected_size)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+
+    def forget(self, album_id: int, track_ids: Iterable[int]):
+        rows = [(int(album_id or 0), int(t)) for t in track_ids]
+        if not rows:
+            return
+        with self._lock, self._connect() as conn:
+            conn.executemany('DELETE FROM library WHERE album_id = ? AND track_id = ?', rows)
+            conn.commit()
+
+    _COLUMNS = 'album_id, track_id, path, size, content_hash, mtime, head_hash, expected_size'
+
+    def _query(self, where: str, params: tuple) -> List[LibraryEntry]:
+        with self._connect() as conn:
+            rows = conn.execute(f'SELECT {self._COLUMNS} FROM library WHERE {where}', params).fetchall()
+        return [LibraryEntry(*row) for row in rows]
+
+    def forget_dir(self, directory: str) -> List[int]:
+        """删除某目录下的全部记录（目录被删除或移走时），返回受影响的专辑ID"""
+        prefix = os.path.join(os.path.abspath(directory), '')
+        where = 'substr(path, 1, ?) = ?'
+        params = (len(prefix), prefix)
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(f'SELECT DISTINCT album_id FROM library WHERE {where}', params).fetchall()
+            conn.execute(f'DELETE FROM library WHERE {where}', params)
+            conn.commit()
+        return [row[0] for row in rows]
+
+    def get_album_entries(self, album_id: int) -> Dict[int, LibraryEntry]:
+        """一次查询返回专辑下全部登记的曲目（不检查文件是否仍存在）"""
+        return {e.track_id: e for e in self._query('album_id = ?', (int(album_id or 0),))}
+
+    def find_copy(self, track_id: Optional[int] = None, size: int = 0, head: str = '',
+                  exclude_path: Optional[str] = None) -> Optional[LibraryEntry]:
+        """查找磁盘上仍存在的相同内容：按曲目ID（任意专辑），或按文件大小+头部哈希
+
+        只返回经过下载校验的记录（见 LibraryEntry.verified），未完成或来源不明的文件不会被链接复用。
+        """
+        verified = "content_hash != '' AND expected_size > 0 AND size = expected_size"
+        if track_id is not None:
+            candidates = self._query(f'track_id = ? AND {verified}', (int(track_id),))
+        elif size and head:
+            candidates = self._query(f'size = ? AND head_hash = ? AND {verified}', (int(size), head))
+        else:
+            return None
+        exclude = os.path.abspath(exclude_path) if exclude_path else None
+        for entry in candidates:
+            if entry.path == exclude:
+                continue
+            try:
+                if os.stat(entry.path).st_size == entry.size:
+                    return entry
+            except OSError:
+                continue
+        return None
+
+    def downloaded_tracks(self, album_id: int, save_dir: Optional[str] = None,
+                          expected: Iterable[Tuple[int, str]] = ()) -> Dict[int, LibraryEntry]:
+        """返回专辑中仍在磁盘上的已下载曲目 {track_id: LibraryEntry}
+
+        - 索引中的记录通过所在目录的一次列举校验，文件被删除或大小变化的记录会被移除
+        - expected 为 [(track_id, 旧规则文件名)]，用于收录本索引出现之前下载的文件：
+          save_dir 中存在同名且大于10KB的文件时补登记（不计算哈希）
+        """
+        entries = self.get_album_entries(album_id)
+        listings: Dict[str, Dict[str, Tuple[int, float]]] = {}
+
+        def listing(directory):
+            if directory not in listings:
+                files = {}
+                try:
+                    with os.scandir(directory) as it:
+                        for e in it:
+                            if e.is_file():
+                                st = e.stat()
+                                files[e.name] = (st.st_size, st.st_mtime)
+                except OSError:
+                    pass
+                listings[directory] = files
+            return listings[directory]
+
+        present: Dict[int, LibraryEntry] = {}
+        stale = []
+        for track_id, entry in entries.items():
+            info = listing(os.path.dirname(entry.path)).get(os.path.basename(entry.path))
+            if info and info[0] == entry.size:
+                present[track_id] = entry
+            else:
+                stale.append(track_id)
+        if stale:
+            self.forget(album_id, stale)
+
+        if save_dir:
+            save_dir = os.path.abspath(save_dir)
+            backfill = []
+            for track_id, filename in expected:
+                track_id = int(track_id)
+                if track_id in present:
+                    continue
+                info = listing(save_dir).get(filename)
+                if info and info[0] > MIN_COMPLETE_SIZE:
+                    entry = LibraryEntry(int(album_id or 0), track_id, os.path.join(save_dir, filename),
+                                         info[0], '', info[1])
+                    backfill.append(entry)
+                    present[track_id] = entry
+            self.upsert(backfill)
+        return present
+
+    def stats(self) -> Dict:
+        with self._connect() as conn:
+            count, total_size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM library').fetchone()
+        return {'tracks': count, 'total_size': total_size, 'db_path': self.db_path}
+
+
+_global_index: Optional[LibraryIndex] = None
+_global_index_lock = threading.Lock()
+
+
+def get_library_index() -> LibraryIndex:
+    """获取全局下载索引实例"""
+    global _global_index
+    if _global_index is None:
+        with _global_index_lock:
+            if _global_index is None:
+                _global_index = LibraryIndex()
+    return _global_index
@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from utils.library_index import (LibraryEntry, LibraryIndex, MIN_COMPLETE_SIZE, file_head_hash, file_md5,
+                                 get_library_index)
+
+
+def _safe_title(title: str) -> str:
+    return re.sub(r'[\\/:*?"<>|]', '_', title or '')
+
+
+class LibraryScanner:
+    """增量重建下载索引
+
+    遍历下载根目录下的每个专辑目录，每个目录只做一次 os.scandir，
+    把看到的 .m4a 文件与下载索引对账：
+      - 大小和修改时间都没变的记录直接跳过，不读文件
+      - 大小或修改时间变化、或此前没有哈希的记录重新计算MD5
+      - 索引里有但磁盘上已不存在的记录删除
+      - 索引之前下载的文件，通过 album_info.json 和进度文件里的
+        track_id -> 文件名 对应关系补登记
+
+    NAS重新挂载后重扫只需每个目录一次列举，不会逐曲目 stat。
+    """
+
+    def __init__(self, root: str, index: Optional[LibraryIndex] = None,
+                 progress_func: Optional[Callable] = None, log_func: Callable = print):
+        self.root = os.path.abspath(root)
+        self.index = index or get_library_index()
+        self.progress_func = progress_func
+        self.log = log_func
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def stop(self):
+        self._stop.set()
+
+    def start(self, on_done: Optional[Callable[[Dict], None]] = None) -> threading.Thread:
+        """在后台线程中扫描，完成后以统计结果调用 on_done（失败时为 None）"""
+        def run():
+            stats = None
+            try:
+                stats = self.scan()
+            except Exception as e:
+                self.log(f'扫描下载目录失败: {e}', level='error')
+            finally:
+                if on_done:
+                    on_done(stats)
+        self._thread = threading.Thread(target=run, name='library-scanner', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def scan(self) -> Dict:
+        start = time.time()
+        stats = {'albums': 0, 'files': 0, 'unchanged': 0, 'hashed': 0, 'added': 0,
+                 'removed': 0, 'unmatched': 0, 'skipped_dirs': 0}
+        try:
+            with os.scandir(self.root) as it:
+                album_dirs = sorted(e.path for e in it if e.is_dir())
+        except OSError as e:
+            self.log(f'无法读取下载目录 {self.root}: {e}', level='error')
+            album_dirs = []
+
+        total = len(album_dirs)
+        for i, album_dir in enumerate(album_dirs, start=1):
+            if self._stop.is_set():
+                break
+            try:
+                self._scan_album_dir(album_dir, stats)
+            except Exception as e:
+                self.log(f'扫描目录失败 {album_dir}: {e}', level='warning')
+            if self.progress_func:
+                self.progress_func(i, total, os.path.basename(album_dir))
+
+        stats['elapsed'] = round(time.time() - start, 3)
+        self.log(f"下载目录扫描完成: {stats['albums']} 个专辑, {stats['files']} 个文件, "
+                 f"新增 {stats['added']}, 重新校验 {stats['hashed']}, 移除 {stats['removed']}, "
+                 f"耗时 {stats['elapsed']}秒", level='info')
+        return stats
+
+    def scan_album_dir(self, album_dir: str) -> Dict:
+        """只对账一个专辑目录（供目录监控在文件变化时调用）"""
+        stats = {'albums': 0, 'files': 0, 'unchanged': 0, 'hashed': 0, 'added': 0,
+                 'removed': 0, 'unmatched': 0, 'skipped_dirs': 0}
+        stats['album_id'] = self._scan_album_dir(os.path.abspath(album_dir), stats)
+        return stats
+
+    def _scan_album_dir(self, album_dir: str, stats: Dict) -> Optional[int]:
+        files = {}
+        with os.scandir(album_dir) as it:
+            for e in it:
+                if e.is_file() and e.name.endswith('.m4a'):
+                    st = e.stat()
+                    files[e.name] = (st.st_size, st.st_mtime)
+
+        album_info = self._read_album_info(album_dir)
+        album_id = album_info.get('albumId')
+        if not album_id:
+            stats['skipped_dirs'] += 1
+            return None
+        album_id = int(album_id)
+        stats['albums'] += 1
+        stats['files'] += len(files)
+
+        in_dir = {os.path.basename(e.path): e
+                  for e in self.index.get_album_entries(album_id).values()
+                  if os.path.dirname(e.path) == album_dir}
+        stale = [e.track_id for name, e in in_dir.items() if name not in files]
+        if stale:
+            self.index.forget(album_id, stale)
+            stats['removed'] += len(stale)
+
+        name_map = None
+        updates = []
+        for name, (size, mtime) in files.items():
+            if self._stop.is_set():
+                break
+            entry = in_dir.get(name)
+            if entry is not None:
+                if entry.size == size and entry.mtime == mtime and entry.content_hash and entry.head_hash:
+                    stats['unchanged'] += 1
+                    continue
+                stats['hashed'] += 1
+                track_id = entry.track_id
+            else:
+                if size <= MIN_COMPLETE_SIZE:
+                    continue
+                if name_map is None:
+                    name_map = self._filename_map(album_dir, album_info)
+                track_id = name_map.get(name)
+                if track_id is None:
+                    stats['unmatched'] += 1
+                    continue
+                stats['added'] += 1
+            path = os.path.join(album_dir, name)
+            # 仅当文件大小仍等于下载时的 Content-Length 才保留校验信息
+            expected_size = entry.expected_size if entry is not None and entry.expected_size == size else 0
+            updates.append(LibraryEntry(album_id, int(track_id), path, size, file_md5(path), mtime,
+                                        file_head_hash(path), expected_size))
+        self.index.upsert(updates)
+        return album_id
+
+    @staticmethod
+    def _read_album_info(album_dir: str) -> Dict:
+        try:
+            with open(os.path.join(album_dir, 'album_info.json'), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+            return info if isinstance(info, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _filename_map(album_dir: str, album_info: Dict) -> Dict[str, int]:
+        """文件名 -> track_id：来自选中下载写入的 album_info.json 和专辑下载的进度记录"""
+        from utils.progress_journal import ProgressJournal
+        name_map = {}
+        for track in album_info.get('tracks') or []:
+            if isinstance(track, dict) and track.get('trackId') and track.get('index'):
+                name_map[f"{int(track['index']):03d}_{_safe_title(track.get('title'))}.m4a"] = int(track['trackId'])
+        try:
+            # 只读加载：扫描不迁移旧版进度文件，不改动用户的专辑目录
+            progress = ProgressJournal(album_dir).load(migrate=False)
+        except Exception:
+            progress = {}
+        for page in progress.values():
+            if not isinstance(page, dict):
+                continue
+            for track_id, record in (page.get('tracks') or {}).items():
+                if isinstance(record, dict) and record.get('filename'):
+                    name_map[record['filename']] = int(track_id)
+        return name_map
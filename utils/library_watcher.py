@@ -0,0 +1,182 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from utils.library_index import LibraryIndex, get_library_index
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_ROOT_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_ALBUM_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+_EVENT_HEADER = struct.Struct('iIII')
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+    return _libc
+
+
+def is_supported() -> bool:
+    """仅Linux提供inotify；其他平台仍需手动“扫描下载目录”"""
+    if not sys.platform.startswith('linux'):
+        return False
+    try:
+        return hasattr(_load_libc(), 'inotify_init1')
+    except OSError:
+        return False
+
+
+class LibraryWatcher:
+    """用 inotify 监控下载根目录，保持下载索引实时更新
+
+    监控根目录（专辑目录的增删/移动）和每个专辑目录（.m4a 与 album_info.json 的
+    写入完成、删除、移入移出）。事件按目录合并，静默 debounce 秒后对该目录做一次
+    增量对账（LibraryScanner.scan_album_dir），随后以 (album_dir, album_ids) 回调
+    on_change。内核事件队列溢出时对全部目录重新对账。
+    """
+
+    def __init__(self, root: str, index: Optional[LibraryIndex] = None,
+                 on_change: Optional[Callable] = None, log_func: Callable = print, debounce: float = 1.0):
+        from utils.library_scanner import LibraryScanner
+        self.root = os.path.abspath(root)
+        self.index = index or get_library_index()
+        self.on_change = on_change
+        self.log = log_func
+        self.debounce = debounce
+        self._scanner = LibraryScanner(self.root, index=self.index, log_func=log_func)
+        self._fd = -1
+        self._wd_paths: Dict[int, str] = {}
+        self._dirty: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """开始监控；平台不支持或初始化失败时返回 False"""
+        if not is_supported():
+            self.log('当前平台不支持inotify，下载目录实时监控未启用', level='warning')
+            return False
+        libc = _load_libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            self.log(f'inotify初始化失败: {os.strerror(ctypes.get_errno())}', level='warning')
+            return False
+        self._fd = fd
+        os.makedirs(self.root, exist_ok=True)
+        self._add_watch(self.root, _ROOT_MASK)
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_dir():
+                    self._add_watch(entry.path, _ALBUM_MASK)
+        self._thread = threading.Thread(target=self._run, name='library-watcher', daemon=True)
+        self._thread.start()
+        self.log(f'已开始监控下载目录: {self.root}', level='info')
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _add_watch(self, path: str, mask: int):
+        wd = _load_libc().inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            self.log(f'无法监控目录 {path}: {os.strerror(ctypes.get_errno())}', level='warning')
+            return
+        self._wd_paths[wd] = path
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                ready, _, _ = select.select([self._fd], [], [], 0.5)
+                if ready:
+                    self._read_events()
+                self._flush_dirty()
+        except Exception as e:
+            self.log(f'下载目录监控异常退出: {e}', level='error')
+        finally:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        now = time.time()
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            self._handle_event(wd, mask, name, now)
+
+    def _handle_event(self, wd: int, mask: int, name: str, now: float):
+        if mask & IN_Q_OVERFLOW:
+            # 事件丢失，全部目录重新对账
+            for path in self._wd_paths.values():
+                if path != self.root:
+                    self._dirty[path] = now
+            return
+        if mask & IN_IGNORED:
+            self._wd_paths.pop(wd, None)
+            return
+        parent = self._wd_paths.get(wd)
+        if parent is None:
+            return
+        if parent == self.root:
+            if not (mask & IN_ISDIR) or not name:
+                return
+            path = os.path.join(self.root, name)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_watch(path, _ALBUM_MASK)
+            self._dirty[path] = now
+        elif mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            self._dirty[parent] = now
+            if mask & IN_MOVE_SELF and not os.path.isdir(parent):
+                # 目录被移出下载根目录；在根目录内改名时同一个wd已由 IN_MOVED_TO 指向新路径
+                _load_libc().inotify_rm_watch(self._fd, wd)
+                self._wd_paths.pop(wd, None)
+        elif name.endswith('.m4a') or name == 'album_info.json':
+            self._dirty[parent] = now
+
+    def _flush_dirty(self):
+        now = time.time()
+        ready = [path for path, ts in self._dirty.items() if now - ts >= self.debounce]
+        for path in ready:
+            del self._dirty[path]
+            try:
+                if os.path.isdir(path):
+                    album_id = self._scanner.scan_album_dir(path).get('album_id')
+                    album_ids = [album_id] if album_id else []
+                else:
+                    album_ids = self.index.forget_dir(path)
+            except Exception as e:
+                self.log(f'更新下载索引失败 {path}: {e}', level='warning')
+                continue
+            if self.on_change and album_ids:
+                self.on_change(path, album_ids)
@@ -0,0 +1,199 @@
+"""分子系统的分级日志
+
+各模块通过 get_log('cache', log_func) 取得日志对象，按 %-格式传参：
+
+    log = get_log('fetcher', log_func)
+    log.debug("[Track解析] 响应状态码: %s", response.status_code)
+    log.trace("[Track解析] 响应数据: %s", lazy(json.dumps, data, ensure_ascii=False))
+
+级别未开启时直接返回，不格式化消息，lazy() 包装的参数也不会被计算。开启后若调用方传入了
+log_func 则按 log_func(msg, level=...) 约定转发（GUI、CLI），否则交给标准库 logging 输出到 stderr。
+
+各子系统级别可由环境变量 XIMALAYA_LOG 或 set_log_levels() 设置，如 "info,cache=debug,fetcher=trace"，
+不带子系统名的一项设置全部子系统的默认级别。默认 info，trace 默认关闭。
+"""
+import logging
+import os
+import sys
+import threading
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+
+ROOT_LOGGER = 'ximalaya'
+
+LEVELS = {
+    'trace': TRACE,
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'error': logging.ERROR,
+}
+_LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+_configure_lock = threading.Lock()
+_configured = False
+
+
+class _StderrHandler(logging.StreamHandler):
+    """总是写到当前的 sys.stderr（CLI 会在运行期间重定向标准流）"""
+
+    def __init__(self):
+        super().__init__(sys.stderr)
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def _parse_level(name: str) -> int:
+    name = name.strip().lower()
+    if name not in LEVELS:
+        raise ValueError(f'未知的日志级别: {name}')
+    return LEVELS[name]
+
+
+def set_log_levels(spec: str):
+    """按 "默认级别,子系统=级别,..." 设置日志级别，未提及的子系统保持原级别"""
+    _ensure_configured()
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if '=' in item:
+            subsystem, level = item.split('=', 1)
+            logging.getLogger(f'{ROOT_LOGGER}.{subsystem.strip()}').setLevel(_parse_level(level))
+        else:
+            logging.getLogger(ROOT_LOGGER).setLevel(_parse_level(item))
+
+
+def _ensure_configured():
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if _configured:
+            return
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(logging.INFO)
+        handler = _StderrHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        root.addHandler(handler)
+        root.propagate = False
+        _configured = True
+    env_spec = os.environ.get('XIMALAYA_LOG')
+    if env_spec:
+        try:
+            set_log_levels(env_spec)
+        except ValueError as e:
+            logging.getLogger(ROOT_LOGGER).warning(f'XIMALAYA_LOG 无效: {e}')
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    _ensure_configured()
+    return logging.getLogger(f'{ROOT_LOGGER}.{subsystem}')
+
+
+class lazy:
+    """延迟计算的日志参数：只有消息真正输出时才调用 func"""
+    __slots__ = ('func', 'args', 'kwargs')
+
+    def __init__(self, func: Callable, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        return str(self.func(*self.args, **self.kwargs))
+
+
+def clip(text: str, limit: int = 50) -> str:
+    """截断过长的URL或响应文本"""
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+class SubsystemLog:
+    """绑定子系统级别与可选 log_func 的日志对象"""
+    __slots__ = ('logger', 'log_func')
+
+    def __init__(self, logger: logging.Logger, log_func: Optional[Callable] = None):
+        self.logger = logger
+        self.log_func = log_func
+
+    def enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg: str, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        if args:
+            msg = msg % args
+        if self.log_func is None:
+            self.logger.log(level, msg)
+            return
+        level_name = _LEVEL_NAMES.get(level, 'info')
+        try:
+            self.log_func(msg, level=level_name)
+        except TypeError:
+            # 不支持 level 参数的 log_func（如 print）只传消息
+            self.log_func(msg)
+
+    def trace(self, msg: str, *args):
+        self.log(TRACE, msg, *args)
+
+    def debug(self, msg: str, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args):
+        self.log(logging.WARNING, msg, *args)
+
+    def error(self, msg: str, *args):
+        self.log(logging.ERROR, msg, *args)
+
+
+def get_log(subsystem: str, log_func: Optional[Callable] = None) -> SubsystemLog:
+    return SubsystemLog(get_logger(subsystem), log_func)
+
+
+def level_value(name: str) -> int:
+    """日志级别名对应的数值，未知名称按 info 处理"""
+    return LEVELS.get(name, logging.INFO)
+
+
+class LogBuffer:
+    """线程安全的日志环形缓冲：任意线程 append，界面线程定时 drain 后批量显示
+
+    缓冲满时丢弃最旧的消息并计数，界面跟不上时内存也不会无限增长。
+    """
+
+    def __init__(self, maxlen: int = 10000):
+        self._items = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def append(self, msg: str, level: str = 'info'):
+        with self._lock:
+            if len(self._items) == self._items.maxlen:
+                self._dropped += 1
+            self._items.append((level, msg))
+
+    def drain(self) -> Tuple[List[Tuple[str, str]], int]:
+        """取出全部待显示的 (级别, 消息)，同时返回自上次取出后被丢弃的条数"""
+        with self._lock:
+            items = list(self._items)
+            self._items.clear()
+            dropped, self._dropped = self._dropped, 0
+        return items, dropped
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,172 @@
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+
+@dataclass
+class ProgressEvent:
+    """单个文件的下载进度（结构化数据，由消费方自行格式化）"""
+    filename: str
+    downloaded: int          # 已下载字节数
+    total: int               # 总字节数，未知时为0
+    rate: float = 0.0        # 平均速度（字节/秒）
+    eta: Optional[float] = None  # 预计剩余秒数，未知时为None
+    done: bool = False
+
+    @property
+    def percent(self) -> Optional[int]:
+        return self.downloaded * 100 // self.total if self.total > 0 else None
+
+    def format(self) -> str:
+        if self.total > 0:
+            text = f'下载进度: {self.percent}% ({self.downloaded // 1024}KB/{self.total // 1024}KB)'
+        else:
+            text = f'下载进度: {self.downloaded // 1024}KB'
+        if self.rate > 0:
+            text += f' {self.rate / 1024 / 1024:.2f}MB/s'
+        if self.eta is not None and not self.done:
+            text += f' 剩余{int(self.eta)}秒'
+        return text
+
+
+class ProgressThrottle:
+    """按时间和字节增量节流的进度上报
+
+    update() 可以在每个数据块后调用，只有距上次上报超过 min_interval 秒、
+    且新增字节不少于 min_bytes 时才会真正回调；完成（或 force=True）时总会回调一次。
+    这样无论文件大小和块大小，每个消费方收到的更新频率都有上限。
+    """
+
+    def __init__(self, callback: Callable[[ProgressEvent], None], min_interval: float = 0.5,
+                 min_bytes: int = 0, clock: Callable[[], float] = time.monotonic):
+        self.callback = callback
+        self.min_interval = min_interval
+        self.min_bytes = min_bytes
+        self._clock = clock
+        self._start = None
+        self._last_time = None
+        self._last_bytes = 0
+
+    def update(self, downloaded: int, total: int, filename: str = '', force: bool = False) -> bool:
+        now = self._clock()
+        if self._start is None:
+            self._start = now
+        done = total > 0 and downloaded >= total
+        if not (force or done) and self._last_time is not None:
+            if now - self._last_time < self.min_interval:
+                return False
+            if downloaded - self._last_bytes < self.min_bytes:
+                return False
+        elapsed = now - self._start
+        rate = downloaded / elapsed if elapsed > 0 else 0.0
+        eta = (total - downloaded) / rate if rate > 0 and total > 0 else None
+        self._last_time = now
+        self._last_bytes = downloaded
+        self.callback(ProgressEvent(filename, downloaded, total, rate, eta, done))
+        return True
+
+
+class StallWatchdog:
+    """滚动窗口吞吐量监控
+
+    读超时只能发现完全没有数据的连接；每十几秒才送来几个字节的连接永远不会超时。
+    update() 在每个数据块后调用：最近 window 秒内的平均速度低于 min_rate 时返回 True，
+    由调用方断开连接并从当前位置续传。min_rate 为0时不做检测。
+    """
+
+    def __init__(self, min_rate: float, window: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.min_rate = min_rate
+        self.window = window
+        self._clock = clock
+        self.reset()
+
+    def reset(self):
+        """重新开始计时（续传建立新连接后调用）"""
+        self._start = self._clock()
+        self._samples = deque()
+        self._window_bytes = 0
+
+    def update(self, n: int) -> bool:
+        if self.min_rate <= 0:
+            return False
+        now = self._clock()
+        self._samples.append((now, n))
+        self._window_bytes += n
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._window_bytes -= self._samples.popleft()[1]
+        if now - self._start < self.window:
+            return False
+        return self._window_bytes / self.window < self.min_rate
+
+
+class StallMetrics:
+    """下载停滞与续传计数（进程内，线程安全）"""
+
+    FIELDS = ('stalls', 'read_errors', 'resumes', 'restarts', 'resumed_bytes')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, field: str, n: int = 1):
+        with self._lock:
+            self._counts[field] += n
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+_stall_metrics = StallMetrics()
+
+
+def get_stall_metrics() -> StallMetrics:
+    return _stall_metrics
+
+
+def throttle_calls(func: Optional[Callable], min_interval: float = 0.2,
+                   clock: Callable[[], float] = time.monotonic,
+                   timer_factory: Callable = threading.Timer) -> Optional[Callable]:
+    """包装 progress_func(current, total, filename) 风格的回调：
+
+    间隔不足 min_interval 的调用先暂存，间隔期满后补发最近一次（尾沿），
+    因此一段时间内的最后状态（如“开始下载第N首”）不会丢失；
+    current 达到 total 的最终调用总会立即送达。
+    """
+    if func is None:
+        return None
+    # 回调本身也在锁内执行，保证补发的旧状态不会晚于更新的状态送达
+    lock = threading.RLock()
+    last = [None]
+    pending = [None]
+    timer = [None]
+
+    def flush():
+        with lock:
+            timer[0] = None
+            args, pending[0] = pending[0], None
+            if args is None:
+                return
+            last[0] = clock()
+            func(*args)
+
+    def wrapper(current, total, filename=None):
+        with lock:
+            now = clock()
+            final = bool(total) and current >= total
+            if not final and last[0] is not None and now - last[0] < min_interval:
+                pending[0] = (current, total, filename)
+                if timer[0] is None:
+                    timer[0] = timer_factory(min_interval - (now - last[0]), flush)
+                    timer[0].daemon = True
+                    timer[0].start()
+                return
+            pending[0] = None
+            if timer[0] is not None:
+                timer[0].cancel()
+                timer[0] = None
+            last[0] = now
+            func(current, total, filename)
+    return wrapper
@@ -0,0 +1,198 @@
+import copy
+import json
+import os
+import tempfile
+import threading
+import weakref
+from typing import Dict, Optional
+
+# 持有追加句柄的日志，退出时由 close_open_journals 统一落盘
+_open_journals = weakref.WeakSet()
+_open_journals_lock = threading.Lock()
+
+
+class ProgressJournal:
+    """专辑下载进度的追加式日志（JSON Lines）
+
+    每次曲目状态变化只追加一行，写入开销与进度总量无关；
+    加载时读取最近一次快照再依次重放后续记录。追加的记录数超过阈值后
+    自动压缩为一行快照，防止日志无限增长。
+
+    旧版本的 download_progress.json 会在首次打开时迁移为快照，
+    原文件重命名为 .migrated 保留。
+    """
+
+    JOURNAL_NAME = 'download_progress.jsonl'
+    LEGACY_NAME = 'download_progress.json'
+
+    def __init__(self, save_dir: str, compact_min_ops: int = 200):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, self.JOURNAL_NAME)
+        self.legacy_path = os.path.join(save_dir, self.LEGACY_NAME)
+        self.compact_min_ops = compact_min_ops
+        self._state: Dict = {}
+        self._ops_since_snapshot = 0
+        self._fh = None
+        self._lock = threading.RLock()
+
+    # ---------- 读取 ----------
+
+    def load(self, migrate: bool = True) -> Dict:
+        """从磁盘读取进度，返回与旧JSON格式相同结构的字典副本
+
+        migrate=False 时只读：旧版 download_progress.json 直接解析，不迁移也不改名
+        （供扫描/目录监控使用，不改动用户的专辑目录）。
+        """
+        with self._lock:
+            if not os.path.exists(self.path) and os.path.exists(self.legacy_path):
+                if not migrate:
+                    return self._read_legacy()
+                self._migrate_legacy()
+            state: Dict = {}
+            ops = 0
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            # 崩溃时可能留下写了一半的最后一行，忽略即可
+                            continue
+                        if entry.get('t') == 'snapshot':
+                            state = entry.get('v') or {}
+                            ops = 0
+                        else:
+                            self._apply(state, entry)
+                            ops += 1
+            self._state = state
+            self._ops_since_snapshot = ops
+            return copy.deepcopy(state)
+
+    def _read_legacy(self) -> Dict:
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception:
+            return {}
+        return legacy if isinstance(legacy, dict) else {}
+
+    def _migrate_legacy(self):
+        self._write_snapshot_file(self._read_legacy())
+        try:
+            os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        except OSError:
+            pass
+
+    @staticmethod
+    def _apply(state: Dict, entry: Dict):
+        kind = entry.get('t')
+        if kind == 'track':
+            page = state.setdefault(str(entry['p']), {})
+            page.setdefault('tracks', {})[str(entry['id'])] = entry.get('r', {})
+            if 'done' in entry:
+                page['done'] = bool(entry['done'])
+        elif kind == 'set':
+            state[entry['k']] = entry.get('v')
+
+    # ---------- 写入 ----------
+
+    def record_track(self, page, track_id, record: Dict, page_done: Optional[bool] = None):
+        """记录一首曲目的最终状态；page_done 为 True/False 时同时更新整页完成标记，None 时不改变"""
+        entry = {'t': 'track', 'p': str(page), 'id': str(track_id), 'r': record}
+        if page_done is not None:
+            entry['done'] = bool(page_done)
+        self._append(entry)
+
+    def set_flag(self, key: str, value):
+        """设置顶层字段，如 blocked"""
+        self._append({'t': 'set', 'k': key, 'v': value})
+
+    def _append(self, entry: Dict):
+        with self._lock:
+            self._apply(self._state, entry)
+            fh = self._open_for_append()
+            fh.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            fh.flush()
+            self._ops_since_snapshot += 1
+            if self._should_compact():
+                self.compact()
+
+    def _open_for_append(self):
+        if self._fh is None:
+            os.makedirs(self.save_dir, exist_ok=True)
+            needs_newline = False
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    needs_newline = f.read(1) != b'\n'
+            self._fh = open(self.path, 'a', encoding='utf-8')
+            with _open_journals_lock:
+                _open_journals.add(self)
+            if needs_newline:
+                # 上次写了一半的行单独成行，加载时会被跳过
+                self._fh.write('\n')
+        return self._fh
+
+    def _should_compact(self) -> bool:
+        if self._ops_since_snapshot < self.compact_min_ops:
+            return False
+        tracks = sum(len(p.get('tracks', {})) for p in self._state.values() if isinstance(p, dict))
+        return self._ops_since_snapshot >= 2 * max(tracks, 1)
+
+    def write_snapshot(self, progress: Dict):
+        """用完整进度覆盖日志（兼容旧的整体保存接口）"""
+        with self._lock:
+            self._state = copy.deepcopy(progress)
+            self.compact()
+
+    def compact(self):
+        """把当前状态重写为一行快照"""
+        with self._lock:
+            self._close_handle()
+            self._write_snapshot_file(self._state)
+            self._ops_since_snapshot = 0
+
+    def _write_snapshot_file(self, state: Dict):
+        os.makedirs(self.save_dir, exist_ok=True)
+        tmp_file: Optional[str] = None
+        try:
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.save_dir, delete=False) as tf:
+                tmp_file = tf.name
+                tf.write(json.dumps({'t': 'snapshot', 'v': state}, ensure_ascii=False) + '\n')
+                tf.flush()
+                os.fsync(tf.fileno())
+            os.replace(tmp_file, self.path)
+        except Exception:
+            if tmp_file and os.path.exists(tmp_file):
+                try:
+                    os.remove(tmp_file)
+                except OSError:
+                    pass
+            raise
+
+    def _close_handle(self):
+        if self._fh is not None:
+            try:
+                self._fh.flush()
+                os.fsync(self._fh.fileno())
+            finally:
+                self._fh.close()
+                self._fh = None
+                with _open_journals_lock:
+                    _open_journals.discard(self)
+
+    def close(self):
+        """落盘并关闭追加句柄"""
+        with self._lock:
+            self._close_handle()
+
+
+def close_open_journals():
+    """落盘并关闭所有仍打开的进度日志（程序退出前调用）"""
+    with _open_journals_lock:
+        journals = list(_open_journals)
+    for journal in journals:
+        journal.close()
@@ -0,0 +1,61 @@
+"""按磁盘或带宽预算为下载任务选择音质等级
+
+音质等级即 baseInfo 接口的 trackQualityLevel。解析过的曲目在缓存中记录了各音质的实际
+文件大小（见 SqliteCache.record_track_qualities）；没有记录的曲目按同一任务中已知曲目的
+实测码率估算，再没有时使用名义码率。
+"""
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# 没有任何实测数据时各音质等级的名义码率（字节/秒）
+NOMINAL_BITRATES = {0: 24000 / 8, 1: 64000 / 8, 2: 128000 / 8}
+
+
+@dataclass
+class QualityPlan:
+    quality: int
+    estimated_bytes: int
+    estimated_seconds: Optional[float]  # 按给定带宽估算的下载耗时，未给带宽时为 None
+    fits: bool                          # 是否满足全部预算
+
+
+def estimate_bytes(durations: Dict[int, int], quality: int, known: Optional[Dict[int, List]] = None) -> int:
+    """估算一组曲目在指定音质下的总大小
+
+    durations: {track_id: 时长秒数}；known: {track_id: [TrackQuality]}（来自缓存）
+    """
+    known = known or {}
+    exact = {}
+    rates = []
+    for track_id, qualities in known.items():
+        for q in qualities:
+            if q.quality == quality and q.file_size:
+                exact[track_id] = max(exact.get(track_id, 0), q.file_size)
+                if q.bitrate:
+                    rates.append(q.bitrate)
+    if rates:
+        bitrate = sum(rates) / len(rates)
+    else:
+        bitrate = NOMINAL_BITRATES.get(quality, NOMINAL_BITRATES[max(NOMINAL_BITRATES)])
+    return int(sum(exact.get(track_id, duration * bitrate) for track_id, duration in durations.items()))
+
+
+def plan_quality(durations: Dict[int, int], levels: Iterable[int] = (2, 1, 0), known: Optional[Dict[int, List]] = None,
+                 disk_budget: float = 0, bandwidth: float = 0, deadline: float = 0) -> QualityPlan:
+    """从高到低选择第一个满足预算的音质
+
+    disk_budget 为可用磁盘字节数；bandwidth（字节/秒）与 deadline（秒）同时给出时要求在期限内下完。
+    预算为0表示不限制；都不满足时返回最低音质并标记 fits=False。
+    """
+    plan = None
+    for quality in levels:
+        size = estimate_bytes(durations, quality, known)
+        seconds = size / bandwidth if bandwidth > 0 else None
+        fits = (not disk_budget or size <= disk_budget) and \
+               (seconds is None or not deadline or seconds <= deadline)
+        plan = QualityPlan(quality, size, seconds, fits)
+        if fits:
+            return plan
+    if plan is None:
+        raise ValueError('没有可选的音质等级')
+    return plan
@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import time
+import threading
+from typing import Optional
+
+
+class SqliteRateLimiter:
+    """跨进程限流器
+
+    多个worker进程通过同一个SQLite文件协调请求间隔：每次 acquire() 在一个
+    写事务中预约下一个可用时间槽，然后在事务外等待到该时间点。
+    """
+
+    def __init__(self, db_path: str, name: str = 'ximalaya_api', min_interval: float = 3.0,
+                 busy_timeout_ms: int = 30000):
+        self.db_path = db_path
+        self.name = name
+        self.min_interval = max(0.0, float(min_interval))
+        self.busy_timeout_ms = busy_timeout_ms
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._init_database()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：手动控制 BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        return conn
+
+    def _init_database(self):
+        conn = self._connect()
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_limit (
+                    name TEXT PRIMARY KEY,
+                    next_time REAL NOT NULL
+                )
+            ''')
+        finally:
+            conn.close()
+
+    def reserve(self) -> float:
+        """预约一个请求时间槽，返回需要等待的秒数"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT next_time FROM rate_limit WHERE name = ?', (self.name,)).fetchone()
+            now = time.time()
+            slot = max(now, row[0] if row else 0.0)
+            conn.execute('INSERT OR REPLACE INTO rate_limit (name, next_time) VALUES (?, ?)',
+                         (self.name, slot + self.min_interval))
+            conn.execute('COMMIT')
+            return slot - now
+        except Exception:
+            try:
+                conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def acquire(self) -> float:
+        """阻塞直到轮到本进程发请求，返回实际等待的秒数"""
+        wait_time = self.reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+# 全局限流器（未配置时不限流，保持单进程模式的原有行为）
+_global_limiter: Optional[SqliteRateLimiter] = None
+_global_lock = threading.Lock()
+
+
+def set_global_rate_limiter(limiter: Optional[SqliteRateLimiter]):
+    """设置全局限流器，worker进程启动时调用"""
+    global _global_limiter
+    with _global_lock:
+        _global_limiter = limiter
+
+
+def get_global_rate_limiter() -> Optional[SqliteRateLimiter]:
+    return _global_limiter
+
+
+def wait_for_request_slot() -> float:
+    """在请求喜马拉雅接口前调用；未配置全局限流器时立即返回"""
+    limiter = _global_limiter
+    if limiter is None:
+        return 0.0
+    try:
+        return limiter.acquire()
+    except sqlite3.Error:
+        # 限流数据库不可用时不阻塞下载流程
+        return 0.0
@@ -4,10 +4,14 @@ import json
 import os
 from dataclasses import dataclass, asdict
 from typing import Dict, Optional, List, Any
-import requests
 from datetime import datetime, timedelta
 import threading
 
+from utils.log import clip, get_log, lazy
+
+_log = get_log('cache')
+
+
 @dataclass
 class CachedTrack:
     """缓存的曲目信息"""
@@ -23,6 +27,44 @@ class CachedTrack:
     is_valid: bool = True
     verify_count: int = 0
     extra_data: str = ""  # JSON格式存储额外数据
+    quality: int = 1  # 音质等级（baseInfo 的 trackQualityLevel）
+
+
+@dataclass
+class TrackQuality:
+    """曲目的一种可选音质（来自 playUrlList）"""
+    track_id: int
+    quality: int          # trackQualityLevel
+    type: str = ""        # 如 M4A_64
+    file_size: int = 0    # 字节，未知为0
+    duration: int = 0     # 秒，用于换算码率
+    cache_time: float = 0.0
+
+    @property
+    def bitrate(self) -> float:
+        """实际码率（字节/秒），缺少大小或时长时为0"""
+        return self.file_size / self.duration if self.file_size and self.duration else 0.0
+
+
+# track_cache 的主键包含音质等级：同一曲目的不同音质各自缓存
+_TRACK_CACHE_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS track_cache (
+        track_id INTEGER NOT NULL,
+        album_id INTEGER NOT NULL,
+        title TEXT DEFAULT '',
+        duration INTEGER DEFAULT 0,
+        crypted_url TEXT DEFAULT '',
+        decrypted_url TEXT DEFAULT '',
+        file_size INTEGER DEFAULT 0,
+        cache_time REAL NOT NULL,
+        last_verified REAL NOT NULL,
+        is_valid BOOLEAN DEFAULT 1,
+        verify_count INTEGER DEFAULT 0,
+        extra_data TEXT DEFAULT '',
+        quality INTEGER NOT NULL DEFAULT 1,
+        PRIMARY KEY (track_id, album_id, quality)
+    )
+'''
 
 class SqliteCache:
     """SQLite缓存管理器"""
@@ -41,31 +83,42 @@ class SqliteCache:
         self.cache_expire_hours = 24  # 缓存24小时后过期
         self.verify_expire_hours = 12  # 12小时后重新验证URL有效性
         self.max_verify_attempts = 3  # 最多验证3次失败后标记为无效
+        self.album_meta_ttl_hours = 48  # 专辑信息48小时内直接使用，之后重新请求并比较updateDate
         
+        # 多进程共享同一个数据库时，遇到写锁最多等待的毫秒数
+        self.busy_timeout_ms = 30000
+
         # 线程锁
         self._lock = threading.Lock()
-        
+
         os.makedirs(cache_dir, exist_ok=True)
         self._init_database()
-    
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开数据库连接，设置busy_timeout以便多个worker进程共享缓存"""
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000)
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        return conn
+
     def _init_database(self):
         """初始化数据库表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
+            # WAL模式：读写互不阻塞，多个进程可同时读取缓存
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(_TRACK_CACHE_SCHEMA)
+            self._migrate_track_cache_quality(conn)
+            
+            # 各曲目可选音质及文件大小（供按预算选择音质）
             conn.execute('''
-                CREATE TABLE IF NOT EXISTS track_cache (
+                CREATE TABLE IF NOT EXISTS track_quality (
                     track_id INTEGER NOT NULL,
-                    album_id INTEGER NOT NULL,
-                    title TEXT DEFAULT '',
-                    duration INTEGER DEFAULT 0,
-                    crypted_url TEXT DEFAULT '',
-                    decrypted_url TEXT DEFAULT '',
+                    quality INTEGER NOT NULL,
+                    type TEXT DEFAULT '',
                     file_size INTEGER DEFAULT 0,
+                    duration INTEGER DEFAULT 0,
                     cache_time REAL NOT NULL,
-                    last_verified REAL NOT NULL,
-                    is_valid BOOLEAN DEFAULT 1,
-                    verify_count INTEGER DEFAULT 0,
-                    extra_data TEXT DEFAULT '',
-                    PRIMARY KEY (track_id, album_id)
+                    PRIMARY KEY (track_id, quality, type)
                 )
             ''')
             
@@ -82,6 +135,20 @@ class SqliteCache:
                 )
             ''')
             
+            # 专辑信息缓存：update_date 为专辑最近一次验证时的 updateDate，
+            # listing_update_date 为缓存曲目分页时的 updateDate，两者相同说明之后专辑没有更新，
+            # 曲目分页缓存超过6小时也可以直接使用
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS album_meta (
+                    album_id INTEGER PRIMARY KEY,
+                    album_data TEXT NOT NULL,
+                    update_date TEXT DEFAULT '',
+                    listing_update_date TEXT DEFAULT '',
+                    track_total INTEGER DEFAULT 0,
+                    checked_at REAL NOT NULL
+                )
+            ''')
+            
             # 创建索引
             conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_time ON track_cache(cache_time)')
             conn.execute('CREATE INDEX IF NOT EXISTS idx_last_verified ON track_cache(last_verified)')
@@ -94,6 +161,27 @@ class SqliteCache:
             
             conn.commit()
     
+    @staticmethod
+    def _migrate_track_cache_quality(conn: sqlite3.Connection):
+        """旧版 track_cache 没有 quality 列：重建表把音质加入主键，已有记录视为默认音质1"""
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(track_cache)')]
+        if 'quality' in columns:
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 其他进程可能已抢先完成迁移
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(track_cache)')]
+            if 'quality' not in columns:
+                conn.execute('ALTER TABLE track_cache RENAME TO track_cache_old')
+                conn.execute(_TRACK_CACHE_SCHEMA)
+                names = ', '.join(columns)
+                conn.execute(f'INSERT INTO track_cache ({names}, quality) SELECT {names}, 1 FROM track_cache_old')
+                conn.execute('DROP TABLE track_cache_old')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    
     def _is_url_expired(self, cache_time: float) -> bool:
         """检查URL是否过期"""
         current_time = time.time()
@@ -112,44 +200,38 @@ class SqliteCache:
             return False
             
         try:
+            import requests
             # 发送HEAD请求检查URL是否可访问
             response = requests.head(url, timeout=10, allow_redirects=True)
             return response.status_code == 200
         except Exception:
             return False
     
-    def get_cached_track(self, track_id: int, album_id: int, log_func=None) -> Optional[CachedTrack]:
+    def get_cached_track(self, track_id: int, album_id: int, log_func=None, quality: int = 1) -> Optional[CachedTrack]:
         """获取缓存的曲目信息"""
-        def log(msg, level='info'):
-            if log_func:
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    log_func(msg)
-            else:
-                print(msg)
+        log = get_log('cache', log_func)
         
-        log(f"[缓存-读取] 查询 Track {track_id} (Album {album_id}) 缓存...", 'info')
+        log.trace("[缓存-读取] 查询 Track %s (Album %s) 缓存...", track_id, album_id)
         
         with self._lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
                     
-                    log(f"[缓存-读取] 执行数据库查询...", 'info')
+                    log.trace("[缓存-读取] 执行数据库查询...")
                     cursor.execute('''
                         SELECT * FROM track_cache 
-                        WHERE track_id = ? AND album_id = ?
-                    ''', (track_id, album_id))
+                        WHERE track_id = ? AND album_id = ? AND quality = ?
+                    ''', (track_id, album_id, quality))
                     
                     row = cursor.fetchone()
                     if not row:
-                        log(f"[缓存-读取] ❌ Track {track_id} 无缓存记录", 'info')
+                        log.debug("[缓存-读取] ❌ Track %s 无缓存记录", track_id)
                         return None
                     
-                    log(f"[缓存-读取] ✅ 找到缓存记录 Track {track_id}", 'info')
-                    log(f"[缓存-读取] 记录详情: is_valid={row['is_valid']}, cache_time={row['cache_time']}, crypted_url_len={len(row['crypted_url'])}", 'info')
+                    log.trace("[缓存-读取] ✅ 找到缓存记录 Track %s", track_id)
+                    log.trace("[缓存-读取] 记录详情: is_valid=%s, cache_time=%s, crypted_url_len=%s", row['is_valid'], row['cache_time'], len(row['crypted_url']))
                     
                     # 转换为CachedTrack对象
                     cached_track = CachedTrack(
@@ -164,188 +246,195 @@ class SqliteCache:
                         last_verified=row['last_verified'],
                         is_valid=bool(row['is_valid']),
                         verify_count=row['verify_count'],
-                        extra_data=row['extra_data']
+                        extra_data=row['extra_data'],
+                        quality=row['quality']
                     )
                     
                     # 检查缓存是否过期
                     if self._is_url_expired(cached_track.cache_time):
-                        log(f"[缓存] Track {track_id} 缓存已过期", 'warning')
-                        self._delete_cached_track(track_id, album_id)
+                        log.debug("[缓存] Track %s 缓存已过期", track_id)
+                        self._delete_cached_track(track_id, album_id, quality)
                         return None
                     
                     # 检查是否需要验证URL有效性
                     if (self._should_verify_url(cached_track.last_verified) and 
                         cached_track.is_valid and cached_track.decrypted_url):
                         
-                        log(f"[缓存] 验证 Track {track_id} URL有效性", 'info')
+                        log.debug("[缓存] 验证 Track %s URL有效性", track_id)
                         
                         if self._verify_url_validity(cached_track.decrypted_url):
                             # URL仍然有效，更新验证时间
-                            self._update_verify_info(track_id, album_id, True, 0)
+                            self._update_verify_info(track_id, album_id, True, 0, quality)
                             cached_track.last_verified = time.time()
                             cached_track.verify_count = 0
-                            log(f"[缓存] Track {track_id} URL验证通过", 'info')
+                            log.debug("[缓存] Track %s URL验证通过", track_id)
                         else:
                             # URL无效，增加验证计数
                             new_verify_count = cached_track.verify_count + 1
                             
                             if new_verify_count >= self.max_verify_attempts:
                                 # 超过最大验证次数，标记为无效
-                                self._update_verify_info(track_id, album_id, False, new_verify_count)
-                                log(f"[缓存] Track {track_id} URL多次验证失败，标记为无效", 'warning')
+                                self._update_verify_info(track_id, album_id, False, new_verify_count, quality)
+                                log.warning("[缓存] Track %s URL多次验证失败，标记为无效", track_id)
                                 return None
                             else:
-                                self._update_verify_info(track_id, album_id, True, new_verify_count)
-                                log(f"[缓存] Track {track_id} URL验证失败 ({new_verify_count}/{self.max_verify_attempts})", 'warning')
+                                self._update_verify_info(track_id, album_id, True, new_verify_count, quality)
+                                log.warning("[缓存] Track %s URL验证失败 (%s/%s)", track_id, new_verify_count, self.max_verify_attempts)
                                 return None
                     
                     # 返回有效的缓存
                     if cached_track.is_valid:
                         cache_age_hours = (time.time() - cached_track.cache_time) / 3600
-                        log(f"[缓存-读取] ✅ 返回有效缓存 Track {track_id} (缓存时间: {cache_age_hours:.1f}小时)", 'info')
-                        log(f"[缓存-读取] 返回数据: crypted_url={cached_track.crypted_url[:50]}{'...' if len(cached_track.crypted_url) > 50 else ''}", 'info')
-                        log(f"[缓存-读取] 返回数据: decrypted_url={cached_track.decrypted_url[:50]}{'...' if len(cached_track.decrypted_url) > 50 else ''}", 'info')
+                        log.debug("[缓存-读取] ✅ 返回有效缓存 Track %s (缓存时间: %.1f小时)", track_id, cache_age_hours)
+                        log.trace("[缓存-读取] 返回数据: crypted_url=%s", lazy(clip, cached_track.crypted_url))
+                        log.trace("[缓存-读取] 返回数据: decrypted_url=%s", lazy(clip, cached_track.decrypted_url))
                         return cached_track
                     else:
-                        log(f"[缓存-读取] ❌ 缓存无效 Track {track_id} (is_valid={cached_track.is_valid})", 'warning')
+                        log.debug("[缓存-读取] ❌ 缓存无效 Track %s (is_valid=%s)", track_id, cached_track.is_valid)
                     
                     return None
                     
             except Exception as e:
-                log(f"[缓存-读取] ❌ 获取缓存失败 Track {track_id}: {e}", 'error')
+                log.error("[缓存-读取] ❌ 获取缓存失败 Track %s: %s", track_id, e)
                 import traceback
-                log(f"[缓存-读取] 详细错误: {traceback.format_exc()}", 'error')
+                log.debug("[缓存-读取] 详细错误: %s", lazy(traceback.format_exc))
                 return None
     
     def cache_track(self, track_id: int, album_id: int, title: str = "", 
                    duration: int = 0, crypted_url: str = "", decrypted_url: str = "",
-                   file_size: int = 0, extra_data: Dict = None, log_func=None):
+                   file_size: int = 0, extra_data: Dict = None, log_func=None, quality: int = 1):
         """缓存曲目信息"""
-        def log(msg, level='info'):
-            if log_func:
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    log_func(msg)
-            else:
-                print(msg)
+        log = get_log('cache', log_func)
         
-        log(f"[缓存-写入] 准备缓存 Track {track_id} (Album {album_id})", 'info')
-        log(f"[缓存-写入] 数据: title='{title}', duration={duration}, crypted_url_len={len(crypted_url)}, decrypted_url_len={len(decrypted_url)}", 'info')
+        log.trace("[缓存-写入] 准备缓存 Track %s (Album %s)", track_id, album_id)
+        log.trace("[缓存-写入] 数据: title='%s', duration=%s, crypted_url_len=%s, decrypted_url_len=%s", title, duration, len(crypted_url), len(decrypted_url))
         
         with self._lock:
             try:
                 current_time = time.time()
                 extra_json = json.dumps(extra_data or {}, ensure_ascii=False)
                 
-                log(f"[缓存-写入] 开始数据库操作...", 'info')
+                log.trace("[缓存-写入] 开始数据库操作...")
                 
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     # 检查是否已存在
                     cursor = conn.cursor()
-                    cursor.execute('SELECT COUNT(*) FROM track_cache WHERE track_id = ? AND album_id = ?', 
-                                 (track_id, album_id))
+                    cursor.execute('SELECT COUNT(*) FROM track_cache WHERE track_id = ? AND album_id = ? AND quality = ?', 
+                                 (track_id, album_id, quality))
                     exists = cursor.fetchone()[0] > 0
                     action = "更新" if exists else "新增"
                     
                     conn.execute('''
                         INSERT OR REPLACE INTO track_cache 
                         (track_id, album_id, title, duration, crypted_url, decrypted_url, 
-                         file_size, cache_time, last_verified, is_valid, verify_count, extra_data)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?)
+                         file_size, cache_time, last_verified, is_valid, verify_count, extra_data, quality)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?)
                     ''', (track_id, album_id, title, duration, crypted_url, decrypted_url,
-                          file_size, current_time, current_time, extra_json))
+                          file_size, current_time, current_time, extra_json, quality))
                     
                     conn.commit()
                     
                     # 验证写入结果
-                    cursor.execute('SELECT COUNT(*) FROM track_cache WHERE track_id = ? AND album_id = ?', 
-                                 (track_id, album_id))
+                    cursor.execute('SELECT COUNT(*) FROM track_cache WHERE track_id = ? AND album_id = ? AND quality = ?', 
+                                 (track_id, album_id, quality))
                     write_success = cursor.fetchone()[0] > 0
                 
                 if write_success:
-                    log(f"[缓存-写入] ✅ {action}缓存成功 Track {track_id} (Album {album_id})", 'info')
-                    log(f"[缓存-写入] 缓存内容: crypted_url={crypted_url[:50]}{'...' if len(crypted_url) > 50 else ''}", 'info')
+                    log.debug("[缓存-写入] ✅ %s缓存成功 Track %s (Album %s)", action, track_id, album_id)
+                    log.trace("[缓存-写入] 缓存内容: crypted_url=%s", lazy(clip, crypted_url))
                 else:
-                    log(f"[缓存-写入] ❌ 写入验证失败 Track {track_id}", 'error')
+                    log.error("[缓存-写入] ❌ 写入验证失败 Track %s", track_id)
                 
             except Exception as e:
-                log(f"[缓存-写入] ❌ 保存缓存失败 Track {track_id}: {e}", 'error')
+                log.error("[缓存-写入] ❌ 保存缓存失败 Track %s: %s", track_id, e)
                 import traceback
-                log(f"[缓存-写入] 详细错误: {traceback.format_exc()}", 'error')
+                log.debug("[缓存-写入] 详细错误: %s", lazy(traceback.format_exc))
     
-    def _update_verify_info(self, track_id: int, album_id: int, is_valid: bool, verify_count: int):
+    def _update_verify_info(self, track_id: int, album_id: int, is_valid: bool, verify_count: int,
+                            quality: int = 1):
         """更新验证信息"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 conn.execute('''
                     UPDATE track_cache 
                     SET last_verified = ?, is_valid = ?, verify_count = ?
-                    WHERE track_id = ? AND album_id = ?
-                ''', (time.time(), is_valid, verify_count, track_id, album_id))
+                    WHERE track_id = ? AND album_id = ? AND quality = ?
+                ''', (time.time(), is_valid, verify_count, track_id, album_id, quality))
                 conn.commit()
         except Exception:
             pass
     
-    def _delete_cached_track(self, track_id: int, album_id: int):
+    def _delete_cached_track(self, track_id: int, album_id: int, quality: int = 1):
         """删除缓存的曲目"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 conn.execute('''
                     DELETE FROM track_cache 
-                    WHERE track_id = ? AND album_id = ?
-                ''', (track_id, album_id))
+                    WHERE track_id = ? AND album_id = ? AND quality = ?
+                ''', (track_id, album_id, quality))
                 conn.commit()
         except Exception:
             pass
     
-    def remove_track_cache(self, track_id: int, album_id: int, log_func=None):
+    def remove_track_cache(self, track_id: int, album_id: int, log_func=None, quality: int = 1):
         """公开方法：删除指定track的缓存"""
-        def log(msg, level='info'):
-            if log_func:
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    log_func(msg)
-            else:
-                print(msg)
+        log = get_log('cache', log_func)
         
         with self._lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     cursor = conn.cursor()
-                    cursor.execute('SELECT COUNT(*) FROM track_cache WHERE track_id = ? AND album_id = ?', 
-                                 (track_id, album_id))
+                    cursor.execute('SELECT COUNT(*) FROM track_cache WHERE track_id = ? AND album_id = ? AND quality = ?', 
+                                 (track_id, album_id, quality))
                     exists = cursor.fetchone()[0] > 0
                     
                     if exists:
                         conn.execute('''
                             DELETE FROM track_cache 
-                            WHERE track_id = ? AND album_id = ?
-                        ''', (track_id, album_id))
+                            WHERE track_id = ? AND album_id = ? AND quality = ?
+                        ''', (track_id, album_id, quality))
                         conn.commit()
-                        log(f"[缓存-清除] ✅ 已删除 Track {track_id} (Album {album_id}) 的缓存", 'info')
+                        log.info("[缓存-清除] ✅ 已删除 Track %s (Album %s) 的缓存", track_id, album_id)
                         return True
                     else:
-                        log(f"[缓存-清除] ⚠️ Track {track_id} (Album {album_id}) 缓存不存在", 'warning')
+                        log.warning("[缓存-清除] ⚠️ Track %s (Album %s) 缓存不存在", track_id, album_id)
                         return False
             except Exception as e:
-                log(f"[缓存-清除] ❌ 删除缓存失败: {e}", 'error')
+                log.error("[缓存-清除] ❌ 删除缓存失败: %s", e)
                 return False
     
-    def get_album_cached_tracks(self, album_id: int) -> List[CachedTrack]:
+    def get_track_candidates(self, track_id: int, album_id: int, quality: int = 1) -> List[str]:
+        """返回缓存中该曲目的全部候选加密URL（playUrlList 中的不同CDN节点），无缓存时返回空列表"""
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute('''
+                        SELECT crypted_url, extra_data, cache_time FROM track_cache
+                        WHERE track_id = ? AND album_id = ? AND quality = ? AND is_valid = 1
+                    ''', (track_id, album_id, quality)).fetchone()
+            except Exception:
+                return []
+        if not row or self._is_url_expired(row[2]):
+            return []
+        try:
+            candidates = (json.loads(row[1]) if row[1] else {}).get('candidates') or []
+        except (ValueError, AttributeError):
+            candidates = []
+        return list(dict.fromkeys(([row[0]] if row[0] else []) + candidates))
+
+    def get_album_cached_tracks(self, album_id: int, quality: int = 1) -> List[CachedTrack]:
         """获取专辑的所有缓存曲目"""
         with self._lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
                     
                     cursor.execute('''
                         SELECT * FROM track_cache 
-                        WHERE album_id = ? AND is_valid = 1
+                        WHERE album_id = ? AND quality = ? AND is_valid = 1
                         ORDER BY track_id
-                    ''', (album_id,))
+                    ''', (album_id, quality))
                     
                     tracks = []
                     for row in cursor.fetchall():
@@ -362,13 +451,14 @@ class SqliteCache:
                                 last_verified=row['last_verified'],
                                 is_valid=bool(row['is_valid']),
                                 verify_count=row['verify_count'],
-                                extra_data=row['extra_data']
+                                extra_data=row['extra_data'],
+                                quality=row['quality']
                             ))
                     
                     return tracks
                     
             except Exception as e:
-                print(f"获取专辑缓存失败: {e}")
+                _log.warning("获取专辑缓存失败: %s", e)
                 return []
     
     def cleanup_expired_cache(self):
@@ -378,7 +468,7 @@ class SqliteCache:
                 current_time = time.time()
                 expire_time = self.cache_expire_hours * 3600
                 
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     cursor = conn.cursor()
                     cursor.execute('''
                         DELETE FROM track_cache 
@@ -389,15 +479,15 @@ class SqliteCache:
                     conn.commit()
                     
                     if deleted_count > 0:
-                        print(f"[缓存] 清理了 {deleted_count} 个过期缓存")
+                        _log.info("[缓存] 清理了 %s 个过期缓存", deleted_count)
                         
             except Exception as e:
-                print(f"清理过期缓存失败: {e}")
+                _log.warning("清理过期缓存失败: %s", e)
     
     def get_cache_stats(self) -> Dict:
         """获取缓存统计信息"""
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 
                 # 总数
@@ -451,20 +541,29 @@ class SqliteCache:
                 }
                 
         except Exception as e:
-            print(f"获取缓存统计失败: {e}")
+            _log.warning("获取缓存统计失败: %s", e)
             return {'error': str(e)}
     
     def clear_cache(self):
         """清空所有缓存"""
         with self._lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     conn.execute('DELETE FROM track_cache')
                     conn.commit()
-                print("[缓存] 已清空所有缓存")
+                _log.info("[缓存] 已清空所有缓存")
             except Exception as e:
-                print(f"清空缓存失败: {e}")
-    
+                _log.warning("清空缓存失败: %s", e)
+
+    def checkpoint(self):
+        """把WAL中的内容写回主数据库文件并截断WAL（程序退出前调用）"""
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except Exception as e:
+                _log.warning("[缓存] WAL检查点失败: %s", e)
+
     def migrate_from_json_cache(self, json_cache_file: str):
         """从JSON缓存迁移数据"""
         if not os.path.exists(json_cache_file):
@@ -485,36 +584,31 @@ class SqliteCache:
                     )
                     migrated_count += 1
                 except Exception as e:
-                    print(f"迁移缓存项失败 {key}: {e}")
+                    _log.warning("迁移缓存项失败 %s: %s", key, e)
             
-            print(f"[缓存] 从JSON迁移了 {migrated_count} 个缓存项")
+            _log.info("[缓存] 从JSON迁移了 %s 个缓存项", migrated_count)
+            # 迁移完成后改名，之后启动不再重复解析旧文件
+            os.replace(json_cache_file, json_cache_file + '.migrated')
             
         except Exception as e:
-            print(f"迁移JSON缓存失败: {e}")
+            _log.warning("迁移JSON缓存失败: %s", e)
     
     def cache_album_page(self, album_id: int, page: int, page_size: int, 
                         tracks_data: List[Dict], total_count: int, log_func=None):
         """缓存专辑页面数据"""
-        def log(msg, level='info'):
-            if log_func:
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    log_func(msg)
-            else:
-                print(msg)
+        log = get_log('cache', log_func)
         
-        log(f"[专辑缓存-写入] 准备缓存专辑 {album_id} 第{page}页 (每页{page_size}个)", 'info')
-        log(f"[专辑缓存-写入] 数据: tracks_count={len(tracks_data)}, total_count={total_count}", 'info')
+        log.trace("[专辑缓存-写入] 准备缓存专辑 %s 第%s页 (每页%s个)", album_id, page, page_size)
+        log.trace("[专辑缓存-写入] 数据: tracks_count=%s, total_count=%s", len(tracks_data), total_count)
         
         with self._lock:
             try:
                 current_time = time.time()
                 tracks_json = json.dumps(tracks_data, ensure_ascii=False)
                 
-                log(f"[专辑缓存-写入] 开始数据库操作...", 'info')
+                log.trace("[专辑缓存-写入] 开始数据库操作...")
                 
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     # 检查是否已存在
                     cursor = conn.cursor()
                     cursor.execute('''
@@ -529,6 +623,11 @@ class SqliteCache:
                         (album_id, page, page_size, tracks_data, total_count, cache_time)
                         VALUES (?, ?, ?, ?, ?, ?)
                     ''', (album_id, page, page_size, tracks_json, total_count, current_time))
+                    # 记录分页是在专辑的哪个 updateDate 下缓存的
+                    conn.execute('''
+                        UPDATE album_meta SET listing_update_date = update_date, track_total = ?
+                        WHERE album_id = ?
+                    ''', (total_count, album_id))
                     
                     conn.commit()
                     
@@ -540,36 +639,29 @@ class SqliteCache:
                     write_success = cursor.fetchone()[0] > 0
                 
                 if write_success:
-                    log(f"[专辑缓存-写入] ✅ {action}专辑页面缓存成功 Album {album_id} 第{page}页", 'info')
+                    log.debug("[专辑缓存-写入] ✅ %s专辑页面缓存成功 Album %s 第%s页", action, album_id, page)
                 else:
-                    log(f"[专辑缓存-写入] ❌ 写入验证失败 Album {album_id} 第{page}页", 'error')
+                    log.error("[专辑缓存-写入] ❌ 写入验证失败 Album %s 第%s页", album_id, page)
                 
             except Exception as e:
-                log(f"[专辑缓存-写入] ❌ 保存专辑页面缓存失败 Album {album_id} 第{page}页: {e}", 'error')
+                log.error("[专辑缓存-写入] ❌ 保存专辑页面缓存失败 Album %s 第%s页: %s", album_id, page, e)
                 import traceback
-                log(f"[专辑缓存-写入] 详细错误: {traceback.format_exc()}", 'error')
+                log.debug("[专辑缓存-写入] 详细错误: %s", lazy(traceback.format_exc))
     
     def get_cached_album_page(self, album_id: int, page: int, page_size: int, 
                              log_func=None) -> Optional[Dict]:
         """获取缓存的专辑页面数据"""
-        def log(msg, level='info'):
-            if log_func:
-                try:
-                    log_func(msg, level=level)
-                except TypeError:
-                    log_func(msg)
-            else:
-                print(msg)
+        log = get_log('cache', log_func)
         
-        log(f"[专辑缓存-读取] 查询专辑 {album_id} 第{page}页缓存 (每页{page_size}个)...", 'info')
+        log.trace("[专辑缓存-读取] 查询专辑 %s 第%s页缓存 (每页%s个)...", album_id, page, page_size)
         
         with self._lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
                     
-                    log(f"[专辑缓存-读取] 执行数据库查询...", 'info')
+                    log.trace("[专辑缓存-读取] 执行数据库查询...")
                     cursor.execute('''
                         SELECT * FROM album_page_cache 
                         WHERE album_id = ? AND page = ? AND page_size = ?
@@ -577,16 +669,18 @@ class SqliteCache:
                     
                     row = cursor.fetchone()
                     if not row:
-                        log(f"[专辑缓存-读取] ❌ 专辑 {album_id} 第{page}页无缓存记录", 'info')
+                        log.debug("[专辑缓存-读取] ❌ 专辑 %s 第%s页无缓存记录", album_id, page)
                         return None
                     
-                    log(f"[专辑缓存-读取] ✅ 找到专辑页面缓存记录", 'info')
-                    log(f"[专辑缓存-读取] 记录详情: cache_time={row['cache_time']}, total_count={row['total_count']}", 'info')
+                    log.trace("[专辑缓存-读取] ✅ 找到专辑页面缓存记录")
+                    log.trace("[专辑缓存-读取] 记录详情: cache_time=%s, total_count=%s", row['cache_time'], row['total_count'])
                     
-                    # 检查缓存是否过期 (专辑页面缓存6小时过期)
+                    # 检查缓存是否过期 (专辑页面缓存6小时过期，专辑updateDate未变时不过期)
                     cache_age = time.time() - row['cache_time']
-                    if cache_age > (6 * 3600):  # 6小时过期
-                        log(f"[专辑缓存-读取] ❌ 专辑页面缓存已过期 (缓存时间: {cache_age/3600:.1f}小时)", 'warning')
+                    if cache_age > (6 * 3600) and self._album_listing_trusted(conn, album_id):
+                        log.debug("[专辑缓存-读取] 专辑 %s 的updateDate未变化，继续使用页面缓存", album_id)
+                    elif cache_age > (6 * 3600):  # 6小时过期
+                        log.debug("[专辑缓存-读取] ❌ 专辑页面缓存已过期 (缓存时间: %.1f小时)", cache_age/3600)
                         # 删除过期缓存
                         conn.execute('''
                             DELETE FROM album_page_cache 
@@ -599,8 +693,8 @@ class SqliteCache:
                     tracks_data = json.loads(row['tracks_data'])
                     
                     cache_age_hours = cache_age / 3600
-                    log(f"[专辑缓存-读取] ✅ 返回有效专辑页面缓存 (缓存时间: {cache_age_hours:.1f}小时)", 'info')
-                    log(f"[专辑缓存-读取] 返回数据: tracks_count={len(tracks_data)}, total_count={row['total_count']}", 'info')
+                    log.debug("[专辑缓存-读取] ✅ 返回有效专辑页面缓存 (缓存时间: %.1f小时)", cache_age_hours)
+                    log.trace("[专辑缓存-读取] 返回数据: tracks_count=%s, total_count=%s", len(tracks_data), row['total_count'])
                     
                     return {
                         'tracks': tracks_data,
@@ -609,9 +703,9 @@ class SqliteCache:
                     }
                     
             except Exception as e:
-                log(f"[专辑缓存-读取] ❌ 获取专辑页面缓存失败: {e}", 'error')
+                log.error("[专辑缓存-读取] ❌ 获取专辑页面缓存失败: %s", e)
                 import traceback
-                log(f"[专辑缓存-读取] 详细错误: {traceback.format_exc()}", 'error')
+                log.debug("[专辑缓存-读取] 详细错误: %s", lazy(traceback.format_exc))
                 return None
     
     def cleanup_expired_album_pages(self):
@@ -621,30 +715,158 @@ class SqliteCache:
                 current_time = time.time()
                 expire_time = 6 * 3600  # 6小时过期
                 
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     cursor = conn.cursor()
                     cursor.execute('''
                         DELETE FROM album_page_cache 
-                        WHERE ? - cache_time > ?
+                        WHERE ? - cache_time > ? AND album_id NOT IN (
+                            SELECT album_id FROM album_meta
+                            WHERE listing_update_date != '' AND listing_update_date = update_date
+                        )
                     ''', (current_time, expire_time))
                     
                     deleted_count = cursor.rowcount
                     conn.commit()
                     
                     if deleted_count > 0:
-                        print(f"[专辑缓存] 清理了 {deleted_count} 个过期专辑页面缓存")
+                        _log.info("[专辑缓存] 清理了 %s 个过期专辑页面缓存", deleted_count)
                         
             except Exception as e:
-                print(f"清理过期专辑页面缓存失败: {e}")
+                _log.warning("清理过期专辑页面缓存失败: %s", e)
+    
+    def _album_listing_trusted(self, conn: sqlite3.Connection, album_id: int) -> bool:
+        """专辑信息在有效期内且曲目分页缓存时的 updateDate 与当前相同"""
+        row = conn.execute('''
+            SELECT update_date, listing_update_date, checked_at FROM album_meta WHERE album_id = ?
+        ''', (album_id,)).fetchone()
+        if not row:
+            return False
+        update_date, listing_update_date, checked_at = row
+        return (bool(listing_update_date) and listing_update_date == update_date
+                and time.time() - checked_at <= self.album_meta_ttl_hours * 3600)
+
+    def get_album_meta(self, album_id: int, log_func=None) -> Optional[Dict]:
+        """获取缓存的专辑信息
+
+        返回 {'album': 专辑字段, 'update_date', 'track_total', 'checked_at', 'fresh'}，无记录返回 None；
+        fresh 表示在有效期内，可以不发请求直接使用。
+        """
+        log = get_log('cache', log_func)
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute('''
+                        SELECT album_data, update_date, track_total, checked_at FROM album_meta WHERE album_id = ?
+                    ''', (int(album_id),)).fetchone()
+            except Exception as e:
+                log.warning("[专辑信息缓存] 读取失败: %s", e)
+                return None
+        if not row:
+            log.debug("[专辑信息缓存] 专辑 %s 无缓存", album_id)
+            return None
+        age = time.time() - row[3]
+        fresh = age <= self.album_meta_ttl_hours * 3600
+        log.debug("[专辑信息缓存] 专辑 %s 缓存%s (%.1f小时前验证)", album_id, '有效' if fresh else '已过期', age / 3600)
+        return {'album': json.loads(row[0]), 'update_date': row[1], 'track_total': row[2],
+                'checked_at': row[3], 'fresh': fresh}
+
+    def cache_album_meta(self, album_id: int, album_data: Dict, log_func=None) -> bool:
+        """保存专辑信息并记录验证时间；updateDate 与缓存的不同时作废该专辑的曲目分页缓存
+
+        返回专辑是否有更新（首次缓存不算更新）。
+        """
+        log = get_log('cache', log_func)
+        album_id = int(album_id)
+        update_date = str(album_data.get('updateDate') or '')
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute('SELECT update_date FROM album_meta WHERE album_id = ?',
+                                       (album_id,)).fetchone()
+                    changed = row is not None and row[0] != update_date
+                    if changed:
+                        conn.execute('DELETE FROM album_page_cache WHERE album_id = ?', (album_id,))
+                        log.info("[专辑信息缓存] 专辑 %s 已更新 (%s -> %s)，重新获取曲目列表",
+                                 album_id, row[0], update_date)
+                    conn.execute('''
+                        INSERT INTO album_meta (album_id, album_data, update_date, checked_at)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(album_id) DO UPDATE SET
+                            album_data = excluded.album_data,
+                            update_date = excluded.update_date,
+                            checked_at = excluded.checked_at,
+                            listing_update_date = CASE WHEN ? THEN '' ELSE listing_update_date END,
+                            track_total = CASE WHEN ? THEN 0 ELSE track_total END
+                    ''', (album_id, json.dumps(album_data, ensure_ascii=False), update_date, time.time(),
+                          changed, changed))
+                    conn.commit()
+                    return changed
+            except Exception as e:
+                log.warning("[专辑信息缓存] 保存失败: %s", e)
+                return False
+
+    def get_album_track_total(self, album_id: int) -> int:
+        """专辑未更新时返回缓存的曲目总数，否则返回0（需要联网获取）"""
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    if not self._album_listing_trusted(conn, int(album_id)):
+                        return 0
+                    row = conn.execute('SELECT track_total FROM album_meta WHERE album_id = ?',
+                                       (int(album_id),)).fetchone()
+                    return row[0] if row else 0
+            except Exception:
+                return 0
+
+    def record_track_qualities(self, qualities: List[TrackQuality]):
+        """记录从 playUrlList 得到的可选音质和文件大小（同一曲目+音质+格式覆盖旧记录）"""
+        if not qualities:
+            return
+        now = time.time()
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    conn.executemany('''
+                        INSERT OR REPLACE INTO track_quality
+                        (track_id, quality, type, file_size, duration, cache_time)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', [(q.track_id, q.quality, q.type, q.file_size, q.duration, now) for q in qualities])
+                    conn.commit()
+            except Exception as e:
+                _log.warning("[缓存] 记录音质信息失败: %s", e)
+    
+    def get_track_qualities(self, track_ids: List[int]) -> Dict[int, List[TrackQuality]]:
+        """批量查询已知的可选音质，按 track_id 分组"""
+        result: Dict[int, List[TrackQuality]] = {}
+        if not track_ids:
+            return result
+        with self._lock:
+            try:
+                with self._connect() as conn:
+                    rows = []
+                    # 分批查询，避免超过SQLite的参数个数上限
+                    for i in range(0, len(track_ids), 500):
+                        batch = list(track_ids[i:i + 500])
+                        placeholders = ','.join('?' * len(batch))
+                        rows.extend(conn.execute(f'''
+                            SELECT track_id, quality, type, file_size, duration, cache_time
+                            FROM track_quality WHERE track_id IN ({placeholders})
+                            ORDER BY track_id, quality
+                        ''', batch).fetchall())
+            except Exception:
+                return result
+        for row in rows:
+            result.setdefault(row[0], []).append(TrackQuality(*row))
+        return result
     
-    def get_tracks_cache_status(self, track_ids: List[int], album_id: int) -> Dict[int, Dict]:
+    def get_tracks_cache_status(self, track_ids: List[int], album_id: int, quality: int = 1) -> Dict[int, Dict]:
         """批量获取曲目缓存状态（性能优化）"""
         if not track_ids:
             return {}
             
         with self._lock:
             try:
-                with sqlite3.connect(self.db_path) as conn:
+                with self._connect() as conn:
                     conn.row_factory = sqlite3.Row
                     cursor = conn.cursor()
                     
@@ -653,10 +875,10 @@ class SqliteCache:
                     query = f'''
                         SELECT track_id, crypted_url, decrypted_url, is_valid
                         FROM track_cache 
-                        WHERE track_id IN ({placeholders}) AND album_id = ? AND is_valid = 1
+                        WHERE track_id IN ({placeholders}) AND album_id = ? AND quality = ? AND is_valid = 1
                     '''
                     
-                    cursor.execute(query, track_ids + [album_id])
+                    cursor.execute(query, track_ids + [album_id, quality])
                     rows = cursor.fetchall()
                     
                     result = {}
@@ -675,14 +897,25 @@ class SqliteCache:
 
 # 全局缓存实例
 _global_cache = None
+_global_cache_lock = threading.Lock()
 
 def get_sqlite_cache() -> SqliteCache:
     """获取全局SQLite缓存实例"""
     global _global_cache
     if _global_cache is None:
-        _global_cache = SqliteCache()
-        # 尝试从旧的JSON缓存迁移
-        json_cache_path = os.path.join(_global_cache.cache_dir, 'url_cache.json')
-        if os.path.exists(json_cache_path):
-            _global_cache.migrate_from_json_cache(json_cache_path)
-    return _global_cache
\ No newline at end of file
+        with _global_cache_lock:
+            if _global_cache is None:
+                cache = SqliteCache()
+                # 旧JSON缓存在后台迁移，不阻塞首次查询
+                json_cache_path = os.path.join(cache.cache_dir, 'url_cache.json')
+                if os.path.exists(json_cache_path):
+                    threading.Thread(target=cache.migrate_from_json_cache,
+                                     args=(json_cache_path,), daemon=True).start()
+                _global_cache = cache
+    return _global_cache
+
+
+def flush_sqlite_cache():
+    """全局缓存已创建时执行WAL检查点（退出时调用，本次运行未用过缓存则不创建）"""
+    if _global_cache is not None:
+        _global_cache.checkpoint()
@@ -0,0 +1,202 @@
+import concurrent.futures
+import threading
+from typing import Callable, Dict, Hashable, List, Optional
+
+from utils.log import get_log
+
+_log = get_log('executor')
+
+# 各池的默认线程数：网络请求/下载、扫描目录等磁盘任务、为界面准备数据的短任务（如封面解码）
+DEFAULT_POOLS = {'network': 4, 'disk': 2, 'ui': 2}
+
+
+class CancelToken:
+    """任务取消令牌
+
+    接口与 threading.Event 的 is_set/wait 一致，可以直接作为下载器的 cancel_event 传入。
+    on_cancel 注册的回调在取消时调用一次，用于停止自带停止方法的对象（如目录扫描器）。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                _log.warning('取消回调异常: %s', e)
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def on_cancel(self, callback: Callable[[], None]):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+
+class TaskHandle:
+    """已提交任务的句柄：future + 取消令牌"""
+
+    def __init__(self, name: str, pool: str, key: Optional[Hashable], token: CancelToken):
+        self.name = name
+        self.pool = pool
+        self.key = key
+        self.token = token
+        self.future: Optional[concurrent.futures.Future] = None
+
+    def cancel(self):
+        """置位取消令牌；尚未开始的任务直接从队列移除，运行中的任务需自行检查令牌"""
+        self.token.cancel()
+        if self.future is not None:
+            self.future.cancel()
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.is_set()
+
+
+class TaskExecutor:
+    """按用途分池的有界后台任务执行器
+
+    - 每个池是固定线程数的 ThreadPoolExecutor，连续点击按钮或频繁切换封面不会无限开线程
+    - submit 的 key 标识同一类任务：replace=True 时取消旧任务（如新的封面替换旧的），
+      否则旧任务仍在运行时不再提交，返回 None（如重复点击“解析曲目”）
+    - shutdown 取消所有任务令牌，等待运行中的任务结束（有超时），再执行退出钩子（缓存落盘等）
+    """
+
+    def __init__(self, pools: Optional[Dict[str, int]] = None, log_func=None):
+        self.log = get_log('executor', log_func)
+        self._pools = {
+            name: concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'{name}-task')
+            for name, workers in (pools or DEFAULT_POOLS).items()
+        }
+        self._lock = threading.Lock()
+        self._handles = set()
+        self._keyed: Dict[Hashable, TaskHandle] = {}
+        self._hooks: List[Callable[[], None]] = []
+        self._closed = False
+
+    def submit(self, func: Callable, pool: str = 'network', key: Optional[Hashable] = None,
+               replace: bool = False, pass_token: bool = False,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               name: Optional[str] = None) -> Optional[TaskHandle]:
+        """提交任务，返回 TaskHandle；执行器已关闭或同 key 任务仍在运行（replace=False）时返回 None
+
+        pass_token=True 时以 func(token) 调用，长任务应定期检查 token.is_set() 并提前返回。
+        任务抛出的异常交给 on_error，未提供时记录到日志。
+        """
+        if pool not in self._pools:
+            raise ValueError(f'未知的任务池: {pool}')
+        name = name or getattr(func, '__name__', 'task')
+        with self._lock:
+            if self._closed:
+                self.log.debug('执行器已关闭，忽略任务 %s', name)
+                return None
+            if key is not None:
+                previous = self._keyed.get(key)
+                if previous is not None and not previous.done():
+                    if not replace:
+                        self.log.debug('任务 %s 仍在运行，忽略重复提交', key)
+                        return None
+                    previous.cancel()
+            handle = TaskHandle(name, pool, key, CancelToken())
+
+            def run():
+                try:
+                    if handle.token.is_set():
+                        return None
+                    return func(handle.token) if pass_token else func()
+                except Exception as e:
+                    if on_error is not None:
+                        on_error(e)
+                    else:
+                        self.log.error('后台任务 %s 异常: %s', name, e)
+                finally:
+                    self._forget(handle)
+
+            handle.future = self._pools[pool].submit(run)
+            self._handles.add(handle)
+            if key is not None:
+                self._keyed[key] = handle
+            # 排队中被取消的任务不会执行 run，这里补上清理
+            handle.future.add_done_callback(lambda f: f.cancelled() and self._forget(handle))
+            return handle
+
+    def _forget(self, handle: TaskHandle):
+        with self._lock:
+            self._handles.discard(handle)
+            if handle.key is not None and self._keyed.get(handle.key) is handle:
+                del self._keyed[handle.key]
+
+    def running(self, key: Hashable) -> bool:
+        with self._lock:
+            handle = self._keyed.get(key)
+            return handle is not None and not handle.done()
+
+    def cancel(self, key: Hashable):
+        with self._lock:
+            handle = self._keyed.get(key)
+        if handle is not None:
+            handle.cancel()
+
+    def add_shutdown_hook(self, func: Callable[[], None]):
+        """注册退出钩子，在 shutdown 等待任务结束后按注册顺序执行"""
+        self._hooks.append(func)
+
+    def shutdown(self, timeout: float = 5.0) -> bool:
+        """取消所有任务并等待其结束，然后执行退出钩子；返回是否所有任务都在超时前结束"""
+        with self._lock:
+            if self._closed:
+                return True
+            self._closed = True
+            handles = list(self._handles)
+        for handle in handles:
+            handle.cancel()
+        for executor in self._pools.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        # 排队中被取消的 future 不会再被通知，wait 只等待已经开始运行的任务
+        futures = [h.future for h in handles if h.future is not None and not h.future.done()]
+        _, pending = concurrent.futures.wait(futures, timeout=timeout)
+        if pending:
+            self.log.warning('退出时仍有 %s 个后台任务未结束', len(pending))
+        for hook in self._hooks:
+            try:
+                hook()
+            except Exception as e:
+                self.log.warning('退出钩子异常: %s', e)
+        return not pending
+
+
+_global_executor: Optional[TaskExecutor] = None
+_global_executor_lock = threading.Lock()
+
+
+def get_task_executor() -> TaskExecutor:
+    """获取全局任务执行器"""
+    global _global_executor
+    if _global_executor is None:
+        with _global_executor_lock:
+            if _global_executor is None:
+                _global_executor = TaskExecutor()
+    return _global_executor
@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class UiUpdateQueue:
+    """界面更新队列：任意线程放入，界面线程按时间预算批量执行
+
+    - put(func): 普通更新，按放入顺序执行
+    - put(func, key=...): 同一 key 的更新只保留最新一次（如总进度、某个下载线程的速度行），
+      在该 key 首次入队的位置执行
+    - set_row(row, **values): 表格某一行的列值设置，未执行前多次设置合并为一次，交给 apply_row 执行
+
+    put/set_row 返回 True 表示队列由空闲变为待处理，调用方需要安排一次 drain。
+    """
+
+    def __init__(self, apply_row: Optional[Callable[[Hashable, Dict[str, Any]], None]] = None,
+                 clock: Callable[[], float] = time.perf_counter):
+        self._apply_row = apply_row
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._order = deque()   # ('call', func) / ('key', key) / ('row', row)
+        self._latest = {}       # key -> 最新的 func
+        self._rows = {}         # row -> {列: 值}
+        self._scheduled = False
+
+    def _mark_pending(self) -> bool:
+        if self._scheduled:
+            return False
+        self._scheduled = True
+        return True
+
+    def put(self, func: Callable[[], None], key: Optional[Hashable] = None) -> bool:
+        with self._lock:
+            if key is None:
+                self._order.append(('call', func))
+            else:
+                if key not in self._latest:
+                    self._order.append(('key', key))
+                self._latest[key] = func
+            return self._mark_pending()
+
+    def set_row(self, row: Hashable, **values) -> bool:
+        with self._lock:
+            pending = self._rows.get(row)
+            if pending is None:
+                self._rows[row] = dict(values)
+                self._order.append(('row', row))
+            else:
+                pending.update(values)
+            return self._mark_pending()
+
+    def _pop(self):
+        kind, value = self._order.popleft()
+        if kind == 'key':
+            return 'call', self._latest.pop(value)
+        if kind == 'row':
+            return 'row', (value, self._rows.pop(value))
+        return kind, value
+
+    def drain(self, budget: float = 0.01, on_error: Optional[Callable[[Exception], None]] = None) -> bool:
+        """执行待处理的更新，直到队列为空或超出时间预算（秒），至少执行一项
+
+        返回 True 表示还有剩余，需要再安排一次 drain；返回 False 时队列回到空闲状态。
+        """
+        deadline = self._clock() + budget
+        while True:
+            with self._lock:
+                if not self._order:
+                    self._scheduled = False
+                    return False
+                kind, value = self._pop()
+            try:
+                if kind == 'row':
+                    if self._apply_row is not None:
+                        self._apply_row(*value)
+                else:
+                    value()
+            except Exception as e:
+                if on_error is not None:
+                    on_error(e)
+            if self._clock() >= deadline:
+                with self._lock:
+                    if self._order:
+                        return True
+                    self._scheduled = False
+                    return False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._order)
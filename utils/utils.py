@@ -1,11 +1,36 @@
-from Crypto.Cipher import AES
 import base64
+import threading
+from functools import lru_cache
+from typing import Iterable, List
 
 # 使用 bytes.fromhex 将十六进制字符串转换为字节
 key = bytes.fromhex("aaad3e4fd540b0f79dca95606e72bf93")
 
+# AES ECB 解密对象不保存状态，可重复使用；每个线程各建一个，避免每次解密都重新扩展密钥
+_local = threading.local()
 
+
+def _cipher():
+    cipher = getattr(_local, 'cipher', None)
+    if cipher is None:
+        # 首次解密时才导入Crypto
+        from Crypto.Cipher import AES
+        cipher = _local.cipher = AES.new(key, AES.MODE_ECB)
+    return cipher
+
+
+def _unpad(decrypted):
+    if not decrypted:
+        return ''
+    pad_len = decrypted[-1]
+    decrypted = decrypted[:-pad_len]
+    # 将字节转换为字符串
+    return decrypted.decode('utf-8')
+
+
+@lru_cache(maxsize=4096)
 def decrypt_url(ciphertext):
+    """解密单个播放地址；同一密文（解析、写缓存、下载各解密一次）直接返回记忆的结果"""
     if not ciphertext:
         return ''
     # Base64url 解码 (添加填充以确保长度为4的倍数)
@@ -13,16 +38,38 @@ def decrypt_url(ciphertext):
         ciphertext_bytes = base64.urlsafe_b64decode(ciphertext + "==")
     except Exception:
         return ''
-    # 创建 AES ECB 模式的密钥
-    cipher = AES.new(key, AES.MODE_ECB)
-    # 解密密文
-    decrypted = cipher.decrypt(ciphertext_bytes)
-    if not decrypted:
-        return ''
-    pad_len = decrypted[-1]
-    decrypted = decrypted[:-pad_len]
-    # 将字节转换为字符串
-    return decrypted.decode('utf-8')
+    return _unpad(_cipher().decrypt(ciphertext_bytes))
+
+
+def decrypt_urls(ciphertexts: Iterable[str]) -> List[str]:
+    """批量解密，返回与输入一一对应的明文列表
+
+    ECB 模式各分组独立，把所有密文拼接后只调用一次 decrypt 再按长度切分。
+    无法解码或长度不是16字节整数倍的密文返回空字符串，不影响其他项。
+    """
+    ciphertexts = list(ciphertexts)
+    payloads = []
+    for ciphertext in dict.fromkeys(ciphertexts):
+        if not ciphertext:
+            continue
+        try:
+            data = base64.urlsafe_b64decode(ciphertext + "==")
+        except Exception:
+            continue
+        if data and len(data) % 16 == 0:
+            payloads.append((ciphertext, data))
+    plain = {}
+    if payloads:
+        decrypted = _cipher().decrypt(b''.join(data for _, data in payloads))
+        offset = 0
+        for ciphertext, data in payloads:
+            block = decrypted[offset:offset + len(data)]
+            offset += len(data)
+            try:
+                plain[ciphertext] = _unpad(block)
+            except (UnicodeDecodeError, IndexError):
+                plain[ciphertext] = ''
+    return [plain.get(c, '') for c in ciphertexts]
 
 # 如需在其他模块调用 decrypt_url，请使用：
-# from utils.utils import decrypt_url
\ No newline at end of file
+# from utils.utils import decrypt_url
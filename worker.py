@@ -0,0 +1,208 @@
+"""无界面下载worker入口
+
+多个worker进程共享同一个任务队列、同一个限流器和同一个SQLite缓存（WAL模式），
+可以在一台下载机上按CPU核数/磁盘数横向扩展，已被其他worker解析过的曲目直接命中缓存。
+
+用法示例：
+    python worker.py enqueue --album-id 12345 --album-id 67890
+    python worker.py enqueue --file ids.txt
+    python worker.py run --processes 4 --download-dir /mnt/nas/AudioBook
+    python worker.py status
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+
+def _default_cache_dir():
+    return os.environ.get('XIMALAYA_CACHE_DIR') or os.path.join(os.getcwd(), 'cache')
+
+
+def _queue_db_path(cache_dir):
+    return os.path.join(cache_dir, 'worker.db')
+
+
+def _make_log_func(worker_id):
+    def log(msg, level='info'):
+        print(f'[{worker_id}] [{level}] {msg}', flush=True)
+    return log
+
+
+def _run_job(job, download_dir, log, cancel_event=None):
+    """执行一个任务，失败时抛出异常由调用方记录；cancel_event 置位时尽快中止"""
+    if job.job_type == 'album':
+        from downloader.album_download import AlbumDownloader
+        payload = job.payload_dict()
+        AlbumDownloader(
+            job.target_id,
+            log_func=log,
+            delay=payload.get('delay', 0),
+            save_dir=download_dir,
+            bandwidth_limit=payload.get('max_rate', 0),
+            cancel_event=cancel_event,
+        ).download_album()
+    elif job.job_type == 'track':
+        from downloader.single_track_download import download_single_track
+        payload = job.payload_dict()
+        ok = download_single_track(job.target_id, album_id=job.album_id or None,
+                                   log_func=log, save_dir=download_dir,
+                                   bandwidth_limit=payload.get('max_rate', 0),
+                                   cancel_event=cancel_event)
+        if not ok:
+            raise Exception(f'单曲下载失败: track_id={job.target_id}')
+    else:
+        raise ValueError(f'未知任务类型: {job.job_type}')
+
+
+def run_worker(worker_id, cache_dir, download_dir, lease_seconds=600, rate_interval=3.0,
+               idle_exit=False, poll_interval=5.0, max_rate='', rate_schedule=''):
+    """worker主循环：认领任务 -> 续约 -> 执行 -> 提交结果"""
+    # 必须在首次使用缓存之前设置，保证所有worker共享同一个缓存目录
+    os.environ['XIMALAYA_CACHE_DIR'] = cache_dir
+
+    from utils.job_queue import JobQueue
+    from utils.rate_limiter import SqliteRateLimiter, set_global_rate_limiter
+    from utils.bandwidth import set_global_bandwidth
+
+    db_path = _queue_db_path(cache_dir)
+    queue = JobQueue(db_path)
+    set_global_rate_limiter(SqliteRateLimiter(db_path, min_interval=rate_interval))
+    # 下载限速与请求限流一样记录在 worker.db 中，所有worker进程共享同一份配额
+    set_global_bandwidth(max_rate, schedule=rate_schedule, db_path=db_path)
+    log = _make_log_func(worker_id)
+    os.makedirs(download_dir, exist_ok=True)
+    log(f'worker已启动，队列: {db_path}，下载目录: {download_dir}')
+
+    while True:
+        job = queue.claim(worker_id, lease_seconds)
+        if job is None:
+            if idle_exit:
+                log('队列为空，worker退出')
+                return
+            time.sleep(poll_interval)
+            continue
+
+        log(f'认领任务 #{job.job_id}: {job.job_type} {job.target_id} (第{job.attempts}次)')
+
+        # 后台续约，防止长时间下载期间租约过期被其他worker抢走
+        stop_heartbeat = threading.Event()
+        # 租约丢失时任务可能已被其他worker接管，立即中止，避免两个worker同时写同一个专辑目录和进度日志
+        lease_lost = threading.Event()
+
+        def heartbeat():
+            while not stop_heartbeat.wait(lease_seconds / 3):
+                if not queue.heartbeat(job.job_id, worker_id, lease_seconds):
+                    log(f'任务 #{job.job_id} 租约已丢失，停止执行', level='warning')
+                    lease_lost.set()
+                    return
+
+        heartbeat_thread = threading.Thread(target=heartbeat, daemon=True)
+        heartbeat_thread.start()
+        try:
+            _run_job(job, download_dir, log, cancel_event=lease_lost)
+            if lease_lost.is_set():
+                log(f'任务 #{job.job_id} 租约已丢失，结果不提交', level='warning')
+            else:
+                queue.complete(job.job_id, worker_id)
+                log(f'任务 #{job.job_id} 完成')
+        except Exception as e:
+            if lease_lost.is_set():
+                log(f'任务 #{job.job_id} 已因租约丢失中止', level='warning')
+                continue
+            from fetcher.track_fetcher import BlockedException
+            # 风控时整体退避更久，给接口冷却时间
+            retry_delay = 600 if isinstance(e, BlockedException) else 60
+            queue.fail(job.job_id, worker_id, str(e), retry_delay=retry_delay)
+            log(f'任务 #{job.job_id} 失败: {e}', level='error')
+        finally:
+            stop_heartbeat.set()
+            heartbeat_thread.join(timeout=1)
+
+
+def cmd_enqueue(args):
+    from utils.job_queue import JobQueue
+    queue = JobQueue(_queue_db_path(args.cache_dir))
+    entries = [('album', i) for i in args.album_id] + [('track', i) for i in args.track_id]
+    if args.file:
+        from utils.job_queue import read_ids_file
+        entries.extend(read_ids_file(args.file))
+    added = 0
+    for job_type, target_id in entries:
+        if queue.enqueue(job_type, target_id, album_id=args.track_album_id or 0,
+                         payload={'delay': args.delay, 'max_rate': args.job_rate}) is not None:
+            added += 1
+    print(f'已加入 {added} 个任务（跳过 {len(entries) - added} 个重复任务）')
+
+
+def cmd_run(args):
+    base_id = args.worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    if args.processes <= 1:
+        run_worker(base_id, args.cache_dir, args.download_dir, args.lease, args.rate_interval, args.idle_exit,
+                   max_rate=args.max_rate, rate_schedule=args.rate_schedule)
+        return
+    import multiprocessing
+    processes = []
+    for i in range(args.processes):
+        p = multiprocessing.Process(
+            target=run_worker,
+            args=(f'{base_id}-{i}', args.cache_dir, args.download_dir, args.lease, args.rate_interval, args.idle_exit),
+            kwargs={'max_rate': args.max_rate, 'rate_schedule': args.rate_schedule},
+            daemon=False,
+        )
+        p.start()
+        processes.append(p)
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+
+
+def cmd_status(args):
+    from utils.job_queue import JobQueue
+    queue = JobQueue(_queue_db_path(args.cache_dir))
+    stats = queue.stats()
+    print(' '.join(f'{k}={v}' for k, v in stats.items()))
+    for job in queue.list_jobs(status=JobQueue.STATUS_FAILED):
+        print(f'#{job.job_id} {job.job_type} {job.target_id} 失败{job.attempts}次: {job.last_error}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='喜马拉雅无界面下载worker')
+    parser.add_argument('--cache-dir', default=_default_cache_dir(), help='共享缓存目录（任务队列、限流器与曲目缓存）')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_enqueue = sub.add_parser('enqueue', help='加入下载任务')
+    p_enqueue.add_argument('--album-id', type=int, action='append', default=[])
+    p_enqueue.add_argument('--track-id', type=int, action='append', default=[])
+    p_enqueue.add_argument('--track-album-id', type=int, default=0, help='单曲任务所属专辑ID')
+    p_enqueue.add_argument('--file', help='ID文件，每行一个，可用 album:/track: 前缀')
+    p_enqueue.add_argument('--delay', type=float, default=0, help='专辑任务的下载延迟(秒)')
+    p_enqueue.add_argument('--job-rate', default='', help='任务自身的下载限速，如 512K、2M')
+    p_enqueue.set_defaults(func=cmd_enqueue)
+
+    p_run = sub.add_parser('run', help='启动worker')
+    p_run.add_argument('--download-dir', default=os.path.join(os.getcwd(), 'AudioBook'))
+    p_run.add_argument('--processes', type=int, default=1, help='worker进程数')
+    p_run.add_argument('--worker-id', default='')
+    p_run.add_argument('--lease', type=float, default=600, help='任务租约时长(秒)')
+    p_run.add_argument('--rate-interval', type=float, default=3.0, help='所有worker共享的接口请求最小间隔(秒)')
+    p_run.add_argument('--idle-exit', action='store_true', help='队列为空时退出')
+    p_run.add_argument('--max-rate', default='', help='所有worker进程共享的下载限速，如 512K、2M（0为不限）')
+    p_run.add_argument('--rate-schedule', default='',
+                       help='按时段限速，如 08:00-23:00=512K,23:00-08:00=0；未覆盖的时段使用 --max-rate')
+    p_run.set_defaults(func=cmd_run)
+
+    p_status = sub.add_parser('status', help='查看队列状态')
+    p_status.set_defaults(func=cmd_status)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())